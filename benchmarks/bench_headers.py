@@ -0,0 +1,114 @@
+"""Сравнение чтения метаданных из заголовков с текущим путем через Pillow.
+
+Запуск:
+    python benchmarks/bench_headers.py PATH [PATH ...] [--repeat N]
+
+PATH может быть файлом или папкой (обходится рекурсивно). Для каждого
+файла измеряется время read_header_metadata и время открытия через
+Pillow с чтением img.info и img.getexif(), как в extract_metadata.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PIL.Image
+
+from imadata_headers import HeaderFormatError, read_header_metadata
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp')
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def read_with_pillow(file_path):
+    with PIL.Image.open(file_path) as img:
+        return img.size, img.format, img.mode, dict(img.info), dict(img.getexif())
+
+
+def time_call(func, file_path, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark header-only metadata reading against Pillow")
+    parser.add_argument("paths", nargs="+", help="Image files or folders")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per file (best time is reported)")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No image files found")
+        return 1
+
+    total_header = total_pillow = 0.0
+    total_read = total_size = 0
+    mismatches = 0
+    skipped = 0
+
+    print(f"{'File':40} {'Size':>10} {'Read':>8} {'Header ms':>10} {'Pillow ms':>10}")
+    for file_path in files:
+        try:
+            header = read_header_metadata(file_path)
+        except HeaderFormatError as e:
+            print(f"{os.path.basename(file_path)[:40]:40} malformed header: {e}")
+            skipped += 1
+            continue
+        if header is None:
+            skipped += 1
+            continue
+
+        size = os.path.getsize(file_path)
+        header_time = time_call(read_header_metadata, file_path, args.repeat)
+        pillow_time = time_call(read_with_pillow, file_path, args.repeat)
+
+        # Проверяем, что оба пути нашли одни и те же текстовые ключи и теги EXIF
+        pil_size, _, _, pil_info, pil_exif = read_with_pillow(file_path)
+        text_keys = {k for k, v in pil_info.items() if isinstance(v, str)}
+        header_text_keys = {k for k, v in header["info"].items() if isinstance(v, str)}
+        if pil_size != header["size"] or set(pil_exif) != set(header["exif"]) \
+                or not text_keys <= header_text_keys:
+            mismatches += 1
+
+        total_header += header_time
+        total_pillow += pillow_time
+        total_read += header["bytes_read"]
+        total_size += size
+        print(f"{os.path.basename(file_path)[:40]:40} {size:>10,} {header['bytes_read']:>8,} "
+              f"{header_time * 1000:>10.3f} {pillow_time * 1000:>10.3f}")
+
+    measured = len(files) - skipped
+    if not measured:
+        print("No files in supported formats")
+        return 1
+
+    print()
+    print(f"Files: {measured} (skipped {skipped}), mismatches with Pillow: {mismatches}")
+    print(f"Bytes read: {total_read:,} of {total_size:,} ({total_read / max(total_size, 1):.2%})")
+    print(f"Header reader: {total_header * 1000:.2f} ms total, {total_header / measured * 1000:.3f} ms/file")
+    print(f"Pillow:        {total_pillow * 1000:.2f} ms total, {total_pillow / measured * 1000:.3f} ms/file")
+    if total_header:
+        print(f"Speedup: {total_pillow / total_header:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
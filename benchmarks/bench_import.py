@@ -0,0 +1,77 @@
+"""Время импорта модулей без графического интерфейса.
+
+Запуск:
+    python benchmarks/bench_import.py [--repeat N] [--budget MS]
+
+Каждый модуль импортируется в новом процессе интерпретатора (кэш
+байт-кода уже прогрет первым запуском). Печатается медиана времени
+импорта и проверяется, что модуль не загрузил Qt, а разбор по
+заголовкам не загрузил Pillow. Код выхода 1, если медиана больше
+--budget (по умолчанию 50 мс) или модуль потянул за собой лишнее.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("imadata_core", "imadata_params", "imadata_headers", "imadata_cache",
+           "imadata_batch", "imadata_scan", "imadata_search", "imadata_profile", "imadata_exif",
+           "imadata_binary", "imadata_xmp", "imadata_comfy", "imadata_compare",
+           "imadata_dupes")
+
+# Выполняется в дочернем процессе: время импорта и загруженные тяжелые пакеты
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+{after}
+heavy = sorted(name for name in ("PyQt6", "PIL.Image") if name in sys.modules)
+print(elapsed, ",".join(heavy))
+"""
+
+# Разбор одного файла по заголовкам не должен загружать Pillow
+HEADER_ONLY = "imadata_core.extract_metadata({path!r}, header_only=True)"
+
+
+def probe(module, after=""):
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module, after=after)],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    elapsed, heavy = output.split(" ", 1)
+    return float(elapsed), [name for name in heavy.strip().split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the headless modules")
+    parser.add_argument("--repeat", type=int, default=7, help="Fresh interpreters per module")
+    parser.add_argument("--budget", type=float, default=50.0, help="Allowed median import time, ms")
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'Module':20} {'Median ms':>10} {'Max ms':>10}  Loaded")
+    for module in MODULES:
+        probe(module)  # прогрев кэша байт-кода
+        results = [probe(module) for _ in range(args.repeat)]
+        times = sorted(elapsed * 1000 for elapsed, _ in results)
+        heavy = results[-1][1]
+        median = statistics.median(times)
+        mark = ""
+        if median > args.budget or heavy:
+            mark = "  FAIL"
+            failures += 1
+        print(f"{module:20} {median:>10.1f} {times[-1]:>10.1f}  {', '.join(heavy) or '-'}{mark}")
+
+    example = os.path.join(ROOT, "example.jpg")
+    if os.path.exists(example):
+        _, heavy = probe("imadata_core", HEADER_ONLY.format(path=example))
+        print(f"header-only extract of example.jpg loads: {', '.join(heavy) or 'nothing heavy'}")
+        failures += bool(heavy)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
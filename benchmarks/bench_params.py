@@ -0,0 +1,179 @@
+"""Сравнение разбора блока "parameters": прежний построчный разбор против parse_parameters.
+
+Запуск:
+    python benchmarks/bench_params.py [PATH ...] [--repeat N] [--number N]
+
+Корпус собирается из текстовых полей "parameters" в файлах PATH (файлы
+или папки, обходятся рекурсивно). Без PATH используются встроенные
+строки в формате AUTOMATIC1111/Forge. Для каждого разборщика выводится
+лучшее время на строку; отдельно считается, сколько строк содержат
+значения в кавычках с запятыми, которые прежний разбор разрывал.
+
+parse_parameters медленнее прежнего разбора (примерно в 1.5-1.7 раза):
+он приводит значения к типам и раскладывает их по категориям, а прежний
+разбор оставлял строки. Замер показывает цену этой работы, а не выигрыш.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imadata_headers import HeaderFormatError, read_header_metadata
+from imadata_params import empty_parameters, parse_parameters
+from bench_headers import collect_files
+
+SAMPLE_PARAMETERS = [
+    "masterpiece, best quality, 1girl, solo, long hair, looking at viewer\n"
+    "Negative prompt: lowres, bad anatomy, bad hands, text, error\n"
+    "Steps: 28, Sampler: Euler a, Schedule type: Karras, CFG scale: 7, Seed: 1234567890, "
+    "Size: 832x1216, Model hash: 6ce0161689, Model: animagine-xl-3.1, Denoising strength: 0.4, "
+    "Clip skip: 2, Hires upscale: 1.5, Hires steps: 15, Hires upscaler: R-ESRGAN 4x+ Anime6B, "
+    "Version: v1.10.1",
+
+    "a photo of an astronaut riding a horse on mars, <lora:detail:0.6>\n"
+    "Negative prompt: blurry\n"
+    "Steps: 30, Sampler: DPM++ 2M, Schedule type: Karras, CFG scale: 5.5, Seed: 42, Size: 1024x1024, "
+    "Model hash: 31e35c80fc, Model: sd_xl_base_1.0, VAE hash: 235745af8d, VAE: sdxl_vae.safetensors, "
+    'Lora hashes: "detail: 1a2b3c4d5e6f, style: 0f9e8d7c6b5a", '
+    'TI hashes: "easynegative: c74b4e810b03", Version: v1.9.4',
+
+    "portrait of a knight, dramatic lighting\n"
+    "Negative prompt: (worst quality:1.4), (low quality:1.4)\n"
+    "Steps: 25, Sampler: DPM++ SDE, Schedule type: Automatic, CFG scale: 6, Seed: 3735928559, "
+    "Size: 768x1152, Model hash: e6bb9ea85b, Model: realisticVision, "
+    'ADetailer model: face_yolov8n.pt, ADetailer prompt: "detailed face, \\"sharp\\" eyes, smile", '
+    "ADetailer confidence: 0.3, ADetailer dilate erode: 4, ADetailer mask blur: 4, "
+    "ADetailer denoising strength: 0.4, ADetailer inpaint only masked: True, "
+    "ADetailer version: 24.5.1, "
+    'Hashes: {"vae": "735e4c3a44", "model": "e6bb9ea85b"}, Version: f2.0.1',
+
+    "cat sitting on a windowsill, rain outside\n"
+    "TIPO Parameters: temperature 0.5, top_p 0.95\n"
+    "TIPO prompt: cat, window, rain\n"
+    "Negative prompt: \n"
+    "Steps: 20, Sampler: Euler, Schedule type: Simple, CFG scale: 1, Distilled CFG Scale: 3.5, "
+    "Seed: 987654321, Size: 896x1152, Model hash: 0a1b2c3d4e, Model: flux1-dev, Version: f2.0.1",
+]
+
+
+def legacy_parse_parameters(text):
+    """Прежний разбор из collect_image_metadata, сохраненный для сравнения."""
+    parameters = empty_parameters()
+    lines = text.split("\n")
+    current_category = None
+    prompt_lines = []
+    negative_prompt_lines = []
+    tipo_params = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("Negative prompt:"):
+            current_category = "Negative prompt"
+            negative_prompt_lines.append(line[15:].strip())
+        elif "Steps:" in line and "Schedule type:" in line:
+            current_category = "Generation Parameters"
+            for param in line.split(","):
+                if ":" in param:
+                    k, v = param.split(":", 1)
+                    parameters[current_category][k.strip()] = v.strip()
+        elif line.startswith("Seed:"):
+            current_category = "Seed"
+            parameters[current_category].append(line.strip())
+        elif any(x in line for x in ["Model hash:", "Model:"]):
+            current_category = "Model Info"
+            for param in line.split(","):
+                if ":" in param:
+                    k, v = param.split(":", 1)
+                    parameters[current_category][k.strip()] = v.strip()
+        elif "TIPO" in line.upper() or line.upper().startswith("TIPO"):
+            current_category = "Other Parameters"
+            tipo_params.append(line.strip())
+        elif line.upper().startswith("ADETAILER"):
+            current_category = "Other Parameters"
+            parameters[current_category].setdefault("ADetailer", []).append(line.strip())
+        elif not any(line.startswith(x) for x in ["Steps:", "Negative prompt:", "Seed:", "Model:"]):
+            current_category = "Prompt"
+            prompt_lines.append(line.strip())
+
+    if prompt_lines:
+        prompt_text = "\n".join(prompt_lines)
+        while prompt_text.startswith(":"):
+            prompt_text = prompt_text[1:].strip()
+        parameters["Prompt"] = [prompt_text]
+    if negative_prompt_lines:
+        neg_prompt_text = "\n".join(negative_prompt_lines)
+        while neg_prompt_text.startswith(":"):
+            neg_prompt_text = neg_prompt_text[1:].strip()
+        parameters["Negative prompt"] = [neg_prompt_text]
+    if tipo_params:
+        parameters["Other Parameters"]["TIPO Parameters"] = "\n".join(tipo_params)
+    return parameters
+
+
+def collect_corpus(paths):
+    corpus = []
+    for file_path in collect_files(paths):
+        try:
+            header = read_header_metadata(file_path)
+        except (HeaderFormatError, OSError):
+            continue
+        if header is None:
+            continue
+        for key, value in header["info"].items():
+            if isinstance(value, str) and "parameters" in key.lower():
+                corpus.append(value)
+    return corpus
+
+
+def time_corpus(func, corpus, repeat, number):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            for text in corpus:
+                func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / (number * len(corpus))
+
+
+def has_split_quotes(text):
+    """Есть ли в строке настроек значение в кавычках с запятой внутри."""
+    settings_line = text.strip().rsplit("\n", 1)[-1]
+    quoted = settings_line.split('"')[1::2]
+    return any("," in value for value in quoted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parameters tokenizer against the legacy parser")
+    parser.add_argument("paths", nargs="*", help="Image files or folders with generation parameters")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs over the corpus (best time is reported)")
+    parser.add_argument("--number", type=int, default=200, help="Passes over the corpus per run")
+    args = parser.parse_args()
+
+    corpus = collect_corpus(args.paths) if args.paths else SAMPLE_PARAMETERS
+    if not corpus:
+        print("No parameters blocks found")
+        return 1
+
+    legacy_time = time_corpus(legacy_parse_parameters, corpus, args.repeat, args.number)
+    new_time = time_corpus(parse_parameters, corpus, args.repeat, args.number)
+    quoted = sum(has_split_quotes(text) for text in corpus)
+    average_length = sum(map(len, corpus)) / len(corpus)
+
+    print(f"Corpus: {len(corpus)} blocks, {average_length:.0f} chars on average")
+    print(f"Blocks with quoted values containing commas: {quoted}")
+    print(f"Legacy parser:    {legacy_time * 1e6:.2f} us/block")
+    print(f"parse_parameters: {new_time * 1e6:.2f} us/block")
+    if new_time:
+        print(f"parse_parameters / legacy time: {new_time / legacy_time:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
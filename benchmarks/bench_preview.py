@@ -0,0 +1,85 @@
+"""Время до первого превью: полное декодирование Qt против draft/reduce в Pillow.
+
+Запуск:
+    python benchmarks/bench_preview.py PATH [PATH ...] [--size 1920x1080] [--repeat N]
+
+Старый путь — QPixmap/QImage(file_path) в полном разрешении и отдельное
+открытие через Pillow для метаданных. Новый путь — одно открытие Pillow,
+метаданные из того же объекта и превью через make_preview.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PIL.Image
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage
+from PyQt6.QtWidgets import QApplication
+
+from imadata2 import extract_metadata, make_preview, pil_to_qimage
+from bench_headers import collect_files
+
+
+def old_path(file_path, size):
+    image = QImage(file_path)
+    image.scaled(size[0], size[1], Qt.AspectRatioMode.KeepAspectRatio,
+                 Qt.TransformationMode.SmoothTransformation)
+    extract_metadata(file_path)
+
+
+def new_path(file_path, size):
+    with PIL.Image.open(file_path) as img:
+        extract_metadata(file_path, image=img)
+        image = pil_to_qimage(make_preview(img, size))
+    image.scaled(size[0], size[1], Qt.AspectRatioMode.KeepAspectRatio,
+                 Qt.TransformationMode.SmoothTransformation)
+
+
+def best_time(func, file_path, size, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path, size)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time to first preview")
+    parser.add_argument("paths", nargs="+", help="Image files or folders")
+    parser.add_argument("--size", default="1920x1080", help="Preview size, WIDTHxHEIGHT")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per file (best time is reported)")
+    args = parser.parse_args()
+
+    size = tuple(int(x) for x in args.size.lower().split("x"))
+    # Ссылка держит QApplication живым до конца замеров
+    _app = QApplication(sys.argv)
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No image files found")
+        return 1
+
+    total_old = total_new = 0.0
+    print(f"{'File':40} {'Old ms':>10} {'New ms':>10} {'Speedup':>8}")
+    for file_path in files:
+        old = best_time(old_path, file_path, size, args.repeat)
+        new = best_time(new_path, file_path, size, args.repeat)
+        total_old += old
+        total_new += new
+        print(f"{os.path.basename(file_path)[:40]:40} {old * 1000:>10.2f} {new * 1000:>10.2f} "
+              f"{old / new:>7.1f}x")
+
+    print()
+    print(f"Total: old {total_old * 1000:.1f} ms, new {total_new * 1000:.1f} ms, "
+          f"speedup {total_old / total_new:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
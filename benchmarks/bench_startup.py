@@ -0,0 +1,75 @@
+"""Время холодного запуска окна просмотра с файлом в аргументах.
+
+Запуск:
+    python benchmarks/bench_startup.py [FILE] [--repeat N] [--platform NAME]
+
+Каждый запуск — новый процесс `imadata2.py --profile FILE`, как при
+открытии файла из файлового менеджера. По выводу --profile замеряется
+время от запуска процесса до показа окна и до того, как файл показан
+(превью и таблица метаданных заполнены). Каждый запуск получает пустую
+папку настроек (XDG_CONFIG_HOME), поэтому кэш метаданных холодный.
+По умолчанию используется платформа Qt offscreen; с --platform xcb,
+wayland и т. п. замеряется запуск с настоящим окном.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIEWER = os.path.join(ROOT, "imadata2.py")
+
+
+def run_once(file_path, platform, timeout):
+    """Запускает окно и возвращает (до показа окна, до показа файла) в секундах."""
+    with tempfile.TemporaryDirectory() as config:
+        env = dict(os.environ, QT_QPA_PLATFORM=platform, XDG_CONFIG_HOME=config)
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, VIEWER, "--profile", file_path], env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        shown = loaded = None
+        try:
+            for line in process.stderr:
+                if line.startswith("window shown:"):
+                    shown = time.perf_counter() - start
+                elif line.startswith(file_path + ":"):
+                    loaded = time.perf_counter() - start
+                    break
+                if time.perf_counter() - start > timeout:
+                    break
+        finally:
+            process.kill()
+            process.wait()
+    if shown is None or loaded is None:
+        raise RuntimeError(f"The viewer did not report loading {file_path}")
+    return shown, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the viewer with a file argument")
+    parser.add_argument("file", nargs="?", default=os.path.join(ROOT, "example.jpg"),
+                        help="Image to open (default: example.jpg)")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of launches")
+    parser.add_argument("--platform", default=os.environ.get("QT_QPA_PLATFORM", "offscreen"),
+                        help="Qt platform plugin (default: offscreen)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for one launch")
+    args = parser.parse_args()
+
+    file_path = os.path.abspath(args.file)
+    run_once(file_path, args.platform, args.timeout)  # прогрев кэша байт-кода и диска
+    results = [run_once(file_path, args.platform, args.timeout) for _ in range(args.repeat)]
+
+    for name, values in (("window shown", [shown for shown, _ in results]),
+                         ("file displayed", [loaded for _, loaded in results])):
+        values = [value * 1000 for value in values]
+        print(f"{name:15} median {statistics.median(values):7.1f} ms, "
+              f"min {min(values):7.1f} ms, max {max(values):7.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Набор бенчмарков на синтетическом корпусе с сохранением результатов в JSON.
+
+Запуск:
+    python benchmarks/bench_suite.py [--corpus DIR] [--count N] [--seed S]
+                                     [--output results.json] [--compare baseline.json]
+
+Корпус создается benchmarks/corpus.py (или берется готовый с теми же
+аргументами). Измеряются:
+    extract_pillow, extract_headers  extract_metadata через Pillow и по заголовкам
+    table_populate                   build_metadata_rows, загрузка модели и высоты видимых строк
+    filter_keystroke                 фильтр таблицы на каждое нажатие при наборе запроса
+    preview_decode                   make_preview до 1920×1080 и построение пирамиды
+    preview_scale                    масштабирование пирамиды при изменении размера окна
+    export_txt, export_csv, export_json  запись экспорта
+Для каждого этапа сохраняются число замеров, среднее, медиана, p95 и
+максимум в миллисекундах. С --compare выводится изменение медиан
+относительно прошлого запуска; рост больше --threshold отмечается как регрессия.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PIL
+import PIL.Image
+from PyQt6.QtCore import QT_VERSION_STR
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtWidgets import QApplication
+
+from imadata2 import (MetadataTableView, PreviewPyramid, build_metadata_rows, make_preview,
+                      pil_to_qimage, write_metadata_export)
+from imadata_core import extract_metadata
+from corpus import load_or_generate
+
+PREVIEW_SIZE = (1920, 1080)
+# Размеры окна, через которые проходит превью при перетаскивании края
+RESIZE_STEPS = ((1600, 900), (1280, 720), (1024, 600), (800, 480))
+
+
+def timed(samples, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def summarize(values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000,
+        "median_ms": statistics.median(values) * 1000,
+        "p95_ms": p95 * 1000,
+        "max_ms": values[-1] * 1000,
+        "total_ms": sum(values) * 1000,
+    }
+
+
+def filter_query(parameters):
+    """Запрос для фильтра: первое длинное слово промпта файла."""
+    for prompt in parameters["Prompt"]:
+        for word in prompt.replace(",", " ").split():
+            word = word.strip("()<>:")
+            if len(word) >= 6 and word.isalpha():
+                return word
+    return "metadata"
+
+
+def bench_extract(files, samples):
+    metadata = {}
+    for file_path in files:
+        timed(samples, "extract_headers", extract_metadata, file_path, True)
+        metadata[file_path] = timed(samples, "extract_pillow", extract_metadata, file_path)
+    return metadata
+
+
+def bench_table(metadata, samples):
+    view = MetadataTableView()
+    view.resize(900, 700)
+    view.show()
+    QApplication.processEvents()
+
+    def populate(result):
+        rows, _ = build_metadata_rows(result["parameters"], result["categories"])
+        view.set_rows(rows)
+        view.resize_visible_rows()
+        view.viewport().repaint()
+
+    model = view.metadata_model
+    for result in metadata.values():
+        timed(samples, "table_populate", populate, result)
+
+        # Набор запроса по одному символу, как в поле поиска
+        query = filter_query(result["parameters"])
+        for length in range(1, len(query) + 1):
+            def keystroke(text=query[:length]):
+                model.filter_rows(text)
+                view.resize_visible_rows()
+                view.viewport().repaint()
+            timed(samples, "filter_keystroke", keystroke)
+        model.filter_rows("")
+        QApplication.processEvents()
+    view.close()
+
+
+def bench_preview(files, samples):
+    for file_path in files:
+        def decode():
+            with PIL.Image.open(file_path) as img:
+                image = pil_to_qimage(make_preview(img, PREVIEW_SIZE))
+            return PreviewPyramid(QPixmap.fromImage(image))
+        pyramid = timed(samples, "preview_decode", decode)
+
+        for width, height in RESIZE_STEPS:
+            # Во время перетаскивания — быстрое масштабирование, после — сглаженное
+            timed(samples, "preview_scale", pyramid.scaled, width, height, False)
+        timed(samples, "preview_scale", pyramid.scaled, *RESIZE_STEPS[-1], True)
+
+
+def bench_export(metadata, samples):
+    with tempfile.TemporaryDirectory() as directory:
+        for file_path, result in metadata.items():
+            _, metadata_dict = build_metadata_rows(result["parameters"], result["categories"])
+            for ext in ("txt", "csv", "json"):
+                timed(samples, f"export_{ext}", write_metadata_export,
+                      os.path.join(directory, f"export.{ext}"), file_path, metadata_dict)
+
+
+def compare(results, baseline, threshold):
+    """Печатает изменение медиан относительно прошлого запуска; возвращает число регрессий."""
+    regressions = 0
+    print()
+    print(f"{'Stage':20} {'Baseline ms':>12} {'Current ms':>12} {'Change':>9}")
+    for name, stage in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old is None:
+            print(f"{name:20} {'-':>12} {stage['median_ms']:>12.3f} {'new':>9}")
+            continue
+        change = (stage["median_ms"] - old["median_ms"]) / old["median_ms"] if old["median_ms"] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  REGRESSION"
+            regressions += 1
+        print(f"{name:20} {old['median_ms']:>12.3f} {stage['median_ms']:>12.3f} {change:>+9.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction, table, filter, preview and export")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "imadata-bench-corpus"),
+                        help="Corpus folder (generated if missing or created with other arguments)")
+    parser.add_argument("--count", type=int, default=200, help="Number of regular images in the corpus")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus random seed")
+    parser.add_argument("--large", type=int, default=2, help="Number of very large images in the corpus")
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="Compare medians with a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Median slowdown reported as a regression (default: 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    # Ссылка держит QApplication живым до конца замеров
+    _app = QApplication(sys.argv)
+
+    start = time.perf_counter()
+    files = load_or_generate(args.corpus, args.count, args.seed, args.large)
+    print(f"Corpus: {len(files)} files in {args.corpus} ({time.perf_counter() - start:.1f} s)")
+
+    # Первый вызов загружает плагины Pillow и модули; в замеры он не входит
+    extract_metadata(files[0])
+
+    samples = {}
+    metadata = bench_extract(files, samples)
+    bench_table(metadata, samples)
+    bench_preview(files, samples)
+    bench_export(metadata, samples)
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pillow": PIL.__version__,
+            "qt": QT_VERSION_STR,
+        },
+        "corpus": {"count": args.count, "seed": args.seed, "large": args.large, "files": len(files)},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": {name: summarize(values) for name, values in samples.items()},
+    }
+
+    print(f"{'Stage':20} {'Count':>6} {'Mean ms':>10} {'Median ms':>10} {'p95 ms':>10} {'Max ms':>10}")
+    for name, stage in results["stages"].items():
+        print(f"{name:20} {stage['count']:>6} {stage['mean_ms']:>10.3f} {stage['median_ms']:>10.3f} "
+              f"{stage['p95_ms']:>10.3f} {stage['max_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Воспроизводимый синтетический корпус изображений для бенчмарков.
+
+Запуск:
+    python benchmarks/corpus.py DIR [--count N] [--seed S] [--large N]
+
+Картинки рисуются draw_example_image (той же функцией, что и example.jpg),
+метаданные генерируются генератором случайных чисел с фиксированным seed,
+поэтому при тех же аргументах получаются те же файлы. В корпус входят:
+PNG с блоком parameters в стиле AUTOMATIC1111 разной длины (с LoRA,
+ADetailer, хэшами в кавычках и JSON), JPEG с подробным EXIF и GPS,
+WebP и TIFF с EXIF и очень большие изображения. Рядом с файлами пишется
+manifest.json с аргументами генерации.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PIL.Image
+from PIL.PngImagePlugin import PngInfo
+
+from imadata2 import draw_example_image
+
+# Версия генератора: меняется, если меняется содержимое корпуса
+CORPUS_VERSION = 1
+
+# Доли форматов в основной части корпуса
+FORMAT_WEIGHTS = (("png", 50), ("jpeg", 25), ("webp", 13), ("tiff", 12))
+
+SIZES = ((512, 512), (512, 768), (768, 512), (832, 1216), (1024, 1024), (1216, 832), (1920, 1080))
+LARGE_SIZES = ((8192, 6144), (6000, 4000), (7680, 4320))
+
+TAGS = (
+    "masterpiece", "best quality", "1girl", "solo", "long hair", "looking at viewer", "smile",
+    "blue eyes", "outdoors", "sky", "cloud", "cityscape", "night", "neon lights", "rain",
+    "portrait", "upper body", "dramatic lighting", "cinematic", "depth of field", "bokeh",
+    "highly detailed", "sharp focus", "volumetric lighting", "sunset", "forest", "river",
+    "mountain", "castle", "knight", "armor", "sword", "dragon", "fantasy", "sci-fi",
+    "cyberpunk", "watercolor", "oil painting", "photorealistic", "film grain", "8k",
+    "astronaut", "horse", "cat", "windowsill", "flowers", "cherry blossoms", "snow",
+)
+NEGATIVE_TAGS = (
+    "lowres", "bad anatomy", "bad hands", "text", "error", "missing fingers", "extra digit",
+    "cropped", "worst quality", "low quality", "jpeg artifacts", "signature", "watermark",
+    "blurry", "deformed", "disfigured", "extra limbs",
+)
+SAMPLERS = ("Euler a", "Euler", "DPM++ 2M", "DPM++ SDE", "DPM++ 2M SDE", "UniPC", "DDIM")
+SCHEDULES = ("Karras", "Automatic", "Exponential", "Simple", "SGM Uniform")
+MODELS = ("animagine-xl-3.1", "sd_xl_base_1.0", "realisticVision_v60", "flux1-dev", "ponyDiffusionV6XL")
+LORAS = ("add_detail", "epi_noiseoffset", "more_details", "film_style", "lcm_lora_sdxl")
+CAMERAS = (("Canon", "Canon EOS R5"), ("NIKON CORPORATION", "NIKON Z 6_2"),
+           ("SONY", "ILCE-7M4"), ("FUJIFILM", "X-T5"))
+
+
+def random_hash(rng, length=10):
+    return "".join(rng.choice("0123456789abcdef") for _ in range(length))
+
+
+def random_prompt(rng, tokens):
+    """Промпт из тегов с весами и LoRA; иногда в несколько строк."""
+    parts = []
+    for _ in range(tokens):
+        tag = rng.choice(TAGS)
+        roll = rng.random()
+        if roll < 0.1:
+            tag = f"({tag}:{rng.uniform(0.5, 1.5):.1f})"
+        elif roll < 0.13:
+            tag = f"<lora:{rng.choice(LORAS)}:{rng.uniform(0.2, 1.0):.1f}>"
+        parts.append(tag)
+    prompt = ", ".join(parts)
+    if tokens > 30 and rng.random() < 0.3:
+        # Длинные промпты часто разбиты на строки
+        middle = len(prompt) // 2
+        cut = prompt.find(", ", middle)
+        if cut > 0:
+            prompt = prompt[:cut + 1] + "\n" + prompt[cut + 2:]
+    return prompt
+
+
+def random_parameters(rng):
+    """Блок parameters в формате AUTOMATIC1111/Forge."""
+    tokens = rng.choice((8, 20, 40, 80, 160, 400))
+    lines = [random_prompt(rng, tokens)]
+    if rng.random() < 0.15:
+        lines.append(f"TIPO Parameters: temperature {rng.uniform(0.3, 1.0):.2f}, top_p 0.95")
+    lines.append("Negative prompt: " + ", ".join(rng.sample(NEGATIVE_TAGS, rng.randint(2, 12))))
+
+    width, height = rng.choice(SIZES)
+    model_hash = random_hash(rng)
+    settings = [
+        f"Steps: {rng.randint(15, 60)}",
+        f"Sampler: {rng.choice(SAMPLERS)}",
+        f"Schedule type: {rng.choice(SCHEDULES)}",
+        f"CFG scale: {rng.choice((3, 4.5, 5, 5.5, 6, 7, 7.5, 9))}",
+        f"Seed: {rng.randint(0, 2 ** 32 - 1)}",
+        f"Size: {width}x{height}",
+        f"Model hash: {model_hash}",
+        f"Model: {rng.choice(MODELS)}",
+    ]
+    if rng.random() < 0.5:
+        settings.append(f"Denoising strength: {rng.uniform(0.2, 0.7):.2f}")
+        settings.append(f"Hires upscale: {rng.choice((1.5, 2))}")
+        settings.append(f"Hires steps: {rng.randint(10, 20)}")
+        settings.append("Hires upscaler: R-ESRGAN 4x+ Anime6B")
+    if rng.random() < 0.5:
+        loras = rng.sample(LORAS, rng.randint(1, 3))
+        settings.append('Lora hashes: "' + ", ".join(f"{name}: {random_hash(rng, 12)}"
+                                                     for name in loras) + '"')
+    if rng.random() < 0.3:
+        settings.extend([
+            "ADetailer model: face_yolov8n.pt",
+            'ADetailer prompt: "' + random_prompt(rng, 6).replace('"', '\\"') + ', \\"sharp\\" eyes"',
+            f"ADetailer confidence: {rng.uniform(0.2, 0.5):.1f}",
+            "ADetailer version: 24.5.1",
+        ])
+    settings.append(f'Hashes: {{"vae": "{random_hash(rng)}", "model": "{model_hash}"}}')
+    settings.append(f"Version: v1.{rng.randint(6, 10)}.{rng.randint(0, 2)}")
+    lines.append(", ".join(settings))
+    return "\n".join(lines)
+
+
+def random_exif(rng, with_parameters=False):
+    """EXIF с камерой, экспозицией (Exif IFD) и координатами (GPS IFD)."""
+    exif = PIL.Image.Exif()
+    make, model = rng.choice(CAMERAS)
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif[0x0131] = "Image Metadata Viewer corpus"
+    exif[0x0132] = f"2024:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} 12:00:00"
+    exif[0x013B] = "Benchmark"
+
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x829A] = 1 / rng.choice((30, 60, 125, 250, 500, 1000))  # ExposureTime
+    exif_ifd[0x829D] = rng.choice((1.8, 2.8, 4.0, 5.6, 8.0))           # FNumber
+    exif_ifd[0x8827] = rng.choice((100, 200, 400, 800, 1600, 3200))   # ISOSpeedRatings
+    exif_ifd[0x920A] = rng.choice((24.0, 35.0, 50.0, 85.0, 135.0))    # FocalLength
+    exif_ifd[0x9209] = 16                                             # Flash
+    exif_ifd[0xA434] = "RF24-105mm F4 L IS USM"                       # LensModel
+    if with_parameters:
+        # Так AUTOMATIC1111 сохраняет параметры в JPEG и WebP
+        exif_ifd[0x9286] = b"UNICODE\x00" + random_parameters(rng).encode("utf-16-be")
+
+    gps = exif.get_ifd(0x8825)
+    gps[1] = rng.choice("NS")
+    gps[2] = (float(rng.randint(0, 89)), float(rng.randint(0, 59)), round(rng.uniform(0, 60), 2))
+    gps[3] = rng.choice("EW")
+    gps[4] = (float(rng.randint(0, 179)), float(rng.randint(0, 59)), round(rng.uniform(0, 60), 2))
+    gps[6] = round(rng.uniform(0, 3000), 1)
+    return exif
+
+
+def random_image(rng, size, index):
+    background = tuple(rng.randint(0, 255) for _ in range(3))
+    return draw_example_image(size, f"Benchmark image {index}", background)
+
+
+def generate_corpus(directory, count=200, seed=1234, large=2):
+    """Создает корпус в directory и возвращает список путей к файлам."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    formats = [name for name, weight in FORMAT_WEIGHTS for _ in range(weight)]
+    files = []
+
+    for index in range(count):
+        image_format = rng.choice(formats)
+        img = random_image(rng, rng.choice(SIZES), index)
+        base = os.path.join(directory, f"{index:05d}")
+        if image_format == "png":
+            info = PngInfo()
+            info.add_text("parameters", random_parameters(rng))
+            path = base + ".png"
+            img.save(path, "PNG", pnginfo=info)
+        elif image_format == "jpeg":
+            path = base + ".jpg"
+            img.save(path, "JPEG", quality=90, exif=random_exif(rng, rng.random() < 0.5).tobytes())
+        elif image_format == "webp":
+            path = base + ".webp"
+            img.save(path, "WEBP", quality=80, exif=random_exif(rng, True).tobytes())
+        else:
+            path = base + ".tiff"
+            exif = random_exif(rng)
+            exif[0x010E] = random_parameters(rng)  # ImageDescription
+            # Сжатие через libtiff не записывает вложенные IFD, поэтому без сжатия
+            img.save(path, "TIFF", exif=exif.tobytes())
+        files.append(path)
+
+    for index in range(large):
+        size = LARGE_SIZES[index % len(LARGE_SIZES)]
+        img = random_image(rng, size, f"large {index}")
+        path = os.path.join(directory, f"large_{index:02d}.jpg")
+        img.save(path, "JPEG", quality=90, exif=random_exif(rng, True).tobytes())
+        files.append(path)
+
+    manifest = {"version": CORPUS_VERSION, "count": count, "seed": seed, "large": large,
+                "files": [os.path.basename(path) for path in files]}
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return files
+
+
+def load_or_generate(directory, count=200, seed=1234, large=2):
+    """Берет готовый корпус, если он создан с теми же аргументами, иначе создает заново."""
+    try:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    expected = {"version": CORPUS_VERSION, "count": count, "seed": seed, "large": large}
+    if manifest and all(manifest.get(key) == value for key, value in expected.items()):
+        files = [os.path.join(directory, name) for name in manifest["files"]]
+        if all(os.path.exists(path) for path in files):
+            return files
+    return generate_corpus(directory, count, seed, large)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic image corpus")
+    parser.add_argument("directory", help="Output folder")
+    parser.add_argument("--count", type=int, default=200, help="Number of regular images")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed")
+    parser.add_argument("--large", type=int, default=2, help="Number of very large JPEGs")
+    args = parser.parse_args()
+
+    files = generate_corpus(args.directory, args.count, args.seed, args.large)
+    size = sum(os.path.getsize(path) for path in files)
+    print(f"Generated {len(files)} files ({size / 1024 / 1024:.1f} MB) in {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
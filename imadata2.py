@@ -1,18 +1,342 @@
 import sys
 import os
+import sqlite3
+import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout, 
-                            QWidget, QTableWidget, QTableWidgetItem, QPushButton, 
+                            QWidget, QTableView, QPushButton, 
                             QHBoxLayout, QFileDialog, QHeaderView, QSplitter,
                             QDialog, QDialogButtonBox, QTextEdit, QLineEdit,
                             QScrollArea, QFrame, QGridLayout, QToolBar, QStatusBar,
-                            QToolButton, QMenu, QSizePolicy)
-from PyQt6.QtCore import Qt, QSize, QPoint, QSettings, QTimer, QUrl
+                            QToolButton, QMenu, QSizePolicy, QProgressBar,
+                            QListView, QDockWidget, QListWidget, QListWidgetItem,
+                            QTabWidget, QTableWidget, QTableWidgetItem, QPlainTextEdit,
+                            QComboBox, QSpinBox)
+from PyQt6.QtCore import (Qt, QSize, QPoint, QSettings, QTimer, QUrl, QObject,
+                          QRunnable, QThreadPool, pyqtSignal, QAbstractTableModel,
+                          QAbstractListModel, QModelIndex)
 from PyQt6.QtGui import (QDragEnterEvent, QDropEvent, QIcon, QPixmap, QColor, 
-                         QPalette, QFont, QAction, QDesktopServices)
-import PIL.Image
-from PIL.ExifTags import TAGS
-import pyperclip
+                         QPalette, QFont, QAction, QDesktopServices, QImage,
+                         QShortcut, QKeySequence, QFontDatabase)
+
+from imadata_binary import (HEX_LINE_WIDTH, PAYLOAD_EXTENSIONS, detect_payload, hex_line,
+                            is_text_payload, payload_structure, save_binary, text_preview)
+from imadata_core import (IMAGE_EXTENSIONS, expand_metadata_node, extract_metadata,
+                          list_image_files, open_binary_value)
+from imadata_params import format_parameter_value
+from imadata_compare import (DEFAULT_THREADS, compare_records, extract_fields, format_counts,
+                              format_diff)
+from imadata_dupes import DEFAULT_DISTANCE, HASH_KINDS, find_clusters, hash_files
+from imadata_cache import (MetadataCache, default_thumbnail_dir, evict_thumbnails,
+                           thumbnail_path, thumbnail_stats, touch_thumbnail)
+from imadata_search import SearchIndex
+from imadata_profile import NULL_PROFILE, Profiler, open_counted
+
+# Режимы Pillow, которые Qt читает напрямую: (формат QImage, байт на пиксель)
+PREVIEW_FORMATS = {
+    "RGB": (QImage.Format.Format_RGB888, 3),
+    "RGBA": (QImage.Format.Format_RGBA8888, 4),
+    "L": (QImage.Format.Format_Grayscale8, 1),
+}
+
+# Размер миниатюр в галерее, пикселей
+THUMBNAIL_SIZE = 128
+# Как часто (в записанных миниатюрах) проверять объем их кэша на диске
+THUMBNAIL_EVICTION_INTERVAL = 256
+
+# Сколько соседних файлов в каждую сторону готовить заранее
+PREFETCH_DISTANCE = 2
+
+# Таблица стилей всего приложения. Виджеты выбираются по классу
+# (в том числе по имени Python-подкласса) или по objectName
+APP_STYLESHEET = """
+    QScrollBar:vertical {
+        border: none;
+        background-color: #2a2a2a;
+        width: 10px;
+        margin: 0px;
+    }
+    QScrollBar::handle:vertical {
+        background-color: #5a5a5a;
+        min-height: 30px;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:vertical:hover {
+        background-color: #6a6a6a;
+    }
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+        border: none;
+        background: none;
+        height: 0px;
+    }
+    QScrollBar:horizontal {
+        border: none;
+        background-color: #2a2a2a;
+        height: 10px;
+        margin: 0px;
+    }
+    QScrollBar::handle:horizontal {
+        background-color: #5a5a5a;
+        min-width: 30px;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:horizontal:hover {
+        background-color: #6a6a6a;
+    }
+    QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
+        border: none;
+        background: none;
+        width: 0px;
+    }
+    QToolTip {
+        background-color: #2d2d2d;
+        color: #e0e0e0;
+        border: 1px solid #555555;
+        padding: 5px;
+    }
+    
+    QToolBar {
+        background-color: #252525;
+        border: none;
+        spacing: 5px;
+        padding: 2px 5px;
+    }
+    QToolBar QToolButton {
+        color: #e0e0e0;
+        background-color: transparent;
+        border: none;
+        border-radius: 4px;
+        padding: 5px;
+        margin: 2px;
+    }
+    QToolBar QToolButton:hover {
+        background-color: #3a3a3a;
+    }
+    QToolBar QToolButton:pressed {
+        background-color: #444444;
+    }
+    QToolBar QToolButton:checked {
+        background-color: #0078d4;
+    }
+    
+    QMenu {
+        background-color: #2d2d2d;
+        color: #e0e0e0;
+        border: 1px solid #555555;
+    }
+    QMenu::item {
+        padding: 5px 20px 5px 20px;
+    }
+    QMenu::item:selected {
+        background-color: #0078d4;
+    }
+    
+    QStatusBar {
+        background-color: #252525;
+        color: #aaaaaa;
+    }
+    StatusMessage {
+        color: #aaaaaa;
+        font-size: 13px;
+        padding: 2px 10px;
+    }
+    
+    QSplitter::handle {
+        background-color: #555555;
+    }
+    
+    QDockWidget {
+        color: #e0e0e0;
+    }
+    QDockWidget::title {
+        background-color: #252525;
+        padding: 4px;
+    }
+    
+    DropArea {
+        border: 2px dashed #555555;
+        border-radius: 6px;
+        padding: 12px;
+        color: #cccccc;
+        font-size: 15px;
+        background-color: #2a2a2a;
+    }
+    DropArea:hover {
+        background-color: #333333;
+        border-color: #777777;
+    }
+    DropArea[dragActive="true"] {
+        border-color: #0078d4;
+        color: #ffffff;
+        background-color: rgba(0, 120, 212, 0.1);
+    }
+    
+    ImageViewer, ImageViewer QWidget {
+        background-color: #1a1a1a;
+        border: none;
+        border-radius: 6px;
+    }
+    
+    QFrame#fileInfo, QFrame#fileInfo QLabel {
+        background-color: #2a2a2a;
+        border-radius: 6px;
+        padding: 8px;
+    }
+    QFrame#fileInfo QLabel {
+        color: #e0e0e0;
+        font-weight: normal;
+    }
+    QFrame#fileInfo QLabel#fileInfoKey {
+        color: #aaaaaa;
+    }
+    
+    QLabel#searchLabel {
+        color: #e0e0e0;
+        font-weight: bold;
+    }
+    SearchBox {
+        background-color: #333333;
+        color: white;
+        border: 1px solid #555555;
+        padding: 8px 12px;
+        border-radius: 4px;
+        font-size: 13px;
+    }
+    SearchBox:focus {
+        border: 1px solid #007acc;
+    }
+    SearchOptionButton {
+        background-color: #333333;
+        color: #cccccc;
+        border: 1px solid #555555;
+        padding: 6px 8px;
+        border-radius: 4px;
+        font-size: 13px;
+    }
+    SearchOptionButton:hover {
+        background-color: #3d3d3d;
+    }
+    SearchOptionButton:checked {
+        background-color: #0078d4;
+        border-color: #0078d4;
+        color: white;
+    }
+    
+    MetadataTableView {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border: none;
+        border-radius: 6px;
+        gridline-color: #3a3a3a;
+    }
+    MetadataTableView QHeaderView::section {
+        background-color: #2d2d2d;
+        color: #e0e0e0;
+        padding: 6px;
+        border: none;
+        font-weight: bold;
+    }
+    MetadataTableView::item {
+        padding: 4px;
+        border-bottom: 1px solid #3a3a3a;
+    }
+    MetadataTableView::item:selected {
+        background-color: #0078d4;
+    }
+    
+    ActionButton {
+        background-color: #2d2d2d;
+        color: white;
+        border: none;
+        padding: 8px 16px;
+        border-radius: 4px;
+        font-weight: normal;
+        min-width: 110px;
+    }
+    ActionButton:hover {
+        background-color: #3d3d3d;
+    }
+    ActionButton:pressed {
+        background-color: #444444;
+    }
+    ActionButton:disabled {
+        background-color: #252525;
+        color: #777777;
+    }
+    PrimaryButton {
+        background-color: #0078d4;
+    }
+    PrimaryButton:hover {
+        background-color: #1084d8;
+    }
+    PrimaryButton:pressed {
+        background-color: #006cbe;
+    }
+    PrimaryButton:disabled {
+        background-color: #25476a;
+        color: #a0a0a0;
+    }
+    
+    GalleryView {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border: none;
+    }
+    GalleryView::item:selected {
+        background-color: #0078d4;
+        border-radius: 4px;
+    }
+    
+    LibrarySearchPanel QListWidget {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border: none;
+    }
+    LibrarySearchPanel QListWidget::item {
+        padding: 4px;
+    }
+    LibrarySearchPanel QListWidget::item:selected {
+        background-color: #0078d4;
+    }
+    LibrarySearchPanel QLabel {
+        color: #aaaaaa;
+    }
+    
+    FullImageDialog, BinaryInspectorDialog, ValueDialog, CompareDialog,
+    DuplicatesDialog {
+        background-color: #2d2d2d;
+    }
+    FullImageDialog QLabel, BinaryInspectorDialog QLabel, ValueDialog QLabel, CompareDialog QLabel,
+    DuplicatesDialog QLabel {
+        color: #e0e0e0;
+    }
+    FullImageDialog QPushButton, BinaryInspectorDialog QPushButton, ValueDialog QPushButton,
+    CompareDialog QPushButton, DuplicatesDialog QPushButton {
+        background-color: #333333;
+        color: white;
+        border: none;
+        padding: 8px 16px;
+        border-radius: 4px;
+    }
+    FullImageDialog QPushButton:hover, BinaryInspectorDialog QPushButton:hover,
+    ValueDialog QPushButton:hover, CompareDialog QPushButton:hover, DuplicatesDialog QPushButton:hover {
+        background-color: #444444;
+    }
+    FullImageDialog QPushButton#primaryButton, BinaryInspectorDialog QPushButton#primaryButton,
+    ValueDialog QPushButton#primaryButton, CompareDialog QPushButton#primaryButton,
+    DuplicatesDialog QPushButton#primaryButton {
+        background-color: #0078d4;
+    }
+    FullImageDialog QPushButton#primaryButton:hover,
+    BinaryInspectorDialog QPushButton#primaryButton:hover,
+    ValueDialog QPushButton#primaryButton:hover, CompareDialog QPushButton#primaryButton:hover,
+    DuplicatesDialog QPushButton#primaryButton:hover {
+        background-color: #1084d8;
+    }
+"""
 
 class ClickableLabel(QLabel):
     def __init__(self, text="", parent=None):
@@ -28,59 +352,503 @@ class ClickableLabel(QLabel):
         if parent:
             parent.show_full_image()
 
-class MetadataTableWidget(QTableWidget):
+# Типы строк в таблице метаданных
+ROW_CATEGORY = 0      # Заголовок категории ("Parameters", "File Info", ...)
+ROW_SUBCATEGORY = 1   # Подзаголовок внутри "Parameters" ("  Prompt", ...)
+ROW_ITEM = 2          # Пара "свойство — значение"
+
+# Предел превью значения в ячейке; полный текст открывается в ValueDialog
+PREVIEW_MAX_CHARS = 500
+PREVIEW_MAX_LINES = 6
+
+def preview_text(value):
+    """Начало значения для ячейки (не больше PREVIEW_MAX_LINES строк и
+    PREVIEW_MAX_CHARS символов) и признак того, что значение обрезано.
+    
+    Просматривается только начало строки, поэтому стоимость не зависит
+    от длины значения.
+    """
+    head = value[:PREVIEW_MAX_CHARS]
+    lines = head.split("\n", PREVIEW_MAX_LINES)
+    if len(lines) > PREVIEW_MAX_LINES:
+        head = "\n".join(lines[:PREVIEW_MAX_LINES])
+    if len(head) == len(value):
+        return value, False
+    return head.rstrip() + " …", True
+
+def build_metadata_rows(parameters, categories):
+    """Превращает категории метаданных в плоский список строк таблицы.
+    
+    Каждая строка — кортеж (тип, ключ, значение) из простых строк.
+    Возвращает этот список и словарь метаданных для экспорта.
+    """
+    rows = []
+    metadata_dict = {}
+    
+    # Сначала добавляем параметры
+    if any(parameters[cat] for cat in parameters):
+        rows.append((ROW_CATEGORY, "Parameters", ""))
+        
+        for category, items in parameters.items():
+            if not items:
+                continue
+            # Добавляем отступ для подкатегории
+            rows.append((ROW_SUBCATEGORY, f"  {category}", ""))
+            
+            if isinstance(items, list):
+                # Для промптов ключом служит название категории, для Seed ключа нет
+                key = category if category in ("Prompt", "Negative prompt") else ""
+                for value in items:
+                    rows.append((ROW_ITEM, key, format_parameter_value(value)))
+            else:
+                # Для словарей (Model Info, Generation Parameters, Other Parameters)
+                for key, value in items.items():
+                    rows.append((ROW_ITEM, str(key), format_parameter_value(value)))
+        
+        metadata_dict["Parameters"] = parameters
+    
+    # Затем добавляем остальные категории
+    for category, items in categories.items():
+        if items:
+            metadata_dict[category] = items
+            rows.append((ROW_CATEGORY, category, ""))
+            for key, value in items.items():
+                rows.append((ROW_ITEM, str(key), str(value)))
+    
+    return rows, metadata_dict
+
+class MetadataTableModel(QAbstractTableModel):
+    """Модель таблицы метаданных поверх компактного списка строк.
+    
+    Текст, цвета и шрифты не хранятся для каждой ячейки, а вычисляются
+    в data() только для тех строк, которые представление рисует.
+    
+    Строки-узлы (MakerNote, миниатюра EXIF и т. п.) раскрываются по
+    запросу: дочерние строки строит expander(дескриптор) и вставляет
+    toggle_row сразу после узла с большим уровнем вложенности. Узлы
+    с дескриптором "binary" не раскрываются, а открываются в просмотрщике.
+    
+    Длинные значения хранятся в строке один раз, а в ячейку и расчет
+    высоты строки попадает только их начало (preview_text).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        # Параллельно строкам: узел {"descriptor", "expanded", "children"} или None
+        # и уровень вложенности раскрытых строк
+        self.nodes = []
+        self.levels = []
+        self.expander = None
+        # Индексы строк, оставшихся после фильтрации (None — показываются все)
+        self.visible = None
+        # Поисковые строки и заголовки-родители, подготовленные при загрузке
+        self.search_text = []
+        self.search_text_lower = []
+        self.parents = []
+        self.last_filter = None
+        self.filter_args = None
+        self.category_background = QColor(45, 45, 60)
+        self.category_foreground = QColor(230, 230, 230)
+        self.subcategory_background = QColor(35, 35, 50)
+        self.subcategory_foreground = QColor(200, 200, 200)
+        self.alternate_background = QColor(35, 35, 35)
+        self.header_font = QFont()
+        self.header_font.setBold(True)
+    
+    def set_rows(self, rows, expandable=None):
+        """Заменяет все строки за один сброс модели и строит поисковый индекс.
+        
+        expandable ({категория: {ключ: дескриптор}}, см. extract_metadata)
+        отмечает строки, которые раскрываются по запросу.
+        """
+        nodes = [None] * len(rows)
+        if expandable:
+            category = None
+            for index, (kind, key, value) in enumerate(rows):
+                if kind == ROW_CATEGORY:
+                    category = expandable.get(key)
+                elif kind == ROW_ITEM and category and key in category:
+                    nodes[index] = {"descriptor": category[key], "expanded": False, "children": None}
+        self.filter_args = None
+        self.apply_rows(rows, nodes, [0] * len(rows))
+    
+    def apply_rows(self, rows, nodes, levels):
+        """Показывает строки с узлами и уровнями и заново применяет текущий фильтр."""
+        search_text = []
+        parents = []
+        category = subcategory = None
+        # Раскрытые узлы, внутри которых находится текущая строка: (уровень, индекс)
+        ancestors = []
+        for index, (kind, key, value) in enumerate(rows):
+            if kind == ROW_CATEGORY:
+                category, subcategory = index, None
+                ancestors = []
+                search_text.append(key.strip())
+                parents.append(())
+            elif kind == ROW_SUBCATEGORY:
+                subcategory = index
+                ancestors = []
+                search_text.append(key.strip())
+                parents.append((category,) if category is not None else ())
+            else:
+                # Разделитель не дает совпасть запросу на стыке ключа и значения
+                search_text.append(f"{key}\x00{value}")
+                while ancestors and ancestors[-1][0] >= levels[index]:
+                    ancestors.pop()
+                parents.append(tuple(i for i in (category, subcategory) if i is not None)
+                               + tuple(i for _, i in ancestors))
+                if nodes[index] is not None:
+                    ancestors.append((levels[index], index))
+        
+        self.beginResetModel()
+        self.rows = rows
+        self.nodes = nodes
+        self.levels = levels
+        self.visible = None
+        self.search_text = search_text
+        self.search_text_lower = [text.lower() for text in search_text]
+        self.parents = parents
+        self.last_filter = None
+        self.endResetModel()
+        
+        if self.filter_args:
+            self.filter_rows(*self.filter_args)
+    
+    def node_descriptor(self, row):
+        """Дескриптор узла в видимой строке row или None для обычной строки."""
+        node = self.nodes[self.source_row(row)]
+        return node["descriptor"] if node is not None else None
+    
+    def is_expandable(self, row):
+        """Раскрывается ли видимая строка row по запросу."""
+        descriptor = self.node_descriptor(row)
+        return descriptor is not None and descriptor["kind"] != "binary"
+    
+    def is_inspectable(self, row):
+        """Содержит ли видимая строка двоичное значение для просмотрщика."""
+        descriptor = self.node_descriptor(row)
+        return descriptor is not None and descriptor["kind"] == "binary"
+    
+    def is_truncated(self, row):
+        """Показывается ли в видимой строке row только начало значения."""
+        kind, _, value = self.rows[self.source_row(row)]
+        return kind == ROW_ITEM and preview_text(value)[1]
+    
+    def toggle_row(self, row):
+        """Раскрывает или сворачивает узел в видимой строке row.
+        
+        Дочерние строки строятся при первом раскрытии и запоминаются в узле.
+        Возвращает False, если строка не является узлом.
+        """
+        index = self.source_row(row)
+        node = self.nodes[index]
+        if not self.is_expandable(row) or self.expander is None:
+            return False
+        
+        rows, nodes, levels = list(self.rows), list(self.nodes), list(self.levels)
+        level = levels[index]
+        if node["expanded"]:
+            end = index + 1
+            while end < len(rows) and levels[end] > level:
+                end += 1
+            del rows[index + 1:end], nodes[index + 1:end], levels[index + 1:end]
+        else:
+            if node["children"] is None:
+                node["children"] = self.expander(node["descriptor"])
+            children = node["children"]
+            rows[index + 1:index + 1] = [(ROW_ITEM, key, value) for key, value, _ in children]
+            nodes[index + 1:index + 1] = [
+                {"descriptor": descriptor, "expanded": False, "children": None} if descriptor else None
+                for _, _, descriptor in children]
+            levels[index + 1:index + 1] = [level + 1] * len(children)
+        node["expanded"] = not node["expanded"]
+        self.apply_rows(rows, nodes, levels)
+        return True
+    
+    def filter_rows(self, query, case_sensitive=False, regex=False):
+        """Оставляет видимыми строки, совпадающие с запросом.
+        
+        Заголовок категории виден, если совпал он сам или что-то внутри него.
+        Если новый запрос содержит предыдущий, проверяются только строки,
+        совпавшие в прошлый раз. Регулярное выражение компилируется один раз
+        на запрос (ошибка re.error передается вызывающему коду).
+        Видимость меняется одним сбросом модели. Возвращает число совпадений.
+        """
+        self.filter_args = (query, case_sensitive, regex)
+        if not query:
+            self.last_filter = None
+            visible = None
+            matched = []
+        else:
+            mode = (case_sensitive, regex)
+            if regex:
+                pattern = re.compile(query, 0 if case_sensitive else re.IGNORECASE)
+                matched = [i for i, text in enumerate(self.search_text) if pattern.search(text)]
+            else:
+                needle = query if case_sensitive else query.lower()
+                texts = self.search_text if case_sensitive else self.search_text_lower
+                
+                candidates = range(len(texts))
+                if self.last_filter and self.last_filter[0] == mode and self.last_filter[1] in needle:
+                    # Запрос уточнился: новые совпадения могут быть только среди старых
+                    candidates = self.last_filter[2]
+                matched = [i for i in candidates if needle in texts[i]]
+            self.last_filter = (mode, query if case_sensitive or regex else query.lower(), matched)
+            
+            visible = set(matched)
+            for i in matched:
+                visible.update(self.parents[i])
+            visible = sorted(visible)
+        
+        if visible != self.visible:
+            self.beginResetModel()
+            self.visible = visible
+            self.endResetModel()
+        return len(matched)
+    
+    def source_row(self, row):
+        """Номер строки в полном списке по номеру видимой строки."""
+        return row if self.visible is None else self.visible[row]
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) if self.visible is None else len(self.visible)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return ("Property", "Value")[section]
+        return None
+    
+    def flags(self, index):
+        # Ячейки только для чтения
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        source = self.source_row(row)
+        kind, key, value = self.rows[source]
+        
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            if kind != ROW_ITEM:
+                return key if index.column() == 0 else None
+            if index.column() == 1:
+                # Высота строки считается по превью, а не по всему значению
+                preview, truncated = preview_text(value)
+                if truncated and role == Qt.ItemDataRole.ToolTipRole:
+                    return "Double-click to view the full value"
+                return preview
+            node = self.nodes[source]
+            indent = "    " * self.levels[source]
+            if node is None:
+                return indent + key
+            if node["descriptor"]["kind"] == "binary":
+                return "Double-click to inspect" if role == Qt.ItemDataRole.ToolTipRole else indent + key
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return "Double-click to collapse" if node["expanded"] else "Double-click to expand"
+            return indent + ("▾ " if node["expanded"] else "▸ ") + key
+        
+        if role == Qt.ItemDataRole.BackgroundRole:
+            if kind == ROW_CATEGORY:
+                return self.category_background
+            if kind == ROW_SUBCATEGORY:
+                return self.subcategory_background
+            if row % 2 == 0:
+                return self.alternate_background
+            return None
+        
+        if kind == ROW_ITEM:
+            return None
+        
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return self.category_foreground if kind == ROW_CATEGORY else self.subcategory_foreground
+        if role == Qt.ItemDataRole.FontRole:
+            return self.header_font
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if kind == ROW_CATEGORY:
+                return Qt.AlignmentFlag.AlignCenter
+            return Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+        return None
+    
+    def is_header(self, row):
+        """Является ли строка заголовком категории или подкатегории."""
+        return self.rows[self.source_row(row)][0] != ROW_ITEM
+    
+    def cell_text(self, row, column):
+        kind, key, value = self.rows[self.source_row(row)]
+        if column == 0:
+            return key
+        return value if kind == ROW_ITEM else ""
+
+class MetadataTableView(QTableView):
+    # Двойной щелчок по двоичному значению: (название, дескриптор)
+    inspect_requested = pyqtSignal(str, object)
+    # Двойной щелчок по обрезанному значению: (название, полный текст)
+    value_requested = pyqtSignal(str, str)
+    
     def __init__(self, parent=None):
-        super().__init__(0, 2, parent)
-        self.setHorizontalHeaderLabels(["Property", "Value"])
+        super().__init__(parent)
+        self.metadata_model = MetadataTableModel(self)
+        self.setModel(self.metadata_model)
         self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
         self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.verticalHeader().setVisible(False)
         
-        # Включаем перенос текста
+        # Включаем перенос текста. Высота строк считается только для видимых
+        # строк (resize_visible_rows), а не для всей таблицы сразу
         self.setWordWrap(True)
-        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-        
-        self.setStyleSheet("""
-            QTableWidget {
-                background-color: #1e1e1e;
-                color: #e0e0e0;
-                border: none;
-                border-radius: 6px;
-                gridline-color: #3a3a3a;
-            }
-            QHeaderView::section {
-                background-color: #2d2d2d;
-                color: #e0e0e0;
-                padding: 6px;
-                border: none;
-                font-weight: bold;
-            }
-            QTableWidget::item {
-                padding: 4px;
-                border-bottom: 1px solid #3a3a3a;
-            }
-            QTableWidget::item:selected {
-                background-color: #0078d4;
-            }
-        """)
-        
-        # Подключаем обработчик двойного клика
-        self.cellDoubleClicked.connect(self.copy_cell_content)
-    
-    def copy_cell_content(self, row, column):
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.measured_rows = set()
+        
+        # Пересчет высоты видимых строк после прокрутки и изменения ширины колонок
+        self.row_height_timer = QTimer(self)
+        self.row_height_timer.setSingleShot(True)
+        self.row_height_timer.timeout.connect(self.resize_visible_rows)
+        self.verticalScrollBar().valueChanged.connect(lambda: self.row_height_timer.start(0))
+        self.horizontalHeader().sectionResized.connect(self.invalidate_row_heights)
+        self.metadata_model.modelReset.connect(self.update_spans)
+        
+        # Двойной щелчок раскрывает узел или копирует значение
+        self.doubleClicked.connect(self.activate_cell)
+    
+    def set_rows(self, rows, expandable=None):
+        """Показывает новый набор строк за один сброс модели."""
+        self.metadata_model.set_rows(rows, expandable)
+    
+    def activate_cell(self, index):
+        model = self.metadata_model
+        if model.is_expandable(index.row()):
+            self.toggle_row(index.row())
+        elif model.is_inspectable(index.row()):
+            self.inspect_requested.emit(model.cell_text(index.row(), 0),
+                                        model.node_descriptor(index.row()))
+        elif model.is_truncated(index.row()):
+            self.value_requested.emit(model.cell_text(index.row(), 0),
+                                      model.cell_text(index.row(), 1))
+        else:
+            self.copy_cell_content(index)
+    
+    def toggle_row(self, row):
+        """Раскрывает или сворачивает узел, сохраняя положение прокрутки."""
+        scroll = self.verticalScrollBar().value()
+        self.metadata_model.toggle_row(row)
+        self.verticalScrollBar().setValue(scroll)
+        self.selectRow(row)
+    
+    def update_spans(self):
+        """Объединяет ячейки заголовков после сброса модели (загрузки или фильтра)."""
+        model = self.metadata_model
+        self.clearSpans()
+        for row in range(model.rowCount()):
+            if model.is_header(row):
+                self.setSpan(row, 0, 1, 2)
+        self.invalidate_row_heights()
+    
+    def invalidate_row_heights(self):
+        self.measured_rows.clear()
+        self.row_height_timer.start(0)
+    
+    def resize_visible_rows(self):
+        """Подгоняет высоту только тех строк, которые сейчас видны."""
+        row_count = self.metadata_model.rowCount()
+        if not row_count:
+            return
+        
+        first = max(self.rowAt(0), 0)
+        last = self.rowAt(self.viewport().height() - 1)
+        if last < 0:
+            last = row_count - 1
+        
+        for row in range(first, last + 1):
+            if row not in self.measured_rows and not self.isRowHidden(row):
+                self.measured_rows.add(row)
+                self.resizeRowToContents(row)
+        
+        # После увеличения высоты строк в область просмотра могли попасть
+        # не все из них, поэтому проверяем еще раз
+        if self.rowAt(self.viewport().height() - 1) != last:
+            self.row_height_timer.start(0)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.row_height_timer.start(0)
+    
+    def copy_cell_content(self, index):
         """Копирует содержимое ячейки в буфер обмена при двойном клике."""
         # Проверяем, не является ли строка заголовком категории
-        if self.columnSpan(row, 0) == 2:
+        if self.metadata_model.is_header(index.row()):
             return  # Это заголовок категории, ничего не делаем
-            
-        item = self.item(row, column)
-        if item:
-            pyperclip.copy(item.text())
-            # Получаем родительское окно для отображения уведомления
-            parent = self.parent()
-            while parent and not isinstance(parent, ImageMetadataViewer):
-                parent = parent.parent()
-            if parent:
-                parent.status_message.showMessage("Value copied to clipboard")
+        
+        copy_to_clipboard(self.metadata_model.cell_text(index.row(), index.column()))
+        # Получаем родительское окно для отображения уведомления
+        parent = self.parent()
+        while parent and not isinstance(parent, ImageMetadataViewer):
+            parent = parent.parent()
+        if parent:
+            parent.status_message.showMessage("Value copied to clipboard")
+
+class PreviewPyramid:
+    """Превью и его копии, уменьшенные вдвое на каждом уровне (mipmap).
+    
+    При масштабировании берется ближайший уровень не меньше нужного размера,
+    поэтому даже сглаженное масштабирование обрабатывает мало пикселей.
+    """
+    MIN_LEVEL_SIZE = 64
+    
+    def __init__(self, pixmap, signature=None):
+        # signature — (размер, mtime_ns) файла, из которого построено превью
+        self.signature = signature
+        self.levels = [pixmap]
+        while min(pixmap.width(), pixmap.height()) >= 2 * self.MIN_LEVEL_SIZE:
+            pixmap = pixmap.scaled(
+                pixmap.width() // 2, pixmap.height() // 2,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+            self.levels.append(pixmap)
+    
+    @property
+    def base(self):
+        return self.levels[0]
+    
+    def scaled(self, width, height, smooth):
+        """Вписывает превью в width × height, начиная с ближайшего уровня."""
+        target = self.base.size().scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+        source = self.base
+        for level in self.levels[1:]:
+            if level.width() < target.width() or level.height() < target.height():
+                break
+            source = level
+        
+        mode = (Qt.TransformationMode.SmoothTransformation if smooth
+                else Qt.TransformationMode.FastTransformation)
+        return source.scaled(target, Qt.AspectRatioMode.IgnoreAspectRatio, mode)
+
+class PreviewCache:
+    """Небольшой LRU-кэш пирамид превью по пути к файлу."""
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+    
+    def get(self, file_path):
+        pyramid = self.entries.get(file_path)
+        if pyramid is not None:
+            self.entries.move_to_end(file_path)
+        return pyramid
+    
+    def put(self, file_path, pyramid):
+        self.entries[file_path] = pyramid
+        self.entries.move_to_end(file_path)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+    
+    def discard(self, file_path):
+        self.entries.pop(file_path, None)
 
 class ImageViewer(QScrollArea):
     def __init__(self, metadata_viewer):
@@ -88,65 +856,92 @@ class ImageViewer(QScrollArea):
         self.metadata_viewer = metadata_viewer
         self.setWidgetResizable(True)
         self.setMinimumWidth(300)
-        self.setStyleSheet("background-color: #1a1a1a; border: none; border-radius: 6px;")
         
         self.image_label = ClickableLabel()
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setStyleSheet("background-color: #1a1a1a; border-radius: 6px;")
         
         self.setWidget(self.image_label)
         
-    def set_image(self, pixmap):
-        self.image_label.setPixmap(pixmap)
+        self.preview_cache = PreviewCache()
+        self.pyramid = None
+        
+        # Во время изменения размера масштабируем быстро, а сглаженную
+        # версию рисуем, когда размер перестал меняться
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.timeout.connect(lambda: self.update_image(smooth=True))
+        
+    def set_image(self, file_path, pixmap=None, signature=None):
+        """Показывает превью файла.
+        
+        Новое превью (pixmap) сохраняется в кэше вместе с уменьшенными копиями;
+        без pixmap превью берется из кэша. Возвращает False, если его там нет.
+        """
+        if pixmap is not None:
+            pyramid = PreviewPyramid(pixmap, signature)
+            self.preview_cache.put(file_path, pyramid)
+        else:
+            pyramid = self.preview_cache.get(file_path)
+            if pyramid is None:
+                return False
+        
+        self.pyramid = pyramid
+        self.smooth_timer.stop()
+        self.update_image(smooth=True)
+        return True
+    
+    def update_image(self, smooth):
+        if self.pyramid is None:
+            return
+        max_width = self.width() - 20
+        max_height = self.height() - 20
+        self.image_label.setPixmap(self.pyramid.scaled(max_width, max_height, smooth))
+        
+        if smooth:
+            self.metadata_viewer.check_preview_resolution()
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.pyramid is not None:
+            self.update_image(smooth=False)
+            self.smooth_timer.start(150)
         
     def clear(self):
+        self.pyramid = None
         self.image_label.clear()
 
 class SearchBox(QLineEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setPlaceholderText("Filter metadata...")
-        self.setStyleSheet("""
-            QLineEdit {
-                background-color: #333333;
-                color: white;
-                border: 1px solid #555555;
-                padding: 8px 12px;
-                border-radius: 4px;
-                font-size: 13px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #007acc;
-            }
-        """)
         
         # Add clear button
         self.setClearButtonEnabled(True)
 
+class SearchOptionButton(QToolButton):
+    def __init__(self, text, tooltip, parent=None):
+        super().__init__(parent)
+        self.setText(text)
+        self.setToolTip(tooltip)
+        self.setCheckable(True)
+
 class DropArea(QLabel):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setText("Drop image here or click to browse")
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.setAcceptDrops(True)
-        self.setStyleSheet("""
-            QLabel {
-                border: 2px dashed #555555;
-                border-radius: 6px;
-                padding: 12px;
-                color: #cccccc;
-                font-size: 15px;
-                background-color: #2a2a2a;
-            }
-            QLabel:hover {
-                background-color: #333333;
-                border-color: #777777;
-            }
-        """)
         self.setCursor(Qt.CursorShape.PointingHandCursor)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum)
         self.setMinimumHeight(60)
         self.setMaximumHeight(60)
+    
+    def set_drag_active(self, active):
+        """Подсвечивает область, пока над окном перетаскивают изображение."""
+        self.setProperty("dragActive", active)
+        # Стиль по свойству пересчитывается только после повторной полировки
+        self.style().unpolish(self)
+        self.style().polish(self)
 
 class ActionButton(QPushButton):
     def __init__(self, text, icon_name=None, parent=None):
@@ -154,28 +949,6 @@ class ActionButton(QPushButton):
         if icon_name:
             # Используем встроенные иконки Qt вместо файлов
             self.setIcon(self.get_icon(icon_name))
-        
-        self.setStyleSheet("""
-            QPushButton {
-                background-color: #2d2d2d;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: normal;
-                min-width: 110px;
-            }
-            QPushButton:hover {
-                background-color: #3d3d3d;
-            }
-            QPushButton:pressed {
-                background-color: #444444;
-            }
-            QPushButton:disabled {
-                background-color: #252525;
-                color: #777777;
-            }
-        """)
     
     def get_icon(self, name):
         # Получаем стандартные иконки Qt вместо файлов
@@ -192,34 +965,11 @@ class ActionButton(QPushButton):
         return QIcon()
 
 class PrimaryButton(ActionButton):
-    def __init__(self, text, icon_name=None, parent=None):
-        super().__init__(text, icon_name, parent)
-        self.setStyleSheet("""
-            QPushButton {
-                background-color: #0078d4;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: normal;
-                min-width: 110px;
-            }
-            QPushButton:hover {
-                background-color: #1084d8;
-            }
-            QPushButton:pressed {
-                background-color: #006cbe;
-            }
-            QPushButton:disabled {
-                background-color: #25476a;
-                color: #a0a0a0;
-            }
-        """)
+    """Кнопка основного действия; выделяется цветом в APP_STYLESHEET."""
 
 class StatusMessage(QLabel):
     def __init__(self, text="", parent=None):
         super().__init__(text, parent)
-        self.setStyleSheet("color: #aaaaaa; font-size: 13px; padding: 2px 10px;")
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.clear)
         
@@ -252,33 +1002,10 @@ class FullImageDialog(QDialog):
         
         close_button = QPushButton("Close")
         close_button.clicked.connect(self.accept)
-        close_button.setStyleSheet("""
-            QPushButton {
-                background-color: #333333;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #444444;
-            }
-        """)
         
         open_button = QPushButton("Open in Default Viewer")
         open_button.clicked.connect(lambda: self.open_in_external(file_path))
-        open_button.setStyleSheet("""
-            QPushButton {
-                background-color: #0078d4;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #1084d8;
-            }
-        """)
+        open_button.setObjectName("primaryButton")
         
         button_layout.addStretch()
         button_layout.addWidget(open_button)
@@ -292,8 +1019,1048 @@ class FullImageDialog(QDialog):
         if os.path.exists(file_path):
             QDesktopServices.openUrl(QUrl.fromLocalFile(file_path))
 
+class ValueDialog(QDialog):
+    """Полный текст длинного значения, от которого в таблице показано только начало."""
+    def __init__(self, title, text, parent=None):
+        super().__init__(parent)
+        self.text = text
+        self.setWindowTitle(f"Value - {title}")
+        self.resize(760, 560)
+        
+        layout = QVBoxLayout()
+        lines = text.count("\n") + 1
+        self.summary_label = QLabel(f"{len(text):,} characters, {lines:,} line{'s' if lines != 1 else ''}")
+        layout.addWidget(self.summary_label)
+        
+        # QPlainTextEdit раскладывает только видимые блоки текста
+        text_edit = QPlainTextEdit()
+        text_edit.setReadOnly(True)
+        text_edit.setPlainText(text)
+        layout.addWidget(text_edit)
+        
+        button_layout = QHBoxLayout()
+        copy_button = QPushButton("Copy")
+        copy_button.setObjectName("primaryButton")
+        copy_button.clicked.connect(self.copy_text)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(copy_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    def copy_text(self):
+        copy_to_clipboard(self.text)
+        self.summary_label.setText(f"{len(self.text):,} characters copied to clipboard")
+
+class HexDumpModel(QAbstractListModel):
+    """Строки шестнадцатеричного дампа поверх memoryview.
+    
+    Текст строки строится в data() только для строк, которые рисует
+    представление, поэтому открытие многомегабайтного значения ничего
+    не копирует.
+    """
+    def __init__(self, view, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.font = QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return (len(self.view) + HEX_LINE_WIDTH - 1) // HEX_LINE_WIDTH
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return hex_line(self.view, index.row() * HEX_LINE_WIDTH)
+        if role == Qt.ItemDataRole.FontRole:
+            return self.font
+        return None
+
+class BinaryInspectorDialog(QDialog):
+    """Просмотр двоичного значения: тип содержимого, поля заголовка, дамп и текст."""
+    # Сколько байтов текстового содержимого показывать на вкладке Text
+    TEXT_PREVIEW_BYTES = 1024 * 1024
+    
+    def __init__(self, buffer, title, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.title = title
+        view = buffer.view
+        self.payload = detect_payload(view)
+        self.setWindowTitle(f"Inspect - {title}")
+        self.resize(760, 560)
+        
+        layout = QVBoxLayout()
+        self.summary_label = QLabel(f"{self.payload}, {len(view):,} bytes")
+        layout.addWidget(self.summary_label)
+        
+        tabs = QTabWidget()
+        structure = payload_structure(view, self.payload)
+        if structure:
+            table = QTableWidget(len(structure), 2)
+            table.setHorizontalHeaderLabels(["Field", "Value"])
+            table.verticalHeader().setVisible(False)
+            table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+            table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+            table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+            for row, (field, value) in enumerate(structure):
+                table.setItem(row, 0, QTableWidgetItem(field))
+                table.setItem(row, 1, QTableWidgetItem(value))
+            tabs.addTab(table, "Structure")
+        
+        # Дамп рисуется постранично: строки одной высоты, текст — только для видимых
+        hex_view = QListView()
+        hex_view.setUniformItemSizes(True)
+        hex_view.setModel(HexDumpModel(view, hex_view))
+        tabs.addTab(hex_view, "Hex")
+        
+        if is_text_payload(self.payload):
+            text, truncated = text_preview(view, self.TEXT_PREVIEW_BYTES)
+            if truncated:
+                text += f"\n… (first {self.TEXT_PREVIEW_BYTES:,} bytes shown)"
+            text_edit = QPlainTextEdit()
+            text_edit.setReadOnly(True)
+            text_edit.setPlainText(text)
+            tabs.addTab(text_edit, "Text")
+        layout.addWidget(tabs)
+        
+        button_layout = QHBoxLayout()
+        save_button = QPushButton("Save Raw...")
+        save_button.setObjectName("primaryButton")
+        save_button.clicked.connect(self.save_raw)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(save_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        
+        self.setLayout(layout)
+    
+    def save_raw(self):
+        """Сохраняет байты значения в файл кусками прямо из буфера."""
+        extension = PAYLOAD_EXTENSIONS.get(self.payload, ".bin")
+        default_name = re.sub(r"[^\w.-]+", "_", self.title.strip()) + extension
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Raw Data", default_name)
+        if not file_path:
+            return
+        try:
+            save_binary(self.buffer.view, file_path)
+            self.summary_label.setText(f"{self.payload}, {len(self.buffer):,} bytes — "
+                                       f"saved to {os.path.basename(file_path)}")
+        except OSError as e:
+            self.summary_label.setText(f"Error saving data: {e}")
+
+class CompareDialog(QDialog):
+    """Результат сравнения параметров группы файлов (imadata_compare)."""
+    file_activated = pyqtSignal(str)
+
+    # Сколько различных значений поля перечислять на вкладке Varying
+    MAX_LISTED_VALUES = 20
+
+    def __init__(self, report, elapsed, parent=None):
+        super().__init__(parent)
+        self.files = report["files"]
+        self.setWindowTitle(f"Compare - {len(self.files)} files")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout()
+        summary = (f"{len(self.files)} files: {len(report['varying'])} varying, "
+                   f"{len(report['constant'])} constant fields ({elapsed * 1000:.0f} ms)")
+        if report["errors"]:
+            summary += f", {len(report['errors'])} files could not be read"
+        layout.addWidget(QLabel(summary))
+
+        tabs = QTabWidget()
+        varying = report["varying"]
+        tabs.addTab(self.make_table(["Field", "Distinct", "Values"], [
+            (key, str(len(counts)), format_counts(counts, self.MAX_LISTED_VALUES))
+            for key, counts in varying.items()]), "Varying")
+
+        # По строке на файл: только изменяющиеся поля, двойной щелчок открывает файл
+        values = report["values"]
+        self.files_table = self.make_table(["File"] + list(varying), [
+            [os.path.basename(path)] + [values[key][row] for key in varying]
+            for row, path in enumerate(self.files)])
+        self.files_table.cellDoubleClicked.connect(
+            lambda row, column: self.file_activated.emit(self.files[row]))
+        tabs.addTab(self.files_table, "Files")
+
+        tabs.addTab(self.make_table(["Field", "Value"], list(report["constant"].items())), "Constant")
+        tabs.addTab(self.make_table(["Files", "Field", "Changes"], [
+            (f"{os.path.basename(self.files[row - 1])} → {os.path.basename(self.files[row])}",
+             key, format_diff(changes))
+            for row, key, changes in report["prompt_diffs"]]), "Prompt Changes")
+        if report["errors"]:
+            tabs.addTab(self.make_table(["File", "Error"], [
+                (os.path.basename(path), error) for path, error in report["errors"]]), "Errors")
+        layout.addWidget(tabs)
+
+        button_layout = QHBoxLayout()
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    @staticmethod
+    def make_table(headers, rows):
+        """Таблица только для чтения; многострочные значения показываются одной строкой."""
+        table = QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table.setWordWrap(False)
+        for row, cells in enumerate(rows):
+            for column, value in enumerate(cells):
+                text = "(not set)" if value is None else value
+                item = QTableWidgetItem(" ".join(text.split()))
+                item.setToolTip(text[:PREVIEW_MAX_CHARS])
+                table.setItem(row, column, item)
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        table.resizeColumnsToContents()
+        for column in range(len(headers)):
+            table.setColumnWidth(column, min(table.columnWidth(column), 320))
+        header.setStretchLastSection(True)
+        return table
+
+class DuplicatesDialog(QDialog):
+    """Группы похожих изображений папки (imadata_dupes).
+    
+    Хэши посчитаны заранее, поэтому смена хэша или порога расстояния
+    только заново группирует их. Файлы выбранной группы показываются
+    миниатюрами рядом, под ними — поля метаданных, которые у них различаются.
+    """
+    file_activated = pyqtSignal(str)
+    
+    def __init__(self, hashes, errors, cache_path=None, parent=None):
+        super().__init__(parent)
+        self.hashes = hashes
+        self.cache_path = cache_path
+        self.clusters = []
+        self.setWindowTitle(f"Duplicates - {len(hashes)} files")
+        self.resize(1000, 680)
+        
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.thumbnail_workers = []
+        self.items_by_path = {}
+        # Метаданные группы читаются в фоне; принимается только результат
+        # последней выбранной группы
+        self.compare_worker = None
+        self.compare_generation = 0
+        
+        layout = QVBoxLayout()
+        controls = QHBoxLayout()
+        self.kind_combo = QComboBox()
+        for kind in HASH_KINDS:
+            self.kind_combo.addItem(kind[0] + kind[1:].capitalize(), kind)
+        self.kind_combo.currentIndexChanged.connect(self.update_clusters)
+        self.distance_spin = QSpinBox()
+        self.distance_spin.setRange(0, 32)
+        self.distance_spin.setValue(DEFAULT_DISTANCE)
+        self.distance_spin.setToolTip("Maximum number of differing hash bits")
+        self.distance_spin.valueChanged.connect(self.update_clusters)
+        self.summary_label = QLabel()
+        controls.addWidget(QLabel("Hash:"))
+        controls.addWidget(self.kind_combo)
+        controls.addWidget(QLabel("Max distance:"))
+        controls.addWidget(self.distance_spin)
+        controls.addWidget(self.summary_label, 1)
+        layout.addLayout(controls)
+        
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.cluster_list = QListWidget()
+        self.cluster_list.currentRowChanged.connect(self.show_cluster)
+        splitter.addWidget(self.cluster_list)
+        
+        # Файлы группы рядом, одной строкой миниатюр
+        self.detail_splitter = right = QSplitter(Qt.Orientation.Vertical)
+        self.file_list = QListWidget()
+        self.file_list.setViewMode(QListWidget.ViewMode.IconMode)
+        self.file_list.setFlow(QListWidget.Flow.LeftToRight)
+        self.file_list.setWrapping(False)
+        self.file_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.file_list.setGridSize(QSize(THUMBNAIL_SIZE + 48, THUMBNAIL_SIZE + 44))
+        self.file_list.setMovement(QListWidget.Movement.Static)
+        self.file_list.setToolTip("Double-click to open the file in the viewer")
+        self.file_list.itemActivated.connect(
+            lambda item: self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole)))
+        right.addWidget(self.file_list)
+        self.differences = QTableWidget()
+        right.addWidget(self.differences)
+        right.setSizes([THUMBNAIL_SIZE + 70, 400])
+        splitter.addWidget(right)
+        splitter.setSizes([260, 740])
+        layout.addWidget(splitter, 1)
+        
+        if errors:
+            self.summary_label.setToolTip("\n".join(f"{path}: {error}" for path, error in errors[:50]))
+        self.errors = errors
+        
+        button_layout = QHBoxLayout()
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        
+        self.update_clusters()
+    
+    def update_clusters(self):
+        kind = self.kind_combo.currentData()
+        self.clusters = find_clusters({path: value[kind] for path, value in self.hashes.items()},
+                                      self.distance_spin.value())
+        duplicates = sum(len(cluster) for cluster in self.clusters)
+        text = f"{len(self.clusters)} groups with {duplicates} of {len(self.hashes)} files"
+        if self.errors:
+            text += f"; {len(self.errors)} files could not be read"
+        self.summary_label.setText(text)
+        
+        self.cluster_list.clear()
+        for cluster in self.clusters:
+            self.cluster_list.addItem(f"{len(cluster)} files — {os.path.basename(cluster[0][0])}")
+        if self.clusters:
+            self.cluster_list.setCurrentRow(0)
+        else:
+            self.show_cluster(-1)
+    
+    def show_cluster(self, row):
+        self.cancel_thumbnails()
+        self.cancel_compare()
+        self.file_list.clear()
+        self.items_by_path = {}
+        self.differences.clear()
+        self.differences.setRowCount(0)
+        self.differences.setColumnCount(0)
+        if not 0 <= row < len(self.clusters):
+            return
+        cluster = self.clusters[row]
+        for path, distance in cluster:
+            item = QListWidgetItem(f"{os.path.basename(path)}\ndistance {distance}")
+            item.setData(Qt.ItemDataRole.UserRole, path)
+            item.setToolTip(path)
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.file_list.addItem(item)
+            self.items_by_path[path] = item
+            worker = ThumbnailWorker(path, default_thumbnail_dir())
+            worker.signals.loaded.connect(self.on_thumbnail_loaded)
+            self.thumbnail_workers.append(worker)
+            self.thread_pool.start(worker)
+        
+        # Метаданные группы читаются из заголовков и кэша в пуле миниатюр
+        self.compare_worker = CompareWorker([path for path, _ in cluster], self.cache_path,
+                                            image_fields=True, generation=self.compare_generation)
+        self.compare_worker.signals.finished.connect(self.on_differences_ready)
+        self.compare_worker.signals.failed.connect(self.on_differences_failed)
+        self.thread_pool.start(self.compare_worker)
+    
+    def on_differences_ready(self, generation, report, elapsed):
+        if generation != self.compare_generation:
+            return
+        self.compare_worker = None
+        files = report["files"]
+        rows = [[key] + report["values"][key] for key in report["varying"]]
+        if not rows:
+            rows = [["No metadata differences"] + [""] * len(files)]
+        self.set_differences(["Field"] + [os.path.basename(path) for path in files], rows)
+    
+    def on_differences_failed(self, generation, message):
+        if generation != self.compare_generation:
+            return
+        self.compare_worker = None
+        self.set_differences(["Field"], [[f"Could not read metadata: {message}"]])
+    
+    def set_differences(self, headers, rows):
+        table = CompareDialog.make_table(headers, rows)
+        self.detail_splitter.replaceWidget(1, table)
+        self.differences.deleteLater()
+        self.differences = table
+    
+    def on_thumbnail_loaded(self, file_path, image):
+        item = self.items_by_path.get(file_path)
+        if item is not None and image is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
+    
+    def cancel_thumbnails(self):
+        for worker in self.thumbnail_workers:
+            worker.cancel()
+            take_runnable(self.thread_pool, worker)
+        self.thumbnail_workers = []
+    
+    def cancel_compare(self):
+        self.compare_generation += 1
+        if self.compare_worker is not None:
+            self.compare_worker.cancel()
+            take_runnable(self.thread_pool, self.compare_worker)
+            self.compare_worker = None
+    
+    def done(self, result):
+        self.cancel_thumbnails()
+        self.cancel_compare()
+        super().done(result)
+
+def make_preview(img, max_size):
+    """Декодирует изображение Pillow сразу в размере, близком к max_size.
+    
+    Для JPEG используется draft() — масштабирование на этапе DCT, для
+    остальных форматов reduce() с целым коэффициентом. Результат не
+    меньше размера, в который изображение вписывается в max_size;
+    окончательное сглаживание делает Qt при выводе.
+    """
+    orientation = img.getexif().get(0x0112, 1)
+    max_width, max_height = max_size
+    if orientation in (5, 6, 7, 8):
+        # Изображение будет повернуто на 90°, поэтому меняем стороны местами
+        max_width, max_height = max_height, max_width
+    
+    # Размер, в который изображение впишется в область просмотра
+    scale = min(max_width / img.width, max_height / img.height)
+    if scale < 1:
+        target = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        if img.format == "JPEG":
+            img.draft("RGB", target)
+        
+        factor = min(img.width // target[0], img.height // target[1])
+        if factor > 1:
+            # reduce() не работает с палитрой, 1-битными и 16-битными изображениями
+            if img.mode in ("P", "1") or img.mode.startswith("I;16"):
+                img = convert_for_preview(img)
+            img = img.reduce(factor)
+    
+    # Учитываем ориентацию из EXIF, как это делает Qt при чтении файла
+    if orientation != 1:
+        import PIL.ImageOps
+        img = PIL.ImageOps.exif_transpose(img)
+    
+    return convert_for_preview(img)
+
+def convert_for_preview(img):
+    """Приводит изображение к одному из режимов, которые QImage читает напрямую."""
+    if img.mode in PREVIEW_FORMATS:
+        return img
+    if img.mode == "1":
+        return img.convert("L")
+    has_alpha = "A" in img.mode or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+def pil_to_qimage(img):
+    """Оборачивает пиксели Pillow в QImage без промежуточных преобразований.
+    
+    QImage ссылается на буфер tobytes() (PyQt держит ссылку на него),
+    поэтому такой QImage нужно передавать между потоками как Python-объект,
+    а не копировать через сигнал типа QImage.
+    """
+    image_format, bytes_per_pixel = PREVIEW_FORMATS[img.mode]
+    data = img.tobytes()
+    return QImage(data, img.width, img.height, img.width * bytes_per_pixel, image_format)
+
+def copy_to_clipboard(text):
+    """Копирует текст в буфер обмена; pyperclip загружается при первом копировании."""
+    import pyperclip
+    pyperclip.copy(text)
+
+def file_signature(file_path):
+    """Размер и время изменения файла — по ним проверяется, не устарел ли кэш."""
+    try:
+        file_info = os.stat(file_path)
+    except OSError:
+        return None
+    return (file_info.st_size, file_info.st_mtime_ns)
+
+def take_runnable(thread_pool, runnable):
+    """Снимает задачу с очереди пула; False, если она уже запущена или завершена."""
+    try:
+        return thread_pool.tryTake(runnable)
+    except RuntimeError:
+        # Задача уже выполнилась, и пул удалил ее C++-объект
+        return False
+
+class ImageLoadSignals(QObject):
+    """Сигналы фоновой загрузки (QRunnable сам не может их объявлять)."""
+    # Результат передается словарем как object, чтобы QImage не копировался
+    # и не терял ссылку на буфер пикселей
+    loaded = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str, str)
+
+class ImageLoadWorker(QRunnable):
+    """Декодирует изображение и разбирает метаданные в пуле потоков.
+    
+    Каждый запрос несет номер поколения: окно принимает результат только
+    от последнего вызова process_image, а устаревшие задачи отменяются.
+    """
+    def __init__(self, generation, file_path, max_size, with_metadata=True, with_preview=True,
+                 metadata_cache=None, search_index=None, profile=NULL_PROFILE):
+        super().__init__()
+        self.generation = generation
+        self.file_path = file_path
+        self.max_size = max_size
+        self.with_metadata = with_metadata
+        self.with_preview = with_preview
+        self.metadata_cache = metadata_cache
+        self.search_index = search_index
+        self.profile = profile
+        self.signals = ImageLoadSignals()
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        if self._cancelled:
+            return
+        
+        profile = self.profile
+        result = {
+            "path": self.file_path,
+            "image": None,
+            "metadata": None,
+        }
+        
+        # Файл открывается один раз: и метаданные, и превью берутся из одного объекта
+        try:
+            with profile.span("stat"):
+                file_info = os.stat(self.file_path)
+            result["signature"] = (file_info.st_size, file_info.st_mtime_ns)
+            if not self.with_preview:
+                # Превью уже есть: при попадании в кэш файл не открывается вовсе
+                metadata = extract_metadata(self.file_path, cache=self.metadata_cache,
+                                            profile=profile)
+                if metadata["image_size"] is not None:
+                    result["metadata"] = metadata
+                    self.index_metadata(result)
+                    result["source_size"] = metadata["image_size"]
+                    if not self._cancelled:
+                        self.signals.loaded.emit(self.generation, result)
+                    return
+            # Pillow импортируется в фоновом потоке при первой загрузке, а не при запуске
+            import PIL.Image
+            
+            # При профилировании считаем прочитанные с диска байты
+            fp, counter = open_counted(self.file_path) if profile else (self.file_path, None)
+            try:
+                with profile.span("pillow_open"):
+                    img = PIL.Image.open(fp)
+                with img:
+                    result["source_size"] = img.size
+                    if self.with_metadata:
+                        result["metadata"] = extract_metadata(self.file_path, image=img,
+                                                              cache=self.metadata_cache,
+                                                              profile=profile)
+                        self.index_metadata(result)
+                    if self._cancelled:
+                        return
+                    if self.with_preview:
+                        with profile.span("preview_decode"):
+                            result["image"] = pil_to_qimage(make_preview(img, self.max_size))
+            finally:
+                if counter is not None:
+                    fp.close()
+                    profile.count("bytes_read", counter.bytes_read)
+        except Exception as e:
+            if not self._cancelled:
+                self.signals.failed.emit(self.generation, self.file_path,
+                                         f"Could not load image {os.path.basename(self.file_path)}: {e}")
+            return
+        
+        if not self._cancelled:
+            self.signals.loaded.emit(self.generation, result)
+    
+    def index_metadata(self, result):
+        """Добавляет параметры открытого файла в поисковый индекс библиотеки."""
+        metadata = result["metadata"]
+        if self.search_index is None or metadata["error"]:
+            return
+        try:
+            self.search_index.add(self.file_path, *result["signature"], metadata["parameters"])
+        except sqlite3.Error:
+            # Индекс необязателен (например, база занята другим процессом)
+            pass
+
+class ThumbnailSignals(QObject):
+    # QImage передается как object по той же причине, что и в ImageLoadSignals
+    loaded = pyqtSignal(str, object)
+
+class ThumbnailWorker(QRunnable):
+    """Строит миниатюру одного файла; готовые миниатюры читаются с диска."""
+    # Счетчик записанных миниатюр общий для всех рабочих: каждые
+    # THUMBNAIL_EVICTION_INTERVAL записей проверяется объем кэша на диске
+    _saved = 0
+    _saved_lock = threading.Lock()
+    
+    def __init__(self, file_path, cache_dir):
+        super().__init__()
+        self.file_path = file_path
+        self.cache_dir = cache_dir
+        self.signals = ThumbnailSignals()
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        if self._cancelled:
+            return
+        
+        image = None
+        try:
+            file_info = os.stat(self.file_path)
+            cache_path = None
+            if self.cache_dir:
+                cache_path = thumbnail_path(self.cache_dir, self.file_path,
+                                            file_info.st_size, file_info.st_mtime_ns)
+                if touch_thumbnail(cache_path):
+                    image = QImage(cache_path)
+                    if image.isNull():
+                        image = None
+            
+            if image is None:
+                import PIL.Image
+                with PIL.Image.open(self.file_path) as img:
+                    thumbnail = make_preview(img, (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                if cache_path:
+                    self.save_thumbnail(thumbnail, cache_path)
+                image = pil_to_qimage(thumbnail)
+        except Exception:
+            image = None
+        
+        if not self._cancelled:
+            self.signals.loaded.emit(self.file_path, image)
+    
+    def save_thumbnail(self, thumbnail, cache_path):
+        # Пишем во временный файл и переименовываем, чтобы не оставить обрезанный PNG
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            thumbnail.save(temp_path, "PNG")
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # Кэш на диске необязателен (например, нет прав на запись)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        
+        with ThumbnailWorker._saved_lock:
+            ThumbnailWorker._saved += 1
+            check = ThumbnailWorker._saved % THUMBNAIL_EVICTION_INTERVAL == 0
+        if check:
+            evict_thumbnails(self.cache_dir)
+
+class GalleryModel(QAbstractListModel):
+    """Файлы папки для галереи.
+    
+    Модель только отдает готовые миниатюры; какие из них строить, решает
+    GalleryView по видимой области. Готовые миниатюры хранятся в LRU.
+    """
+    def __init__(self, cache_dir=None, capacity=600, parent=None):
+        super().__init__(parent)
+        self.files = []
+        self.rows_by_path = {}
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.thumbnails = OrderedDict()
+        self.pending = {}
+        self.failed = set()
+        
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max(1, min(4, QThreadPool.globalInstance().maxThreadCount())))
+        
+        self.placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor("#2a2a2a"))
+    
+    def set_files(self, files):
+        self.beginResetModel()
+        self.cancel_pending()
+        self.files = files
+        self.rows_by_path = {path: row for row, path in enumerate(files)}
+        self.failed.clear()
+        self.endResetModel()
+    
+    def row_of(self, file_path):
+        return self.rows_by_path.get(file_path)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.files)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        file_path = self.files[index.row()]
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(file_path)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return file_path
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.thumbnails.get(file_path)
+            if pixmap is None:
+                return self.placeholder
+            self.thumbnails.move_to_end(file_path)
+            return pixmap
+        return None
+    
+    def request_rows(self, rows):
+        """Ставит в очередь миниатюры для строк; остальные незапущенные задачи снимаются."""
+        wanted = set()
+        for priority, row in enumerate(reversed(rows)):
+            file_path = self.files[row]
+            wanted.add(file_path)
+            if file_path in self.thumbnails or file_path in self.failed or file_path in self.pending:
+                continue
+            worker = ThumbnailWorker(file_path, self.cache_dir)
+            worker.signals.loaded.connect(self.on_thumbnail_loaded)
+            self.pending[file_path] = worker
+            # Чем ближе строка к началу списка, тем выше приоритет
+            self.thread_pool.start(worker, priority)
+        
+        for file_path, worker in list(self.pending.items()):
+            if file_path not in wanted and take_runnable(self.thread_pool, worker):
+                del self.pending[file_path]
+    
+    def cancel_pending(self):
+        for worker in self.pending.values():
+            worker.cancel()
+            take_runnable(self.thread_pool, worker)
+        self.pending.clear()
+    
+    def on_thumbnail_loaded(self, file_path, image):
+        if self.pending.pop(file_path, None) is None:
+            # Задача была отменена (например, открыта другая папка)
+            return
+        if image is None:
+            self.failed.add(file_path)
+            return
+        
+        self.thumbnails[file_path] = QPixmap.fromImage(image)
+        while len(self.thumbnails) > self.capacity:
+            self.thumbnails.popitem(last=False)
+        
+        row = self.rows_by_path.get(file_path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+class GalleryView(QListView):
+    """Виртуализированная сетка миниатюр папки."""
+    # Сколько экранов сверху и снизу от видимой области подготавливать заранее
+    PREFETCH_SCREENS = 1
+    
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.gallery_model = model
+        self.setModel(model)
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 36))
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        # Несколько файлов выделяются для сравнения (Ctrl/Shift + щелчок)
+        self.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+        self.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+        
+        # Миниатюры запрашиваются после паузы в прокрутке
+        self.request_timer = QTimer(self)
+        self.request_timer.setSingleShot(True)
+        self.request_timer.timeout.connect(self.request_visible_thumbnails)
+        model.modelReset.connect(self.schedule_requests)
+        self.verticalScrollBar().valueChanged.connect(self.schedule_requests)
+    
+    def schedule_requests(self):
+        self.request_timer.start(50)
+    
+    def visible_row_range(self):
+        """Первая и последняя строки модели, попадающие в видимую область."""
+        grid = self.gridSize()
+        viewport = self.viewport()
+        columns = max(1, viewport.width() // grid.width())
+        first_line = self.verticalScrollBar().value() // grid.height()
+        lines = viewport.height() // grid.height() + 2
+        first = first_line * columns
+        return first, first + lines * columns - 1, lines * columns
+    
+    def request_visible_thumbnails(self):
+        count = self.gallery_model.rowCount()
+        if not count or not self.isVisible():
+            return
+        first, last, page = self.visible_row_range()
+        margin = page * self.PREFETCH_SCREENS
+        
+        # Сначала видимые ячейки, затем соседние: ближние к экрану раньше
+        visible = list(range(max(0, first), min(count, last + 1)))
+        nearby = []
+        for offset in range(1, margin + 1):
+            if last + offset < count:
+                nearby.append(last + offset)
+            if first - offset >= 0:
+                nearby.append(first - offset)
+        self.gallery_model.request_rows(visible + nearby)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_requests()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.schedule_requests()
+
+class IndexFolderSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int)
+
+class IndexFolderWorker(QRunnable):
+    """Добавляет в поисковый индекс файлы папки, которых в нем еще нет.
+    
+    Метаданные читаются из заголовков и через общий кэш метаданных,
+    в индекс пишутся пачками по одной транзакции.
+    """
+    BATCH_SIZE = 64
+    
+    def __init__(self, files, search_index, metadata_cache=None):
+        super().__init__()
+        self.files = files
+        self.search_index = search_index
+        self.metadata_cache = metadata_cache
+        self.signals = IndexFolderSignals()
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        written = 0
+        batch = []
+        try:
+            for done, file_path in enumerate(self.files, 1):
+                if self._cancelled:
+                    return
+                try:
+                    file_info = os.stat(file_path)
+                except OSError:
+                    continue
+                if not self.search_index.is_current(file_path, file_info.st_size, file_info.st_mtime_ns):
+                    metadata = extract_metadata(file_path, header_only=True, cache=self.metadata_cache)
+                    if not metadata["error"]:
+                        batch.append((file_path, file_info.st_size, file_info.st_mtime_ns,
+                                      metadata["parameters"]))
+                if len(batch) >= self.BATCH_SIZE:
+                    written += self.search_index.add_many(batch)
+                    batch = []
+                    self.signals.progress.emit(done, len(self.files))
+            written += self.search_index.add_many(batch)
+        except sqlite3.Error:
+            pass
+        if not self._cancelled:
+            self.signals.finished.emit(written)
+
+class CompareSignals(QObject):
+    # Первый аргумент — номер поколения запроса, как у ImageLoadSignals
+    finished = pyqtSignal(int, object, float)
+    failed = pyqtSignal(int, str)
+
+class CompareWorker(QRunnable):
+    """Извлекает поля файлов в пуле потоков (через общий кэш метаданных) и сравнивает их.
+
+    Отмена проверяется по мере готовности файлов, оставшиеся задачи пула
+    при этом снимаются. Пул процессов из окна просмотра не используется:
+    разветвлять процесс с запущенными потоками Qt небезопасно.
+    """
+    def __init__(self, files, cache_path=None, image_fields=False, generation=0):
+        super().__init__()
+        self.files = files
+        self.cache_path = cache_path
+        self.image_fields = image_fields
+        self.generation = generation
+        self.signals = CompareSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        # concurrent.futures нужен только при сравнении, не при запуске окна
+        from concurrent.futures import ThreadPoolExecutor
+        
+        start = time.perf_counter()
+        cache = None
+        try:
+            cache = MetadataCache(self.cache_path) if self.cache_path else None
+            records = []
+            with ThreadPoolExecutor(max_workers=DEFAULT_THREADS) as executor:
+                futures = [executor.submit(extract_fields, file_path, cache, self.image_fields)
+                           for file_path in self.files]
+                try:
+                    for future in futures:
+                        if self._cancelled:
+                            return
+                        records.append(future.result())
+                finally:
+                    # Иначе выход из with ждал бы все поставленные в очередь файлы
+                    for future in futures:
+                        future.cancel()
+            report = compare_records(records)
+        except Exception as e:
+            # Окно должно узнать о завершении, иначе новое сравнение не запустить
+            if not self._cancelled:
+                self.signals.failed.emit(self.generation, str(e))
+            return
+        finally:
+            if cache is not None:
+                cache.close()
+        if not self._cancelled:
+            self.signals.finished.emit(self.generation, report, time.perf_counter() - start)
+
+class DuplicatesSignals(QObject):
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+class DuplicatesWorker(QRunnable):
+    """Считает перцептивные хэши файлов в пуле потоков (через кэш метаданных)."""
+    def __init__(self, files, cache_path=None):
+        super().__init__()
+        self.files = files
+        self.cache_path = cache_path
+        self.signals = DuplicatesSignals()
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        try:
+            hashes, errors = hash_files(self.files, cache_path=self.cache_path, processes=False,
+                                        cancelled=lambda: self._cancelled)
+        except Exception as e:
+            # Окно должно узнать о завершении, иначе новый поиск не запустить
+            if not self._cancelled:
+                self.signals.failed.emit(str(e))
+            return
+        if not self._cancelled:
+            self.signals.finished.emit(hashes, errors)
+
+class LibrarySearchPanel(QWidget):
+    """Поиск по параметрам генерации всех проиндексированных файлов."""
+    file_activated = pyqtSignal(str)
+    index_requested = pyqtSignal()
+    
+    def __init__(self, search_index, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.index_worker = None
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(8, 8, 8, 8)
+        layout.setSpacing(6)
+        
+        search_layout = QHBoxLayout()
+        self.search_input = SearchBox()
+        self.search_input.setPlaceholderText('Search prompts and parameters: words, "phrases", prefix*')
+        self.search_input.textChanged.connect(self.schedule_search)
+        self.search_input.returnPressed.connect(self.run_search)
+        self.index_button = ActionButton("Index Folder")
+        self.index_button.setToolTip("Add the images of the current folder to the search index")
+        self.index_button.clicked.connect(lambda: self.index_requested.emit())
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.index_button)
+        layout.addLayout(search_layout)
+        
+        self.results = QListWidget()
+        self.results.setUniformItemSizes(True)
+        self.results.setTextElideMode(Qt.TextElideMode.ElideRight)
+        self.results.itemActivated.connect(self.on_item_activated)
+        layout.addWidget(self.results)
+        
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        
+        # Запрос выполняется после паузы в наборе, как и фильтр таблицы
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.run_search)
+        
+        if search_index is None:
+            self.setEnabled(False)
+            self.status_label.setText("Search index is not available")
+    
+    def schedule_search(self):
+        self.search_timer.start(150)
+    
+    def run_search(self):
+        self.search_timer.stop()
+        self.results.clear()
+        text = self.search_input.text()
+        if not text.strip():
+            self.status_label.clear()
+            return
+        
+        start = time.perf_counter()
+        try:
+            results = self.search_index.search(text)
+        except sqlite3.Error as e:
+            self.status_label.setText(f"Search failed: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        
+        for result in results:
+            snippet = " ".join(result["snippet"].split())
+            item = QListWidgetItem(f"{os.path.basename(result['path'])} — {snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, result["path"])
+            item.setToolTip(result["path"])
+            self.results.addItem(item)
+        self.status_label.setText(f"{len(results)} results in {elapsed * 1000:.1f} ms")
+    
+    def on_item_activated(self, item):
+        self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole))
+    
+    def index_files(self, files, metadata_cache=None):
+        """Индексирует файлы в фоне; предыдущая индексация отменяется."""
+        self.cancel_indexing()
+        self.index_worker = IndexFolderWorker(list(files), self.search_index, metadata_cache)
+        self.index_worker.signals.progress.connect(self.on_index_progress)
+        self.index_worker.signals.finished.connect(self.on_index_finished)
+        self.status_label.setText(f"Indexing {len(files)} files...")
+        self.thread_pool.start(self.index_worker)
+    
+    def cancel_indexing(self):
+        if self.index_worker is not None:
+            self.index_worker.cancel()
+            take_runnable(self.thread_pool, self.index_worker)
+            self.index_worker = None
+    
+    def on_index_progress(self, done, total):
+        if self.index_worker is not None and self.sender() is self.index_worker.signals:
+            self.status_label.setText(f"Indexing {done}/{total} files...")
+    
+    def on_index_finished(self, written):
+        if self.index_worker is None or self.sender() is not self.index_worker.signals:
+            return
+        self.index_worker = None
+        self.status_label.setText(f"Indexed {written} new or changed files")
+        if self.search_input.text().strip():
+            self.run_search()
+
 class ImageMetadataViewer(QMainWindow):
-    def __init__(self):
+    def __init__(self, profiler=None):
         super().__init__()
         self.setWindowTitle("Image Metadata Viewer")
         self.setAcceptDrops(True)
@@ -304,6 +2071,13 @@ class ImageMetadataViewer(QMainWindow):
         self.settings = QSettings("MetadataViewer", "ImageMetadataViewer")
         self.restore_geometry()
         
+        # Замеры загрузки: profiler задается флагом --profile, время
+        # загрузки в строке состояния включается кнопкой на тулбаре
+        self.profiler = profiler
+        self.current_profile = NULL_PROFILE
+        self.load_started = time.perf_counter()
+        self.show_load_time = self.settings.value("showLoadTime", False, type=bool)
+        
         # Список недавних файлов
         self.recent_files = self.settings.value("recentFiles", [])
         if not isinstance(self.recent_files, list):
@@ -318,6 +2092,12 @@ class ImageMetadataViewer(QMainWindow):
         main_layout.setContentsMargins(16, 16, 16, 16)
         main_layout.setSpacing(12)
         
+        # Галерея папки текущего изображения
+        self.create_gallery()
+        
+        # Поиск по всей библиотеке
+        self.create_library()
+        
         # Создаем тулбар
         self.create_toolbar()
         
@@ -329,11 +2109,6 @@ class ImageMetadataViewer(QMainWindow):
         # Создаем разделенный контейнер
         splitter = QSplitter(Qt.Orientation.Horizontal)
         splitter.setHandleWidth(1)
-        splitter.setStyleSheet("""
-            QSplitter::handle {
-                background-color: #555555;
-            }
-        """)
         
         # Левая панель с просмотром изображения
         left_container = QWidget()
@@ -348,16 +2123,7 @@ class ImageMetadataViewer(QMainWindow):
         # Добавляем базовую информацию о файле
         self.file_info_widget = QFrame()
         self.file_info_widget.setFrameShape(QFrame.Shape.StyledPanel)
-        self.file_info_widget.setStyleSheet("""
-            QFrame {
-                background-color: #2a2a2a;
-                border-radius: 6px;
-                padding: 8px;
-            }
-            QLabel {
-                color: #e0e0e0;
-            }
-        """)
+        self.file_info_widget.setObjectName("fileInfo")
         
         self.file_info_layout = QGridLayout(self.file_info_widget)
         self.file_info_widget.setVisible(False)
@@ -378,19 +2144,37 @@ class ImageMetadataViewer(QMainWindow):
         # Поиск метаданных
         search_layout = QHBoxLayout()
         search_label = QLabel("Search:")
-        search_label.setStyleSheet("color: #e0e0e0; font-weight: bold;")
+        search_label.setObjectName("searchLabel")
         
         self.search_input = SearchBox()
-        self.search_input.textChanged.connect(self.filter_metadata)
+        self.search_input.textChanged.connect(self.schedule_filter)
+        self.search_input.returnPressed.connect(self.filter_metadata)
+        
+        # Фильтр применяется после паузы в наборе, а не на каждое нажатие
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self.filter_metadata)
+        
+        self.case_sensitive_button = SearchOptionButton("Aa", "Match case")
+        self.case_sensitive_button.toggled.connect(self.filter_metadata)
+        self.regex_button = SearchOptionButton(".*", "Use regular expression")
+        self.regex_button.toggled.connect(self.filter_metadata)
         
         search_layout.addWidget(search_label)
         search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.case_sensitive_button)
+        search_layout.addWidget(self.regex_button)
         right_layout.addLayout(search_layout)
         
         # Таблица метаданных
-        self.metadata_table = MetadataTableWidget()
+        self.metadata_table = MetadataTableView()
         self.metadata_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.metadata_table.customContextMenuRequested.connect(self.show_context_menu)
+        # Узлы вроде MakerNote разбираются из файла только при раскрытии
+        self.metadata_table.metadata_model.expander = (
+            lambda descriptor: expand_metadata_node(self.current_image_path, descriptor))
+        self.metadata_table.inspect_requested.connect(self.inspect_binary)
+        self.metadata_table.value_requested.connect(self.show_full_value)
         right_layout.addWidget(self.metadata_table)
         
         splitter.addWidget(right_container)
@@ -426,15 +2210,52 @@ class ImageMetadataViewer(QMainWindow):
         
         # Создаем статусбар
         self.status_bar = QStatusBar()
-        self.status_bar.setStyleSheet("QStatusBar { background-color: #252525; color: #aaaaaa; }")
         self.status_message = StatusMessage("Ready to process images")
         self.status_bar.addWidget(self.status_message, 1)
+        
+        # Индикатор занятости, пока идет фоновая загрузка
+        self.busy_indicator = QProgressBar()
+        self.busy_indicator.setRange(0, 0)
+        self.busy_indicator.setMaximumWidth(120)
+        self.busy_indicator.setMaximumHeight(12)
+        self.busy_indicator.setTextVisible(False)
+        self.busy_indicator.setVisible(False)
+        self.status_bar.addPermanentWidget(self.busy_indicator)
         self.setStatusBar(self.status_bar)
         
         # Инициализируем текущий путь к изображению
         self.current_image_path = None
         self.metadata_dict = {}
         self.original_pixmap = None
+        self.source_size = None
+        
+        # Фоновая загрузка: номер последнего запроса и незавершенные задачи
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.load_generation = 0
+        self.pending_loads = {}
+        
+        # Предзагрузка соседних файлов идет в своем пуле, чтобы не задерживать
+        # загрузку открываемого файла
+        self.prefetch_pool = QThreadPool(self)
+        self.prefetch_pool.setMaxThreadCount(2)
+        self.prefetch_loads = {}
+        self.prefetched = OrderedDict()
+        self.awaited_prefetch = None
+        self.requested_image_path = None
+        self.create_shortcuts()
+        
+        # Сравнение параметров и поиск дубликатов идут по одному в своем пуле
+        self.compare_pool = QThreadPool(self)
+        self.compare_pool.setMaxThreadCount(1)
+        self.compare_worker = None
+        self.duplicates_worker = None
+        
+        # Кэш разобранных метаданных; без него все работает, только медленнее
+        try:
+            self.metadata_cache = MetadataCache()
+        except (sqlite3.Error, OSError):
+            self.metadata_cache = None
         
         # Деактивируем кнопки, пока не загружено изображение
         self.update_button_states(False)
@@ -443,37 +2264,17 @@ class ImageMetadataViewer(QMainWindow):
         self.resize_timer = QTimer(self)
         self.resize_timer.setSingleShot(True)
         self.resize_timer.timeout.connect(self.adjust_table_rows)
+        
+        # Повторное декодирование превью, если окно стало больше него
+        self.preview_reload_timer = QTimer(self)
+        self.preview_reload_timer.setSingleShot(True)
+        self.preview_reload_timer.timeout.connect(self.reload_preview)
     
     def create_toolbar(self):
         toolbar = QToolBar("Main Toolbar")
         toolbar.setMovable(False)
         toolbar.setIconSize(QSize(18, 18))
         toolbar.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextBesideIcon)
-        toolbar.setStyleSheet("""
-            QToolBar {
-                background-color: #252525;
-                border: none;
-                spacing: 5px;
-                padding: 2px 5px;
-            }
-            QToolButton {
-                color: #e0e0e0;
-                background-color: transparent;
-                border: none;
-                border-radius: 4px;
-                padding: 5px;
-                margin: 2px;
-            }
-            QToolButton:hover {
-                background-color: #3a3a3a;
-            }
-            QToolButton:pressed {
-                background-color: #444444;
-            }
-            QToolButton:checked {
-                background-color: #0078d4;
-            }
-        """)
         
         # Действия для тулбара
         open_action = QAction("Open", self)
@@ -483,22 +2284,10 @@ class ImageMetadataViewer(QMainWindow):
         
         # Меню для недавно открытых файлов
         self.recent_menu = QMenu(self)
-        self.recent_menu.setStyleSheet("""
-            QMenu {
-                background-color: #2d2d2d;
-                color: #e0e0e0;
-                border: 1px solid #555555;
-            }
-            QMenu::item {
-                padding: 5px 20px 5px 20px;
-            }
-            QMenu::item:selected {
-                background-color: #0078d4;
-            }
-        """)
-        
-        # Обновим меню недавно открытых файлов
-        self.update_recent_menu()
+        
+        # Пункты строятся при открытии меню, чтобы проверка существования
+        # недавних файлов не задерживала запуск
+        self.recent_menu.aboutToShow.connect(self.update_recent_menu)
         
         # Кнопка для недавних файлов
         recent_button = QToolButton()
@@ -513,14 +2302,202 @@ class ImageMetadataViewer(QMainWindow):
         export_action.setIcon(ActionButton.get_icon(None, "export"))
         export_action.triggered.connect(self.export_metadata)
         
+        load_time_action = QAction("Load Time", self)
+        load_time_action.setToolTip("Show how long each file took to load in the status bar")
+        load_time_action.setCheckable(True)
+        load_time_action.setChecked(self.show_load_time)
+        load_time_action.toggled.connect(self.set_show_load_time)
+        
+        vacuum_action = QAction("Compact Cache", self)
+        vacuum_action.setToolTip("Evict old entries and compact the metadata and thumbnail caches")
+        vacuum_action.triggered.connect(self.vacuum_metadata_cache)
+        
+        compare_action = QAction("Compare", self)
+        compare_action.setToolTip("Compare generation parameters of the files selected in the gallery "
+                                  "(or of the whole folder)")
+        compare_action.triggered.connect(self.compare_gallery_files)
+        
+        duplicates_action = QAction("Duplicates", self)
+        duplicates_action.setToolTip("Find duplicate and near-duplicate images in the gallery folder")
+        duplicates_action.triggered.connect(self.find_gallery_duplicates)
+        
+        gallery_action = self.gallery_dock.toggleViewAction()
+        gallery_action.setText("Gallery")
+        gallery_action.setToolTip("Show thumbnails of the current folder")
+        
+        library_action = self.library_dock.toggleViewAction()
+        library_action.setText("Library")
+        library_action.setToolTip("Search prompts and parameters across indexed files")
+        
         # Добавляем кнопки в тулбар
         toolbar.addAction(open_action)
         toolbar.addWidget(recent_button)
+        toolbar.addAction(gallery_action)
+        toolbar.addAction(library_action)
+        toolbar.addAction(compare_action)
+        toolbar.addAction(duplicates_action)
         toolbar.addSeparator()
         toolbar.addAction(export_action)
+        toolbar.addAction(vacuum_action)
+        toolbar.addAction(load_time_action)
         
         self.addToolBar(toolbar)
     
+    def create_gallery(self):
+        self.gallery_folder = None
+        self.syncing_gallery = False
+        self.gallery_model = GalleryModel(default_thumbnail_dir(), parent=self)
+        self.gallery_view = GalleryView(self.gallery_model)
+        self.gallery_view.selectionModel().currentChanged.connect(self.on_gallery_current_changed)
+        
+        self.gallery_dock = QDockWidget("Gallery", self)
+        self.gallery_dock.setObjectName("galleryDock")
+        self.gallery_dock.setWidget(self.gallery_view)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.gallery_dock)
+        self.gallery_dock.setVisible(self.settings.value("galleryVisible", True, type=bool))
+    
+    def create_library(self):
+        # Индекс необязателен, как и кэш метаданных
+        try:
+            self.search_index = SearchIndex()
+        except (sqlite3.Error, OSError):
+            self.search_index = None
+        
+        # Панель поиска создается, когда док впервые показывают
+        self.library_panel = None
+        self.library_dock = QDockWidget("Library", self)
+        self.library_dock.setObjectName("libraryDock")
+        self.library_dock.visibilityChanged.connect(self.ensure_library_panel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.library_dock)
+        self.library_dock.setVisible(self.settings.value("libraryVisible", False, type=bool))
+    
+    def ensure_library_panel(self, visible=True):
+        if not visible or self.library_panel is not None:
+            return
+        self.library_panel = LibrarySearchPanel(self.search_index)
+        self.library_panel.file_activated.connect(self.process_image)
+        self.library_panel.index_requested.connect(self.index_gallery_folder)
+        self.library_dock.setWidget(self.library_panel)
+    
+    def index_gallery_folder(self):
+        """Индексирует папку, показанную в галерее."""
+        if not self.gallery_model.files:
+            self.status_message.showMessage("Open an image to choose the folder to index", 3000)
+            return
+        self.library_panel.index_files(self.gallery_model.files, self.metadata_cache)
+    
+    def compare_gallery_files(self):
+        """Сравнивает файлы, выделенные в галерее, а если выделен один — всю папку."""
+        rows = sorted(index.row() for index in self.gallery_view.selectionModel().selectedIndexes())
+        files = [self.gallery_model.files[row] for row in rows]
+        if len(files) < 2:
+            files = self.gallery_model.files
+        if len(files) < 2:
+            self.status_message.showMessage("Open a folder with at least two images to compare", 3000)
+            return
+        if self.compare_worker is not None:
+            return
+        
+        cache_path = self.metadata_cache.path if self.metadata_cache is not None else None
+        self.compare_worker = CompareWorker(list(files), cache_path)
+        self.compare_worker.signals.finished.connect(self.on_compare_finished)
+        self.compare_worker.signals.failed.connect(self.on_compare_failed)
+        self.status_message.showMessage(f"Comparing {len(files)} files...")
+        self.compare_pool.start(self.compare_worker)
+    
+    def find_gallery_duplicates(self):
+        """Ищет похожие изображения в папке галереи."""
+        files = self.gallery_model.files
+        if len(files) < 2:
+            self.status_message.showMessage("Open a folder with at least two images to search", 3000)
+            return
+        if self.duplicates_worker is not None:
+            return
+        
+        cache_path = self.metadata_cache.path if self.metadata_cache is not None else None
+        self.duplicates_worker = DuplicatesWorker(list(files), cache_path)
+        self.duplicates_worker.signals.finished.connect(self.on_duplicates_finished)
+        self.duplicates_worker.signals.failed.connect(self.on_duplicates_failed)
+        self.status_message.showMessage(f"Hashing {len(files)} files...", 0)
+        self.compare_pool.start(self.duplicates_worker)
+    
+    def on_duplicates_finished(self, hashes, errors):
+        if self.duplicates_worker is None or self.sender() is not self.duplicates_worker.signals:
+            return
+        cache_path = self.duplicates_worker.cache_path
+        self.duplicates_worker = None
+        self.status_message.clear()
+        dialog = DuplicatesDialog(hashes, errors, cache_path, self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.file_activated.connect(self.process_image)
+        dialog.show()
+    
+    def on_duplicates_failed(self, message):
+        if self.duplicates_worker is None or self.sender() is not self.duplicates_worker.signals:
+            return
+        self.duplicates_worker = None
+        self.status_message.showMessage(f"Could not search for duplicates: {message}", 5000)
+    
+    def on_compare_finished(self, generation, report, elapsed):
+        if self.compare_worker is None or self.sender() is not self.compare_worker.signals:
+            return
+        self.compare_worker = None
+        self.status_message.clear()
+        dialog = CompareDialog(report, elapsed, self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.file_activated.connect(self.process_image)
+        dialog.show()
+    
+    def on_compare_failed(self, generation, message):
+        if self.compare_worker is None or self.sender() is not self.compare_worker.signals:
+            return
+        self.compare_worker = None
+        self.status_message.showMessage(f"Could not compare files: {message}", 5000)
+    
+    def sync_gallery(self, file_path):
+        """Показывает в галерее папку файла и выделяет его."""
+        file_path = os.path.abspath(file_path)
+        folder = os.path.dirname(file_path)
+        if folder != self.gallery_folder:
+            self.gallery_folder = folder
+            self.gallery_model.set_files(list_image_files(folder))
+        
+        row = self.gallery_model.row_of(file_path)
+        if row is None:
+            return
+        index = self.gallery_model.index(row)
+        self.syncing_gallery = True
+        try:
+            self.gallery_view.selectionModel().setCurrentIndex(
+                index, self.gallery_view.selectionModel().SelectionFlag.ClearAndSelect)
+        finally:
+            self.syncing_gallery = False
+        self.gallery_view.scrollTo(index)
+    
+    def on_gallery_current_changed(self, current, previous):
+        """Открывает файл, выбранный в галерее."""
+        if self.syncing_gallery or not current.isValid():
+            return
+        self.process_image(self.gallery_model.files[current.row()])
+    
+    def create_shortcuts(self):
+        # Поле поиска само обрабатывает стрелки, поэтому в нем они двигают курсор
+        for key, step in ((Qt.Key.Key_Right, 1), (Qt.Key.Key_PageDown, 1),
+                          (Qt.Key.Key_Left, -1), (Qt.Key.Key_PageUp, -1)):
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.activated.connect(lambda step=step: self.show_adjacent_image(step))
+    
+    def show_adjacent_image(self, step):
+        """Открывает следующий или предыдущий файл папки."""
+        if not self.requested_image_path:
+            return
+        row = self.gallery_model.row_of(os.path.abspath(self.requested_image_path))
+        if row is None:
+            return
+        row += step
+        if 0 <= row < len(self.gallery_model.files):
+            self.process_image(self.gallery_model.files[row])
+    
     def update_recent_menu(self):
         """Обновляет меню недавно открытых файлов."""
         self.recent_menu.clear()
@@ -558,15 +2535,11 @@ class ImageMetadataViewer(QMainWindow):
         
         # Сохраняем список в настройках
         self.settings.setValue("recentFiles", self.recent_files)
-        
-        # Обновляем меню
-        self.update_recent_menu()
     
     def clear_recent_files(self):
         """Очищает список недавно открытых файлов."""
         self.recent_files = []
         self.settings.setValue("recentFiles", self.recent_files)
-        self.update_recent_menu()
         self.status_message.showMessage("Recent files list cleared")
     
     def set_dark_theme(self):
@@ -587,54 +2560,10 @@ class ImageMetadataViewer(QMainWindow):
         
         self.setPalette(dark_palette)
         
-        # Устанавливаем стили для всего приложения
+        # Все стили приложения задаются одной таблицей: виджеты при создании
+        # не разбирают собственные таблицы стилей
         QApplication.setStyle("Fusion")
-        QApplication.instance().setStyleSheet("""
-            QScrollBar:vertical {
-                border: none;
-                background-color: #2a2a2a;
-                width: 10px;
-                margin: 0px;
-            }
-            QScrollBar::handle:vertical {
-                background-color: #5a5a5a;
-                min-height: 30px;
-                border-radius: 5px;
-            }
-            QScrollBar::handle:vertical:hover {
-                background-color: #6a6a6a;
-            }
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                border: none;
-                background: none;
-                height: 0px;
-            }
-            QScrollBar:horizontal {
-                border: none;
-                background-color: #2a2a2a;
-                height: 10px;
-                margin: 0px;
-            }
-            QScrollBar::handle:horizontal {
-                background-color: #5a5a5a;
-                min-width: 30px;
-                border-radius: 5px;
-            }
-            QScrollBar::handle:horizontal:hover {
-                background-color: #6a6a6a;
-            }
-            QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
-                border: none;
-                background: none;
-                width: 0px;
-            }
-            QToolTip {
-                background-color: #2d2d2d;
-                color: #e0e0e0;
-                border: 1px solid #555555;
-                padding: 5px;
-            }
-        """)
+        QApplication.instance().setStyleSheet(APP_STYLESHEET)
     
     def restore_geometry(self):
         # Восстановление размеров и позиции окна
@@ -658,58 +2587,23 @@ class ImageMetadataViewer(QMainWindow):
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             for url in event.mimeData().urls():
-                if url.toLocalFile().lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')):
-                    self.drop_area.setStyleSheet("""
-                        QLabel {
-                            border: 2px dashed #0078d4;
-                            border-radius: 6px;
-                            padding: 12px;
-                            color: #ffffff;
-                            font-size: 15px;
-                            background-color: rgba(0, 120, 212, 0.1);
-                        }
-                    """)
+                if url.toLocalFile().lower().endswith(IMAGE_EXTENSIONS):
+                    self.drop_area.set_drag_active(True)
                     event.acceptProposedAction()
                     return
         
         event.ignore()
     
     def dragLeaveEvent(self, event):
-        self.drop_area.setStyleSheet("""
-            QLabel {
-                border: 2px dashed #555555;
-                border-radius: 6px;
-                padding: 12px;
-                color: #cccccc;
-                font-size: 15px;
-                background-color: #2a2a2a;
-            }
-            QLabel:hover {
-                background-color: #333333;
-                border-color: #777777;
-            }
-        """)
+        self.drop_area.set_drag_active(False)
     
     def dropEvent(self, event: QDropEvent):
-        self.drop_area.setStyleSheet("""
-            QLabel {
-                border: 2px dashed #555555;
-                border-radius: 6px;
-                padding: 12px;
-                color: #cccccc;
-                font-size: 15px;
-                background-color: #2a2a2a;
-            }
-            QLabel:hover {
-                background-color: #333333;
-                border-color: #777777;
-            }
-        """)
+        self.drop_area.set_drag_active(False)
         
         if event.mimeData().hasUrls():
             for url in event.mimeData().urls():
                 file_path = url.toLocalFile()
-                if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')):
+                if file_path.lower().endswith(IMAGE_EXTENSIONS):
                     self.process_image(file_path)
                     break  # Process only the first valid image
         
@@ -728,44 +2622,249 @@ class ImageMetadataViewer(QMainWindow):
             self.process_image(file_path)
     
     def process_image(self, file_path):
+        """Запускает фоновую загрузку изображения и его метаданных."""
+        self.status_message.showMessage(f"Processing: {os.path.basename(file_path)}", 0)
+        self.requested_image_path = file_path
+        self.load_started = time.perf_counter()
+        self.current_profile = self.profiler.start(file_path) if self.profiler else NULL_PROFILE
+        self.sync_gallery(file_path)
+        
+        # Если превью этого файла уже в кэше, показываем его сразу и
+        # декодируем в фоне только метаданные
+        cached = self.image_viewer.set_image(file_path)
+        prefetched = self.prefetched.pop(file_path, None)
+        if cached and prefetched is not None and prefetched["signature"] == file_signature(file_path):
+            # Соседний файл уже подготовлен заранее
+            self.current_profile.count("prefetch_hits")
+            self.load_generation += 1
+            self.cancel_pending_loads()
+            self.on_image_loaded(self.load_generation, prefetched)
+        elif file_path in self.prefetch_loads and (cached or self.prefetch_loads[file_path].with_preview):
+            # Предзагрузка этого файла уже идет: ждем ее, а не начинаем заново
+            self.load_generation += 1
+            self.cancel_pending_loads()
+            self.set_busy(True)
+            self.awaited_prefetch = (file_path, self.load_generation)
+        else:
+            self.start_load(file_path, with_metadata=True, with_preview=not cached)
+        
+        self.update_prefetch(file_path)
+    
+    def update_prefetch(self, file_path):
+        """Готовит превью и метаданные соседних файлов; задачи вне окна отменяются."""
+        row = self.gallery_model.row_of(os.path.abspath(file_path))
+        files = self.gallery_model.files
+        wanted = []
+        if row is not None:
+            for distance in range(1, PREFETCH_DISTANCE + 1):
+                for neighbour in (row + distance, row - distance):
+                    if 0 <= neighbour < len(files):
+                        wanted.append(files[neighbour])
+        
+        # Ожидаемая загрузка текущего файла не отменяется
+        keep = set(wanted)
+        if self.awaited_prefetch is not None:
+            keep.add(self.awaited_prefetch[0])
+        for path, worker in list(self.prefetch_loads.items()):
+            if path not in keep:
+                worker.cancel()
+                take_runnable(self.prefetch_pool, worker)
+                del self.prefetch_loads[path]
+        for path in list(self.prefetched):
+            if path not in keep:
+                del self.prefetched[path]
+        
+        for priority, path in enumerate(reversed(wanted)):
+            if path in self.prefetch_loads or path in self.prefetched:
+                continue
+            cached = self.image_viewer.preview_cache.get(path) is not None
+            worker = ImageLoadWorker(0, path, self.preview_size(), True, not cached,
+                                     self.metadata_cache, self.search_index)
+            worker.signals.loaded.connect(self.on_prefetch_loaded)
+            worker.signals.failed.connect(self.on_prefetch_failed)
+            self.prefetch_loads[path] = worker
+            # Ближайшие соседи в начале списка и получают больший приоритет
+            self.prefetch_pool.start(worker, priority)
+    
+    def on_prefetch_loaded(self, generation, result):
+        file_path = result["path"]
+        if self.prefetch_loads.pop(file_path, None) is None:
+            # Файл вышел из окна предзагрузки
+            return
+        
+        if self.awaited_prefetch is not None and self.awaited_prefetch[0] == file_path:
+            generation = self.awaited_prefetch[1]
+            self.awaited_prefetch = None
+            self.on_image_loaded(generation, result)
+            return
+        
+        if result["image"] is not None:
+            self.image_viewer.preview_cache.put(
+                file_path, PreviewPyramid(QPixmap.fromImage(result["image"]), result["signature"]))
+            result["image"] = None
+        self.prefetched[file_path] = result
+    
+    def on_prefetch_failed(self, generation, file_path, message):
+        self.prefetch_loads.pop(file_path, None)
+        if self.awaited_prefetch is not None and self.awaited_prefetch[0] == file_path:
+            generation = self.awaited_prefetch[1]
+            self.awaited_prefetch = None
+            self.on_image_failed(generation, file_path, message)
+    
+    def reload_preview(self):
+        """Заново декодирует превью текущего файла под увеличившуюся область просмотра."""
+        if (self.current_image_path and not self.pending_loads and self.awaited_prefetch is None
+                and self.preview_needs_reload()):
+            self.start_load(self.current_image_path, with_metadata=False)
+    
+    def check_preview_resolution(self):
+        """Планирует повторное декодирование, если превью стало меньше области просмотра."""
+        if self.preview_needs_reload():
+            self.preview_reload_timer.start(300)
+    
+    def start_load(self, file_path, with_metadata, with_preview=True):
+        self.awaited_prefetch = None
+        self.load_generation += 1
+        generation = self.load_generation
+        
+        # Результаты предыдущих запросов больше не нужны
+        self.cancel_pending_loads()
+        self.set_busy(True)
+        
+        # Замеряется только загрузка, начатая process_image
+        profile = self.current_profile if with_metadata else NULL_PROFILE
+        worker = ImageLoadWorker(generation, file_path, self.preview_size(),
+                                 with_metadata, with_preview, self.metadata_cache,
+                                 self.search_index, profile)
+        worker.signals.loaded.connect(self.on_image_loaded)
+        worker.signals.failed.connect(self.on_image_failed)
+        self.pending_loads[generation] = worker
+        self.thread_pool.start(worker)
+    
+    def preview_size(self):
+        """Размер области просмотра в физических пикселях — до него уменьшается превью."""
+        ratio = self.devicePixelRatioF()
+        return (max(1, int((self.image_viewer.width() - 20) * ratio)),
+                max(1, int((self.image_viewer.height() - 20) * ratio)))
+    
+    def preview_needs_reload(self):
+        """Проверяет, стало ли декодированное превью меньше области просмотра."""
+        if not self.current_image_path or not self.original_pixmap or not self.source_size:
+            return False
+        max_width, max_height = self.preview_size()
+        # Исходник уже декодирован полностью — больше взять неоткуда
+        if self.original_pixmap.width() >= self.source_size[0]:
+            return False
+        return (self.original_pixmap.width() < max_width and
+                self.original_pixmap.height() < max_height)
+    
+    def cancel_pending_loads(self):
+        """Отменяет незавершенные загрузки; еще не начатые снимаются с очереди."""
+        for worker in self.pending_loads.values():
+            worker.cancel()
+            take_runnable(self.thread_pool, worker)
+        self.pending_loads.clear()
+    
+    def set_busy(self, busy):
+        """Показывает или скрывает индикатор фоновой работы."""
+        self.busy_indicator.setVisible(busy)
+        if busy:
+            self.image_viewer.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.image_viewer.unsetCursor()
+    
+    def on_image_loaded(self, generation, result):
+        """Принимает результат фоновой загрузки, если он еще актуален."""
+        self.pending_loads.pop(generation, None)
+        if generation != self.load_generation:
+            return
+        
+        self.set_busy(False)
+        file_path = result["path"]
+        metadata = result["metadata"]
         self.current_image_path = file_path
-        self.status_message.showMessage(f"Processing: {os.path.basename(file_path)}")
+        self.source_size = result["source_size"]
         
         # Display image preview
-        pixmap = QPixmap(file_path)
-        if not pixmap.isNull():
-            # Scale maintaining aspect ratio
-            self.original_pixmap = pixmap
-            max_width = self.image_viewer.width() - 20
-            max_height = self.image_viewer.height() - 20
-            
-            scaled_pixmap = pixmap.scaled(
-                max_width, max_height,
-                Qt.AspectRatioMode.KeepAspectRatio, 
-                Qt.TransformationMode.SmoothTransformation
-            )
-            
-            self.image_viewer.set_image(scaled_pixmap)
-            
-            # Extract and display metadata
-            self.extract_metadata(file_path)
-            
-            # Update drop area with filename
-            filename = os.path.basename(file_path)
-            self.drop_area.setText(filename)
-            self.drop_area.setToolTip(file_path)
-            
-            # Обновляем заголовок окна
-            self.setWindowTitle(f"{filename} - Image Metadata Viewer")
-            
-            # Обновляем состояние кнопок
-            self.update_button_states(True)
-            
-            # Добавляем файл в недавние
-            self.add_to_recent_files(file_path)
-            
+        profile = self.current_profile if metadata is not None else NULL_PROFILE
+        if result["image"] is not None:
+            with profile.span("pixmap"):
+                self.image_viewer.set_image(file_path, QPixmap.fromImage(result["image"]),
+                                            result["signature"])
         else:
-            self.status_message.showMessage(f"Error: Could not load image {os.path.basename(file_path)}")
+            # Превью взято из кэша; если его успели вытеснить или файл с тех
+            # пор изменился, декодируем заново
+            cached = self.image_viewer.set_image(file_path)
+            if not cached or self.image_viewer.pyramid.signature != result["signature"]:
+                self.image_viewer.preview_cache.discard(file_path)
+                if not cached:
+                    self.image_viewer.clear()
+                self.schedule_preview_load(generation, file_path)
+        pyramid = self.image_viewer.pyramid
+        self.original_pixmap = pyramid.base if pyramid is not None else None
+        self.check_preview_resolution()
+        
+        if metadata is None:
+            # Обновлялось только превью
+            return
+        
+        # Display metadata
+        with profile.span("table_populate"):
+            self.show_metadata(file_path, metadata)
+        if profile:
+            # Обычно высоты строк считаются по таймеру; здесь — сразу, чтобы замерить
+            with profile.span("row_heights"):
+                self.metadata_table.resize_visible_rows()
+        
+        # Update drop area with filename
+        filename = os.path.basename(file_path)
+        self.drop_area.setText(filename)
+        self.drop_area.setToolTip(file_path)
+        
+        # Обновляем заголовок окна
+        self.setWindowTitle(f"{filename} - Image Metadata Viewer")
+        
+        # Обновляем состояние кнопок
+        self.update_button_states(True)
+        
+        # Добавляем файл в недавние
+        self.add_to_recent_files(file_path)
+        
+        self.finish_load_timing(file_path, metadata["error"] is None)
+    
+    def schedule_preview_load(self, generation, file_path):
+        """Декодирует превью заново после текущего обработчика.
+        
+        Если к тому времени пользователь открыл другой файл, загрузка
+        не начинается, чтобы не отменить его запрос.
+        """
+        def reload():
+            if generation == self.load_generation:
+                self.start_load(file_path, with_metadata=False)
+        QTimer.singleShot(0, reload)
+    
+    def finish_load_timing(self, file_path, succeeded):
+        """Завершает замер загрузки: печатает профиль и показывает время в строке состояния."""
+        elapsed = time.perf_counter() - self.load_started
+        if self.current_profile:
+            self.profiler.finish(self.current_profile)
+            self.current_profile = NULL_PROFILE
+        if self.show_load_time and succeeded:
+            self.status_message.showMessage(
+                f"Loaded metadata for {os.path.basename(file_path)} in {elapsed * 1000:.0f} ms")
+    
+    def set_show_load_time(self, enabled):
+        self.show_load_time = enabled
+        self.settings.setValue("showLoadTime", enabled)
+    
+    def on_image_failed(self, generation, file_path, message):
+        """Сообщает об ошибке загрузки, если запрос еще актуален."""
+        self.pending_loads.pop(generation, None)
+        if generation != self.load_generation:
+            return
+        
+        self.set_busy(False)
+        self.status_message.showMessage(f"Error: {message}")
     
     def update_file_info_widget(self, file_info_data):
         """Обновляет виджет с базовой информацией о файле."""
@@ -779,10 +2878,9 @@ class ImageMetadataViewer(QMainWindow):
         row = 0
         for key, value in file_info_data.items():
             label_key = QLabel(f"{key}:")
-            label_key.setStyleSheet("color: #aaaaaa; font-weight: normal;")
+            label_key.setObjectName("fileInfoKey")
             
             label_value = QLabel(str(value))
-            label_value.setStyleSheet("color: #e0e0e0; font-weight: normal;")
             label_value.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
             label_value.setWordWrap(True)
             
@@ -792,290 +2890,32 @@ class ImageMetadataViewer(QMainWindow):
         
         self.file_info_widget.setVisible(True)
     
-    def extract_metadata(self, file_path):
-        # Clear previous metadata
-        self.metadata_table.setRowCount(0)
-        self.metadata_dict = {}
+    def show_metadata(self, file_path, metadata):
+        """Заполняет таблицу метаданными, подготовленными в фоновом потоке."""
         self.search_input.clear()
         
-        # Категории параметров
-        parameters = {
-            "Prompt": [],           # Основной промпт и теги
-            "Negative prompt": [],  # Негативный промпт
-            "Seed": [],            # Сид генерации
-            "Model Info": {},      # Информация о модели
-            "Generation Parameters": {},  # Параметры генерации
-            "Other Parameters": {}  # Прочие параметры
-        }
-        
-        # Остальные категории метаданных
-        categories = {
-            "File Info": {},
-            "Image Properties": {},
-            "Camera Info": {},
-            "GPS Data": {},
-            "Other EXIF": {},
-            "Other Metadata": {}
-        }
-        
-        try:
-            # Базовая информация о файле
-            file_info = os.stat(file_path)
-            file_size_b = file_info.st_size
-            file_size_kb = file_size_b / 1024
-            file_size_mb = file_size_kb / 1024
-            
-            if file_size_mb >= 1:
-                file_size_str = f"{file_size_mb:.2f} MB ({file_size_b:,} bytes)"
-            else:
-                file_size_str = f"{file_size_kb:.2f} KB ({file_size_b:,} bytes)"
-            
-            categories["File Info"] = {
-                "Filename": os.path.basename(file_path),
-                "Directory": os.path.dirname(file_path),
-                "File size": file_size_str,
-                "Created": datetime.fromtimestamp(file_info.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
-                "Modified": datetime.fromtimestamp(file_info.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                "Last accessed": datetime.fromtimestamp(file_info.st_atime).strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            
+        if metadata["summary"]:
             # Обновляем виджет с информацией о файле
-            self.update_file_info_widget({
-                "Filename": os.path.basename(file_path),
-                "Size": file_size_str,
-                "Modified": datetime.fromtimestamp(file_info.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-            })
-            
-            # Извлекаем метаданные изображения
-            with PIL.Image.open(file_path) as img:
-                # Get image dimensions
-                width, height = img.size
-                categories["Image Properties"]["Dimensions"] = f"{width} × {height} pixels"
-                categories["Image Properties"]["Format"] = img.format or "Unknown"
-                categories["Image Properties"]["Mode"] = img.mode
-                
-                # Get metadata and parse parameters
-                for key, value in img.info.items():
-                    if isinstance(value, bytes):
-                        formatted_value = f"<binary data: {len(value)} bytes>"
-                    else:
-                        formatted_value = str(value)
-                        
-                        # Парсим параметры
-                        if "parameters" in key.lower():
-                            lines = formatted_value.split("\n")
-                            current_category = None
-                            prompt_lines = []
-                            negative_prompt_lines = []
-                            tipo_params = []
-                            
-                            for line in lines:
-                                line = line.strip()
-                                if not line:
-                                    continue
-                                    
-                                # Определяем категорию параметра
-                                if line.startswith("Negative prompt:"):
-                                    current_category = "Negative prompt"
-                                    negative_prompt_lines.append(line[15:].strip())
-                                elif "Steps:" in line and "Schedule type:" in line:
-                                    current_category = "Generation Parameters"
-                                    params = line.split(",")
-                                    for param in params:
-                                        if ":" in param:
-                                            k, v = param.split(":", 1)
-                                            parameters[current_category][k.strip()] = v.strip()
-                                elif line.startswith("Seed:"):
-                                    current_category = "Seed"
-                                    parameters[current_category].append(line.strip())
-                                elif any(x in line for x in ["Model hash:", "Model:"]):
-                                    current_category = "Model Info"
-                                    params = line.split(",")
-                                    for param in params:
-                                        if ":" in param:
-                                            k, v = param.split(":", 1)
-                                            parameters[current_category][k.strip()] = v.strip()
-                                elif "TIPO" in line.upper() or line.upper().startswith("TIPO"):
-                                    current_category = "Other Parameters"
-                                    tipo_params.append(line.strip())
-                                elif line.upper().startswith("ADETAILER"):
-                                    current_category = "Other Parameters"
-                                    if "ADetailer" not in parameters[current_category]:
-                                        parameters[current_category]["ADetailer"] = []
-                                    parameters[current_category]["ADetailer"].append(line.strip())
-                                elif not any(line.startswith(x) for x in ["Steps:", "Negative prompt:", "Seed:", "Model:"]):
-                                    # Это основной промпт
-                                    if current_category != "Prompt":
-                                        current_category = "Prompt"
-                                    prompt_lines.append(line.strip())
-                            
-                            # Добавляем собранные параметры
-                            if prompt_lines:
-                                # Убираем начальные двоеточия из значения
-                                prompt_text = "\n".join(prompt_lines)
-                                while prompt_text.startswith(":"):
-                                    prompt_text = prompt_text[1:].strip()
-                                parameters["Prompt"] = [prompt_text]
-                            if negative_prompt_lines:
-                                # Убираем начальные двоеточия из значения
-                                neg_prompt_text = "\n".join(negative_prompt_lines)
-                                while neg_prompt_text.startswith(":"):
-                                    neg_prompt_text = neg_prompt_text[1:].strip()
-                                parameters["Negative prompt"] = [neg_prompt_text]
-                            if tipo_params:
-                                # Группируем все параметры TIPO в одну ячейку
-                                parameters["Other Parameters"]["TIPO Parameters"] = "\n".join(tipo_params)
-                        else:
-                            categories["Other Metadata"][key] = formatted_value
-                
-                # Get EXIF data if available
-                try:
-                    exif_data = img.getexif()
-                    if exif_data:
-                        for tag_id in exif_data:
-                            tag = TAGS.get(tag_id, tag_id)
-                            data = exif_data.get(tag_id)
-                            
-                            if isinstance(data, bytes):
-                                formatted_data = f"<binary data: {len(data)} bytes>"
-                            else:
-                                formatted_data = str(data)
-                            
-                            if tag.lower() in ["make", "model", "lens", "exposuretime", "fnumber", 
-                                              "isospeedratings", "focallength", "flash", "software",
-                                              "exposureprogram", "shutterspeedvalue", "aperture",
-                                              "exposuremode", "whitebalance", "meteringmode"]:
-                                categories["Camera Info"][tag] = formatted_data
-                            elif "gps" in tag.lower():
-                                categories["GPS Data"][tag] = formatted_data
-                            else:
-                                categories["Other EXIF"][tag] = formatted_data
-                except Exception as e:
-                    categories["Other Metadata"]["EXIF Error"] = str(e)
+            self.update_file_info_widget(metadata["summary"])
         
-        except Exception as e:
-            self.status_message.showMessage(f"Error: {str(e)}")
-            categories["Other Metadata"]["Error"] = f"Failed to extract metadata: {str(e)}"
+        if metadata["error"]:
+            self.status_message.showMessage(f"Error: {metadata['error']}")
         
-        # Сохраняем словарь метаданных для экспорта
-        self.metadata_dict = {}
-        
-        # Сначала добавляем параметры
-        if any(parameters[cat] for cat in parameters):
-            # Добавляем заголовок Parameters
-            cat_row = self.metadata_table.rowCount()
-            self.metadata_table.insertRow(cat_row)
-            cat_item = QTableWidgetItem("Parameters")
-            cat_item.setBackground(QColor(45, 45, 60))
-            cat_item.setForeground(QColor(230, 230, 230))
-            cat_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            cat_item.setFont(QFont(cat_item.font().family(), cat_item.font().pointSize(), QFont.Weight.Bold))
-            self.metadata_table.setSpan(cat_row, 0, 1, 2)
-            self.metadata_table.setItem(cat_row, 0, cat_item)
-            
-            # Добавляем категории параметров
-            for category, items in parameters.items():
-                if items:  # Если есть данные в категории
-                    # Добавляем подзаголовок категории
-                    cat_row = self.metadata_table.rowCount()
-                    self.metadata_table.insertRow(cat_row)
-                    cat_item = QTableWidgetItem(f"  {category}")  # Добавляем отступ для подкатегории
-                    cat_item.setBackground(QColor(35, 35, 50))
-                    cat_item.setForeground(QColor(200, 200, 200))
-                    cat_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-                    cat_item.setFont(QFont(cat_item.font().family(), cat_item.font().pointSize(), QFont.Weight.Bold))
-                    self.metadata_table.setSpan(cat_row, 0, 1, 2)
-                    self.metadata_table.setItem(cat_row, 0, cat_item)
-                    
-                    # Добавляем значения
-                    if isinstance(items, list):
-                        # Для списков (Prompt, Negative prompt, Seed)
-                        for value in items:
-                            self.add_metadata_row("", value)
-                    else:
-                        # Для словарей (Model Info, Generation Parameters, Other Parameters)
-                        for key, value in items.items():
-                            self.add_metadata_row(key, value)
-            
-            self.metadata_dict["Parameters"] = parameters
-        
-        # Затем добавляем остальные категории
-        for category, items in categories.items():
-            if items:
-                self.metadata_dict[category] = items
-                
-                # Добавляем заголовок категории
-                cat_row = self.metadata_table.rowCount()
-                self.metadata_table.insertRow(cat_row)
-                cat_item = QTableWidgetItem(category)
-                cat_item.setBackground(QColor(45, 45, 60))
-                cat_item.setForeground(QColor(230, 230, 230))
-                cat_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                cat_item.setFont(QFont(cat_item.font().family(), cat_item.font().pointSize(), QFont.Weight.Bold))
-                self.metadata_table.setSpan(cat_row, 0, 1, 2)
-                self.metadata_table.setItem(cat_row, 0, cat_item)
-                
-                # Добавляем элементы категории
-                for key, value in items.items():
-                    self.add_metadata_row(key, value)
-        
-        # Настраиваем высоту строк
-        self.adjust_table_rows()
+        # Таблица заменяется целиком за один сброс модели; словарь метаданных
+        # сохраняем для экспорта
+        rows, self.metadata_dict = build_metadata_rows(metadata["parameters"],
+                                                       metadata["categories"])
+        self.metadata_table.set_rows(rows, metadata["expandable"])
         
         self.status_message.showMessage(f"Loaded metadata for {os.path.basename(file_path)}")
     
     def adjust_table_rows(self):
-        """Настраивает высоту строк в таблице."""
-        self.metadata_table.resizeRowsToContents()
-    
-    def add_metadata_row(self, key, value):
-        row = self.metadata_table.rowCount()
-        self.metadata_table.insertRow(row)
-        
-        # Определяем, является ли это промптом
-        is_prompt = key == "" and any(self.metadata_table.item(row-2, 0).text().strip() == f"  {x}" 
-                                    for x in ["Prompt", "Negative prompt"] 
-                                    if row > 1 and self.metadata_table.item(row-2, 0))
-        
-        if is_prompt:
-            # Для промптов используем предыдущий заголовок как ключ
-            key = self.metadata_table.item(row-2, 0).text().strip()
-        
-        key_item = QTableWidgetItem(str(key))
-        value_item = QTableWidgetItem(str(value))
-        
-        # Make items read-only
-        key_item.setFlags(key_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-        value_item.setFlags(value_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-        
-        # Устанавливаем подсказку для значений
-        key_item.setToolTip(str(key))
-        value_item.setToolTip(str(value))
-        
-        # Устанавливаем стили для ячеек
-        if row % 2 == 0:
-            key_item.setBackground(QColor(35, 35, 35))
-            value_item.setBackground(QColor(35, 35, 35))
-        
-        self.metadata_table.setItem(row, 0, key_item)
-        self.metadata_table.setItem(row, 1, value_item)
+        """Настраивает высоту видимых строк в таблице."""
+        self.metadata_table.invalidate_row_heights()
     
     def show_context_menu(self, position):
         """Показывает контекстное меню для таблицы метаданных."""
         menu = QMenu()
-        menu.setStyleSheet("""
-            QMenu {
-                background-color: #2d2d2d;
-                color: #e0e0e0;
-                border: 1px solid #555555;
-            }
-            QMenu::item {
-                padding: 5px 20px 5px 20px;
-            }
-            QMenu::item:selected {
-                background-color: #0078d4;
-            }
-        """)
         
         indexes = self.metadata_table.selectedIndexes()
         
@@ -1088,49 +2928,91 @@ class ImageMetadataViewer(QMainWindow):
             copy_action.setEnabled(False)
             copy_row_action.setEnabled(False)
         
+        expand_action = inspect_action = view_action = None
+        model = self.metadata_table.metadata_model
+        if indexes and model.is_expandable(indexes[0].row()):
+            node = model.nodes[model.source_row(indexes[0].row())]
+            menu.addSeparator()
+            expand_action = menu.addAction("Collapse" if node["expanded"] else "Expand")
+        elif indexes and model.is_inspectable(indexes[0].row()):
+            menu.addSeparator()
+            inspect_action = menu.addAction("Inspect...")
+        elif indexes and model.is_truncated(indexes[0].row()):
+            menu.addSeparator()
+            view_action = menu.addAction("View Full Value...")
+        
         # Выполняем действие в зависимости от выбора
         action = menu.exec(self.metadata_table.mapToGlobal(position))
         
-        if action == copy_action and indexes:
+        if action is not None and action == expand_action:
+            self.metadata_table.toggle_row(indexes[0].row())
+        
+        elif action is not None and action == inspect_action:
+            row = indexes[0].row()
+            self.inspect_binary(model.cell_text(row, 0), model.node_descriptor(row))
+        
+        elif action is not None and action == view_action:
+            row = indexes[0].row()
+            self.show_full_value(model.cell_text(row, 0), model.cell_text(row, 1))
+        
+        elif action == copy_action and indexes:
             # Копируем значение выбранной ячейки
             index = indexes[0]  # Берем первую выбранную ячейку
-            value = self.metadata_table.item(index.row(), index.column()).text()
-            pyperclip.copy(value)
+            value = self.metadata_table.metadata_model.cell_text(index.row(), index.column())
+            copy_to_clipboard(value)
             self.status_message.showMessage(f"Value copied to clipboard")
         
         elif action == copy_row_action and indexes:
             # Копируем все значения строки
             row = indexes[0].row()
+            model = self.metadata_table.metadata_model
             # Проверяем, является ли строка заголовком категории
-            if self.metadata_table.columnSpan(row, 0) == 2:
+            if model.is_header(row):
                 # Это заголовок категории
-                value = self.metadata_table.item(row, 0).text()
-                pyperclip.copy(value)
+                value = model.cell_text(row, 0)
+                copy_to_clipboard(value)
                 self.status_message.showMessage(f"Category name copied to clipboard")
             else:
                 # Обычная строка
-                key = self.metadata_table.item(row, 0).text()
-                value = self.metadata_table.item(row, 1).text()
-                pyperclip.copy(f"{key}: {value}")
+                key = model.cell_text(row, 0)
+                value = model.cell_text(row, 1)
+                copy_to_clipboard(f"{key}: {value}")
                 self.status_message.showMessage(f"Row copied to clipboard")
     
+    def inspect_binary(self, title, descriptor):
+        """Открывает двоичное значение текущего файла в просмотрщике."""
+        if not self.current_image_path:
+            return
+        try:
+            buffer = open_binary_value(self.current_image_path, descriptor)
+        except (OSError, ValueError) as e:
+            self.status_message.showMessage(f"Could not read {title}: {e}")
+            return
+        with buffer:
+            dialog = BinaryInspectorDialog(buffer, title, self)
+            dialog.exec()
+            dialog.deleteLater()
+    
+    def show_full_value(self, title, text):
+        """Показывает полный текст значения, которое в таблице обрезано."""
+        dialog = ValueDialog(title.strip() or "Value", text, self)
+        dialog.exec()
+        dialog.deleteLater()
+    
     def show_full_image(self):
         """Показывает полное изображение в отдельном окне."""
         if self.current_image_path and self.original_pixmap:
+            # В окне просмотра хранится уменьшенное превью, полный размер
+            # декодируем только по запросу
+            full_pixmap = QPixmap(self.current_image_path)
+            if full_pixmap.isNull():
+                full_pixmap = self.original_pixmap
             dialog = FullImageDialog(
-                self.original_pixmap, 
+                full_pixmap, 
                 os.path.basename(self.current_image_path),
                 self.current_image_path,
                 self
             )
-            dialog.setStyleSheet("""
-                QDialog {
-                    background-color: #2d2d2d;
-                }
-                QLabel {
-                    color: #e0e0e0;
-                }
-            """)
             dialog.exec()
     
     def open_containing_folder(self):
@@ -1142,44 +3024,21 @@ class ImageMetadataViewer(QMainWindow):
         else:
             self.status_message.showMessage("No valid file path available")
     
-    def filter_metadata(self, text):
+    def schedule_filter(self):
+        """Откладывает фильтрацию до паузы в наборе текста."""
+        self.filter_timer.start(150)
+    
+    def filter_metadata(self):
         """Фильтрует метаданные по введенному тексту."""
-        text = text.lower()
-        
-        # Если текст пустой, показываем все строки
-        if not text:
-            for row in range(self.metadata_table.rowCount()):
-                self.metadata_table.setRowHidden(row, False)
-            return
-            
-        # Словарь для отслеживания видимости категорий
-        category_has_visible = {}
-        current_category = None
-        
-        # Сначала скрываем все строки и находим строки, соответствующие фильтру
-        for row in range(self.metadata_table.rowCount()):
-            # Проверяем, является ли строка заголовком категории
-            if self.metadata_table.columnSpan(row, 0) == 2:
-                # Это заголовок категории
-                current_category = row
-                category_name = self.metadata_table.item(row, 0).text().lower()
-                category_has_visible[current_category] = text in category_name
-                self.metadata_table.setRowHidden(row, not category_has_visible[current_category])
-            else:
-                # Обычная строка с метаданными
-                key = self.metadata_table.item(row, 0).text().lower()
-                value = self.metadata_table.item(row, 1).text().lower() if self.metadata_table.item(row, 1) else ""
-                
-                row_visible = text in key or text in value
-                self.metadata_table.setRowHidden(row, not row_visible)
-                
-                # Если строка видима, также делаем видимой её категорию
-                if row_visible and current_category is not None:
-                    category_has_visible[current_category] = True
-        
-        # Показываем заголовки категорий, в которых есть видимые элементы
-        for cat_row, has_visible in category_has_visible.items():
-            self.metadata_table.setRowHidden(cat_row, not has_visible)
+        self.filter_timer.stop()
+        try:
+            self.metadata_table.metadata_model.filter_rows(
+                self.search_input.text(),
+                case_sensitive=self.case_sensitive_button.isChecked(),
+                regex=self.regex_button.isChecked()
+            )
+        except re.error as e:
+            self.status_message.showMessage(f"Invalid regular expression: {e}")
     
     def copy_selected(self):
         """Копирует выбранные метаданные в буфер обмена."""
@@ -1188,40 +3047,41 @@ class ImageMetadataViewer(QMainWindow):
             self.status_message.showMessage("No metadata selected to copy")
             return
         
+        model = self.metadata_table.metadata_model
         text = ""
         for row in sorted(selected_rows):
             # Skip category headers
-            if self.metadata_table.columnSpan(row, 0) == 2:
-                text += f"\n=== {self.metadata_table.item(row, 0).text()} ===\n"
+            if model.is_header(row):
+                text += f"\n=== {model.cell_text(row, 0)} ===\n"
             else:
-                key = self.metadata_table.item(row, 0).text()
-                value = self.metadata_table.item(row, 1).text()
+                key = model.cell_text(row, 0)
+                value = model.cell_text(row, 1)
                 text += f"{key}: {value}\n"
         
-        pyperclip.copy(text.strip())
+        copy_to_clipboard(text.strip())
         self.status_message.showMessage(f"Copied {len(selected_rows)} metadata entries to clipboard")
     
     def copy_all(self):
         """Копирует все метаданные в буфер обмена."""
-        if self.metadata_table.rowCount() == 0:
+        # Копируем все строки, включая скрытые фильтром
+        rows = self.metadata_table.metadata_model.rows
+        if not rows:
             self.status_message.showMessage("No metadata available to copy")
             return
         
         text = ""
         current_category = ""
         
-        for row in range(self.metadata_table.rowCount()):
+        for kind, key, value in rows:
             # Check if it's a category header
-            if self.metadata_table.columnSpan(row, 0) == 2:
+            if kind != ROW_ITEM:
                 # Add category header
-                current_category = self.metadata_table.item(row, 0).text()
+                current_category = key
                 text += f"\n=== {current_category} ===\n"
             else:
-                key = self.metadata_table.item(row, 0).text()
-                value = self.metadata_table.item(row, 1).text()
                 text += f"{key}: {value}\n"
         
-        pyperclip.copy(text.strip())
+        copy_to_clipboard(text.strip())
         self.status_message.showMessage("Copied all metadata to clipboard")
     
     def export_metadata(self):
@@ -1245,33 +3105,7 @@ class ImageMetadataViewer(QMainWindow):
                 file_path = file_paths[0]
                 
                 try:
-                    ext = os.path.splitext(file_path)[1].lower()
-                    
-                    if ext == '.txt' or not ext:
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.write(f"Metadata for: {os.path.basename(self.current_image_path)}\n")
-                            f.write(f"Exported on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                            
-                            for category, items in self.metadata_dict.items():
-                                f.write(f"\n=== {category} ===\n")
-                                for key, value in items.items():
-                                    f.write(f"{key}: {value}\n")
-                                    
-                    elif ext == '.csv':
-                        import csv
-                        with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                            writer = csv.writer(f)
-                            writer.writerow(["Category", "Property", "Value"])
-                            
-                            for category, items in self.metadata_dict.items():
-                                for key, value in items.items():
-                                    writer.writerow([category, key, value])
-                                    
-                    elif ext == '.json':
-                        import json
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            json.dump(self.metadata_dict, f, indent=4, ensure_ascii=False)
-                            
+                    write_metadata_export(file_path, self.current_image_path, self.metadata_dict)
                     self.status_message.showMessage(f"Metadata exported to {os.path.basename(file_path)}")
                     
                 except Exception as e:
@@ -1281,62 +3115,148 @@ class ImageMetadataViewer(QMainWindow):
         """Обрабатывает изменение размера окна."""
         super().resizeEvent(event)
         
-        # Update image preview if we have an image loaded
-        if self.current_image_path and hasattr(self, 'original_pixmap') and self.original_pixmap:
-            max_width = self.image_viewer.width() - 20
-            max_height = self.image_viewer.height() - 20
-            
-            scaled_pixmap = self.original_pixmap.scaled(
-                max_width, max_height,
-                Qt.AspectRatioMode.KeepAspectRatio, 
-                Qt.TransformationMode.SmoothTransformation
-            )
-            
-            self.image_viewer.set_image(scaled_pixmap)
-            
+        # Превью масштабирует сам ImageViewer в своем resizeEvent
+        
         # Планируем обновление высоты строк в таблице
         self.resize_timer.start(100)
     
+    def vacuum_metadata_cache(self):
+        """Вытесняет старые записи из кэша метаданных и миниатюр и сжимает файл базы."""
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            thumbnail_dir = default_thumbnail_dir()
+            removed_thumbnails = evict_thumbnails(thumbnail_dir)
+            thumbnails = thumbnail_stats(thumbnail_dir)
+            if self.metadata_cache is not None:
+                removed = self.metadata_cache.vacuum()
+                stats = self.metadata_cache.stats()
+        except sqlite3.Error as e:
+            self.status_message.showMessage(f"Could not compact cache: {e}", 5000)
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        
+        message = (f"Thumbnails: {thumbnails['files']} files, "
+                   f"{thumbnails['bytes'] / 1024 / 1024:.1f} MB ({removed_thumbnails} evicted)")
+        if self.metadata_cache is None:
+            message = f"Metadata cache is not available. {message}"
+        else:
+            message = (f"Metadata cache: {stats['entries']} entries, "
+                       f"{stats['bytes'] / 1024 / 1024:.1f} MB ({removed} evicted). {message}")
+        self.status_message.showMessage(message, 5000)
+    
     def closeEvent(self, event):
         """Обрабатывает закрытие окна."""
         # Сохраняем размер и положение окна
         self.settings.setValue("geometry", self.saveGeometry())
+        self.settings.setValue("galleryVisible", not self.gallery_dock.isHidden())
+        self.settings.setValue("libraryVisible", not self.library_dock.isHidden())
+        self.cancel_pending_loads()
+        for worker in self.prefetch_loads.values():
+            worker.cancel()
+            take_runnable(self.prefetch_pool, worker)
+        self.gallery_model.cancel_pending()
+        if self.library_panel is not None:
+            self.library_panel.cancel_indexing()
+        if self.compare_worker is not None:
+            self.compare_worker.cancel()
+            take_runnable(self.compare_pool, self.compare_worker)
+            self.compare_worker = None
+        if self.duplicates_worker is not None:
+            self.duplicates_worker.cancel()
+            take_runnable(self.compare_pool, self.duplicates_worker)
+            self.duplicates_worker = None
         event.accept()
 
+def write_metadata_export(file_path, image_path, metadata_dict):
+    """Записывает метаданные в TXT, CSV или JSON в зависимости от расширения file_path."""
+    ext = os.path.splitext(file_path)[1].lower()
+    
+    if ext == '.txt' or not ext:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(f"Metadata for: {os.path.basename(image_path)}\n")
+            f.write(f"Exported on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            
+            for category, items in metadata_dict.items():
+                f.write(f"\n=== {category} ===\n")
+                for key, value in items.items():
+                    f.write(f"{key}: {value}\n")
+                    
+    elif ext == '.csv':
+        import csv
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Category", "Property", "Value"])
+            
+            for category, items in metadata_dict.items():
+                for key, value in items.items():
+                    writer.writerow([category, key, value])
+                    
+    elif ext == '.json':
+        import json
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata_dict, f, indent=4, ensure_ascii=False)
+
+def draw_example_image(size=(800, 600), text="Image Metadata Viewer\nTest Image",
+                       background=(73, 109, 137)):
+    """Рисует тестовое изображение: фон, рамка по центру и подпись."""
+    from PIL import Image, ImageDraw
+    width, height = size
+    img = Image.new('RGB', size, color=background)
+    d = ImageDraw.Draw(img)
+    d.rectangle([width // 4, height // 6, width * 3 // 4, height * 5 // 6],
+                fill=(128, 128, 128), outline=(255, 255, 255))
+    d.text((width * 3 // 8, height * 5 // 12), text, fill=(255, 255, 0))
+    return img
+
 def create_example_image():
-    """Создает пример изображения для тестирования, если файл не существует"""
+    """Создает пример изображения для тестирования, если файл не существует.
+    
+    Возвращает путь к файлу или None, если создать его не удалось.
+    """
     example_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example.jpg")
     if not os.path.exists(example_file):
         try:
-            from PIL import Image, ImageDraw
-            img = Image.new('RGB', (800, 600), color=(73, 109, 137))
-            d = ImageDraw.Draw(img)
-            d.rectangle([200, 100, 600, 500], fill=(128, 128, 128), outline=(255, 255, 255))
-            d.text((300, 250), "Image Metadata Viewer\nTest Image", fill=(255, 255, 0))
+            img = draw_example_image()
             img.save(example_file)
             print(f"Created example image: {example_file}")
         except Exception as e:
             print(f"Could not create example image: {e}")
+            return None
+    return example_file
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    app.setStyle("Fusion")  # Use Fusion style for better dark theme support
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="View image metadata and generation parameters")
+    parser.add_argument("file", nargs="?", help="Image to open")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage timings for each opened file and a summary on exit")
+    # Остальные аргументы (например, -platform) передаются Qt
+    args, qt_args = parser.parse_known_args()
+    profiler = Profiler() if args.profile else None
     
-    # Создаем тестовое изображение, если нужно
-    create_example_image()
+    # Стиль Fusion и общая таблица стилей задаются в set_dark_theme
+    app = QApplication(sys.argv[:1] + qt_args)
     
-    window = ImageMetadataViewer()
+    window = ImageMetadataViewer(profiler)
     window.show()
+    if profiler is not None:
+        profiler.mark("window shown")
+    
+    if args.file is None:
+        # Пример открывается (и при необходимости создается) уже после
+        # первой отрисовки окна
+        def open_example():
+            example_file = create_example_image()
+            if example_file is not None:
+                window.process_image(example_file)
+        QTimer.singleShot(0, open_example)
+    elif os.path.isfile(args.file):
+        # Файл из аргументов начинает загружаться сразу, пока окно отрисовывается
+        window.process_image(args.file)
     
-    # Автоматически загружаем пример, если он существует и нет аргументов
-    if len(sys.argv) == 1:
-        example_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example.jpg")
-        if os.path.exists(example_file):
-            QTimer.singleShot(100, lambda: window.process_image(example_file))
-    elif len(sys.argv) > 1:
-        # Если указан файл в аргументах - загружаем его
-        file_path = sys.argv[1]
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            QTimer.singleShot(100, lambda: window.process_image(file_path))
-    
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
+    sys.exit(exit_code)
@@ -0,0 +1,252 @@
+"""Пакетное извлечение метаданных без графического интерфейса.
+
+Обходит папки, разбирает метаданные в пуле процессов тем же кодом,
+что и окно просмотра, и пишет по одной JSON-записи на файл (JSON Lines).
+
+Примеры:
+    python imadata_batch.py /data/outputs > metadata.jsonl
+    python imadata_batch.py /data/outputs -o metadata.jsonl --workers 8 --chunk-size 64
+    python imadata_batch.py /data/outputs -o metadata.jsonl --resume
+    python imadata_batch.py /data/outputs -o metadata.jsonl --no-cache
+    python imadata_batch.py /data/outputs -o metadata.jsonl --index
+
+Разобранные метаданные сохраняются в общий с окном просмотра кэш
+(imadata_cache), поэтому повторный проход по папке почти не читает файлы.
+С --index параметры генерации попадают еще и в поисковый индекс (imadata_search).
+"""
+
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import closing
+
+from imadata_cache import MetadataCache, default_cache_path
+from imadata_core import IMAGE_EXTENSIONS, extract_metadata
+
+# Как часто печатать прогресс, секунд
+PROGRESS_INTERVAL = 2.0
+
+# Сколько пачек на процесс держать в очереди пула: при прерывании
+# дожидаться приходится только их, а не всего списка файлов
+PENDING_CHUNKS_PER_WORKER = 2
+
+# Размер блока при поиске конца последней строки файла результатов
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Кэш метаданных рабочего процесса (у каждого процесса свое соединение)
+_worker_cache = None
+
+
+def iter_image_files(roots):
+    """Перечисляет файлы изображений в папках (рекурсивно) в стабильном порядке."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield os.path.abspath(root)
+            continue
+        for directory, subdirs, names in os.walk(root):
+            subdirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.abspath(os.path.join(directory, name))
+
+
+def init_worker(cache_path):
+    """Открывает кэш метаданных в рабочем процессе."""
+    global _worker_cache
+    if cache_path:
+        _worker_cache = MetadataCache(cache_path)
+
+
+def extract_record(file_path, header_only=True):
+    """Извлекает метаданные одного файла в виде JSON-совместимой записи."""
+    metadata = extract_metadata(file_path, header_only=header_only, cache=_worker_cache)
+    return {
+        "path": file_path,
+        "parameters": metadata["parameters"],
+        "categories": metadata["categories"],
+        "error": metadata["error"],
+    }
+
+
+def extract_chunk(paths, header_only=True):
+    """Записи для пачки файлов (одна задача пула)."""
+    return [extract_record(file_path, header_only) for file_path in paths]
+
+
+def iter_records(executor, paths, chunk_size, window, header_only=True):
+    """Записи файлов в исходном порядке; в пуле одновременно не больше window пачек.
+
+    Если перебор прерван (KeyboardInterrupt), еще не начатые пачки снимаются
+    с очереди, и завершение пула ждет только выполняющиеся.
+    """
+    pending = deque()
+    try:
+        for start in range(0, len(paths), chunk_size):
+            pending.append(executor.submit(extract_chunk, paths[start:start + chunk_size], header_only))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def find_last_newline(f):
+    """Смещение сразу после последнего перевода строки (0, если его нет).
+
+    Файл читается блоками с конца, а не целиком.
+    """
+    position = f.seek(0, os.SEEK_END)
+    while position > 0:
+        start = max(0, position - TAIL_BLOCK_SIZE)
+        f.seek(start)
+        block = f.read(position - start)
+        index = block.rfind(b"\n")
+        if index >= 0:
+            return start + index + 1
+        position = start
+    return 0
+
+
+def load_processed_paths(output_path):
+    """Читает уже записанные пути из файла результатов для продолжения работы.
+
+    Недописанная последняя строка (если процесс был прерван) отрезается,
+    чтобы новые записи начинались с новой строки.
+    """
+    processed = set()
+    if not os.path.exists(output_path):
+        return processed
+
+    with open(output_path, "rb+") as f:
+        end = find_last_newline(f)
+        if end != f.seek(0, os.SEEK_END):
+            f.truncate(end)
+        f.seek(0)
+        for line in f:
+            try:
+                processed.add(json.loads(line)["path"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    return processed
+
+
+def format_rate(count, elapsed):
+    return f"{count / elapsed:.1f} files/s" if elapsed > 0 else "-"
+
+
+def run(args):
+    # Рабочие процессы (при запуске через spawn) импортируют этот модуль
+    # заново, поэтому то, что нужно только главному процессу, грузится здесь
+    from concurrent.futures import ProcessPoolExecutor
+
+    from imadata_search import WRITE_BATCH_SIZE, SearchIndex
+
+    if args.resume and not args.output:
+        print("--resume requires --output", file=sys.stderr)
+        return 2
+
+    processed = load_processed_paths(args.output) if args.resume else set()
+    paths = [path for path in iter_image_files(args.paths) if path not in processed]
+    if processed:
+        print(f"Resuming: {len(processed)} files already processed", file=sys.stderr)
+    print(f"Files to process: {len(paths)}", file=sys.stderr)
+
+    if args.output:
+        out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    else:
+        out = sys.stdout
+
+    cache_path = None if args.no_cache else (args.cache or default_cache_path())
+    if cache_path:
+        # Создаем базу заранее, чтобы процессы не создавали схему одновременно
+        MetadataCache(cache_path).close()
+
+    # В индекс пишет только главный процесс, пачками по одной транзакции
+    index = SearchIndex() if args.index else None
+    index_batch = []
+
+    start = last_report = time.perf_counter()
+    count = errors = 0
+    try:
+        workers = args.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(cache_path,)) as executor:
+            # closing(): при прерывании недоделанные пачки снимаются с очереди
+            # до того, как выход из with начнет ждать завершения пула
+            with closing(iter_records(executor, paths, args.chunk_size,
+                                      workers * PENDING_CHUNKS_PER_WORKER,
+                                      header_only=not args.pillow)) as records:
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False, default=str))
+                    out.write("\n")
+                    count += 1
+                    if record["error"]:
+                        errors += 1
+                    elif index is not None:
+                        try:
+                            file_info = os.stat(record["path"])
+                        except OSError:
+                            pass
+                        else:
+                            index_batch.append((record["path"], file_info.st_size,
+                                                file_info.st_mtime_ns, record["parameters"]))
+                            if len(index_batch) >= WRITE_BATCH_SIZE:
+                                index.add_many(index_batch)
+                                index_batch = []
+
+                    now = time.perf_counter()
+                    if now - last_report >= PROGRESS_INTERVAL:
+                        last_report = now
+                        out.flush()
+                        print(f"Processed {count}/{len(paths)} ({format_rate(count, now - start)})",
+                              file=sys.stderr)
+    except KeyboardInterrupt:
+        out.flush()
+        print(f"Interrupted after {count} files; rerun with --resume to continue", file=sys.stderr)
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if index is not None:
+            index.add_many(index_batch)
+            index.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {count} files, {errors} errors in {elapsed:.1f} s ({format_rate(count, elapsed)})",
+          file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract image metadata to JSON Lines without the GUI")
+    parser.add_argument("paths", nargs="+", help="Folders (scanned recursively) or image files")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=32,
+                        help="Files handed to a worker at once (default: 32)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip files already present in --output and append to it")
+    parser.add_argument("--pillow", action="store_true",
+                        help="Always open files with Pillow instead of the header-only reader")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="Metadata cache file (default: shared with the viewer)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or update the metadata cache")
+    parser.add_argument("--index", action="store_true",
+                        help="Add generation parameters to the full-text search index")
+    return parser
+
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
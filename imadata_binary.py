@@ -0,0 +1,285 @@
+"""Просмотр двоичных значений метаданных без копирования буфера.
+
+Значение открывается как BinaryBuffer — memoryview над уже прочитанными
+байтами или над диапазоном файла, отображенным в память (mmap). Шестнадцатеричный
+дамп строится постранично (hex_line для каждой видимой строки), тип
+содержимого определяется по первым байтам (ICC, XMP, JPEG, PNG, EXIF,
+JSON, текст), а сохранение идет кусками прямо из memoryview.
+"""
+
+import codecs
+import io
+import json
+import mmap
+import struct
+
+from imadata_headers import HeaderFormatError, read_header_metadata_from_file
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Ширина строки шестнадцатеричного дампа в байтах
+HEX_LINE_WIDTH = 16
+
+# Размер куска при сохранении значения в файл
+SAVE_CHUNK_SIZE = 1024 * 1024
+
+# Сколько первых байтов просматривается при определении типа
+SNIFF_BYTES = 4096
+
+# Предел для разбора JSON в описании структуры
+MAX_JSON_BYTES = 16 * 1024 * 1024
+
+# Расширения файлов для сохранения значения по типу содержимого
+PAYLOAD_EXTENSIONS = {"ICC profile": ".icc", "JPEG image": ".jpg", "PNG image": ".png",
+                      "EXIF data": ".exif", "XMP packet": ".xmp", "JSON": ".json",
+                      "XML": ".xml", "Text": ".txt"}
+
+# Классы профилей ICC
+ICC_CLASSES = {b"scnr": "Input device", b"mntr": "Display", b"prtr": "Output device",
+               b"link": "Device link", b"spac": "Color space", b"abst": "Abstract",
+               b"nmcl": "Named color"}
+
+
+class BinaryBuffer:
+    """Байты значения: memoryview над bytes или над отображенным диапазоном файла.
+
+    После использования буфер нужно закрыть (close или with), чтобы
+    освободить отображение файла.
+    """
+
+    def __init__(self, data, mapping=None, start=0, length=None):
+        self._base = memoryview(data)
+        self._mapping = mapping
+        end = len(self._base) if length is None else start + length
+        self.view = self._base[start:end]
+
+    def __len__(self):
+        return len(self.view)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.view.release()
+        self._base.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+
+def map_file_range(file_path, offset, length):
+    """Отображает в память length байтов файла, начиная с offset."""
+    if length <= 0:
+        return BinaryBuffer(b"")
+    with open(file_path, "rb") as fp:
+        size = fp.seek(0, io.SEEK_END)
+        if offset < 0 or offset + length > size:
+            raise HeaderFormatError("Value lies outside the file")
+        # Смещение отображения должно быть кратно гранулярности выделения памяти
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        mapping = mmap.mmap(fp.fileno(), offset + length - start, offset=start,
+                            access=mmap.ACCESS_READ)
+    return BinaryBuffer(mapping, mapping, offset - start, length)
+
+
+class ViewFile:
+    """Файлоподобный объект над memoryview: read копирует только запрошенный кусок."""
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size < 0 else min(len(self.view), self.position + size)
+        data = bytes(self.view[self.position:end])
+        self.position = max(self.position, end)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def detect_payload(view):
+    """Тип содержимого по первым байтам: "ICC profile", "JPEG image", "JSON" и т. п."""
+    head = bytes(view[:SNIFF_BYTES])
+    if len(view) >= 132 and head[36:40] == b"acsp":
+        return "ICC profile"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG image"
+    if head.startswith(PNG_SIGNATURE):
+        return "PNG image"
+    if head.startswith(b"Exif\x00\x00") or head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "EXIF data"
+
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if text.startswith(b"<?xpacket") or b"<x:xmpmeta" in head:
+        return "XMP packet"
+    if text[:1] in (b"{", b"["):
+        return "JSON"
+    if text.startswith(b"<"):
+        return "XML"
+    if head and _is_text(head):
+        return "Text"
+    return "Binary data"
+
+
+def _is_text(head):
+    try:
+        # Неполный последний символ (обрезанный границей просмотра) не ошибка
+        text = codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return all(char.isprintable() or char in "\t\r\n" for char in text)
+
+
+def describe_binary(data):
+    """Краткое описание значения для ячейки таблицы: тип и размер."""
+    with memoryview(data) as view:
+        return f"{detect_payload(view)}, {len(view):,} bytes"
+
+
+def is_text_payload(payload):
+    return payload in ("XMP packet", "JSON", "XML", "Text")
+
+
+def payload_structure(view, payload):
+    """Поля заголовка содержимого: список пар (поле, значение)."""
+    try:
+        if payload == "ICC profile":
+            return _icc_structure(view)
+        if payload in ("JPEG image", "PNG image"):
+            return _image_structure(view)
+        if payload == "EXIF data":
+            return _exif_structure(view)
+        if payload == "JSON":
+            return _json_structure(view)
+        if is_text_payload(payload):
+            return [("Encoding", "UTF-8"), ("Lines", f"{count_lines(view):,}")]
+    except (HeaderFormatError, struct.error, IndexError, ValueError) as e:
+        return [("Error", str(e))]
+    return []
+
+
+def _icc_structure(view):
+    header = bytes(view[:132])
+    size, cmm, version = struct.unpack(">L4sL", header[:12])
+    year, month, day, hour, minute, second = struct.unpack(">6H", header[24:36])
+    fields = [
+        ("Profile size", f"{size:,} bytes"),
+        ("Preferred CMM", _signature(cmm)),
+        ("Version", f"{version >> 24}.{(version >> 20) & 0xF}.{(version >> 16) & 0xF}"),
+        ("Device class", ICC_CLASSES.get(header[12:16], _signature(header[12:16]))),
+        ("Color space", _signature(header[16:20])),
+        ("Connection space", _signature(header[20:24])),
+        ("Created", f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"),
+        ("Platform", _signature(header[40:44])),
+        ("Creator", _signature(header[80:84])),
+    ]
+    tag_count, = struct.unpack(">L", header[128:132])
+    fields.append(("Tags", str(tag_count)))
+    description = _icc_description(view, min(tag_count, 1024))
+    if description:
+        fields.insert(0, ("Description", description))
+    return fields
+
+
+def _icc_description(view, tag_count):
+    """Текст тега desc (тип desc в ICC v2 или mluc в v4)."""
+    table = bytes(view[132:132 + tag_count * 12])
+    for i in range(0, len(table) - 11, 12):
+        signature, offset, size = struct.unpack(">4sLL", table[i:i + 12])
+        if signature != b"desc":
+            continue
+        data = bytes(view[offset:offset + min(size, 4096)])
+        if data[:4] == b"desc" and len(data) >= 12:
+            length, = struct.unpack(">L", data[8:12])
+            return data[12:12 + length].split(b"\x00", 1)[0].decode("latin-1")
+        if data[:4] == b"mluc" and len(data) >= 28:
+            length, record_offset = struct.unpack(">LL", data[20:28])
+            return data[record_offset:record_offset + length].decode("utf-16-be", "replace")
+    return ""
+
+
+def _signature(value):
+    text = value.decode("latin-1").strip("\x00 ")
+    return text or "-"
+
+
+def _image_structure(view):
+    header = read_header_metadata_from_file(ViewFile(view))
+    if header is None:
+        return []
+    width, height = header["size"]
+    fields = [("Format", header["format"]), ("Dimensions", f"{width} × {height} pixels")]
+    if header["mode"]:
+        fields.append(("Mode", header["mode"]))
+    return fields
+
+
+def _exif_structure(view):
+    # imadata_exif сам использует этот модуль, поэтому импорт здесь
+    from imadata_exif import read_exif
+
+    tree = read_exif(view.tobytes())
+    if tree is None:
+        return []
+    fields = [("Byte order", "Little-endian (II)" if tree["byte_order"] == "<" else "Big-endian (MM)")]
+    for name in ("IFD0", "Exif", "GPS", "Interop", "IFD1"):
+        if name in tree:
+            fields.append((name, f"{len(tree[name])} tags"))
+    fields.extend(("Error", error) for error in tree["errors"])
+    return fields
+
+
+def _json_structure(view):
+    if len(view) > MAX_JSON_BYTES:
+        return [("Top-level value", "Too large to parse")]
+    value = json.loads(view.tobytes())
+    if isinstance(value, dict):
+        keys = list(value)
+        fields = [("Top-level value", f"object with {len(keys):,} keys")]
+        fields.extend((str(key), type(value[key]).__name__) for key in keys[:32])
+        if len(keys) > 32:
+            fields.append(("…", f"{len(keys) - 32:,} more keys"))
+        return fields
+    if isinstance(value, list):
+        return [("Top-level value", f"array with {len(value):,} items")]
+    return [("Top-level value", type(value).__name__)]
+
+
+def count_lines(view, chunk_size=SAVE_CHUNK_SIZE):
+    """Число строк текста; байты копируются кусками, а не целиком."""
+    newlines = sum(bytes(view[start:start + chunk_size]).count(b"\n")
+                   for start in range(0, len(view), chunk_size))
+    return newlines + 1
+
+
+def hex_line(view, offset, width=HEX_LINE_WIDTH):
+    """Строка дампа: смещение, байты в шестнадцатеричном виде и ASCII."""
+    chunk = bytes(view[offset:offset + width])
+    hex_part = chunk.hex(" ")
+    text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+    return f"{offset:08X}  {hex_part:<{width * 3 - 1}}  {text}"
+
+
+def text_preview(view, limit):
+    """Начало текстового содержимого (не больше limit байтов) и признак обрезки."""
+    return bytes(view[:limit]).decode("utf-8", "replace"), len(view) > limit
+
+
+def save_binary(view, path, chunk_size=SAVE_CHUNK_SIZE):
+    """Записывает значение в файл кусками, не собирая его копию в памяти."""
+    with open(path, "wb") as f:
+        for start in range(0, len(view), chunk_size):
+            f.write(view[start:start + chunk_size])
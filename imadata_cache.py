@@ -0,0 +1,376 @@
+"""Постоянный кэш разобранных метаданных в SQLite.
+
+Записи привязаны к (путь, размер, mtime_ns) и к способу разбора
+(только заголовки или Pillow — результаты могут различаться; записи
+для разных способов хранятся рядом, первичный ключ — путь и способ):
+если файл не менялся и разбирается тем же способом, повторное открытие —
+это один поиск по первичному ключу вместо открытия файла и разбора
+параметров и EXIF. Размер кэша ограничен,
+при переполнении удаляются давно не использованные записи (LRU).
+
+В отдельной таблице той же базы с той же привязкой хранятся
+перцептивные хэши изображений для поиска дубликатов (imadata_dupes).
+
+Миниатюры галереи лежат рядом, в папке thumbnails, по файлу на версию
+изображения. Ее объем тоже ограничен: сверх лимита удаляются миниатюры,
+которые дольше всего не открывались (время использования хранится
+во времени изменения файла).
+
+Обслуживание из командной строки:
+    python imadata_cache.py stats
+    python imadata_cache.py vacuum
+    python imadata_cache.py clear
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+# Максимальное число записей по умолчанию
+DEFAULT_MAX_ENTRIES = 200000
+
+# Максимальный объем дискового кэша миниатюр по умолчанию
+DEFAULT_MAX_THUMBNAIL_BYTES = 256 * 1024 * 1024
+
+# Как часто (в записях) проверять, не пора ли вытеснять старые данные
+EVICTION_CHECK_INTERVAL = 256
+
+# Версия формата сохраненных данных. Увеличивается при любом изменении
+# результатов разбора, чтобы старые записи не показывались в новом виде.
+FORMAT_VERSION = 10
+
+# Время последнего использования записи обновляется не чаще, чем раз
+# в столько секунд: для вытеснения LRU точнее не нужно, а запись при
+# каждом попадании в кэш стоила бы отдельной транзакции
+LAST_USED_RESOLUTION = 3600
+
+
+def default_cache_path():
+    """Путь к файлу кэша рядом с настройками приложения (QSettings)."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Preferences")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, "MetadataViewer", "ImageMetadataViewer.cache.sqlite3")
+
+
+def default_thumbnail_dir(cache_path=None):
+    """Папка дискового кэша миниатюр галереи (рядом с кэшем метаданных)."""
+    return os.path.join(os.path.dirname(cache_path or default_cache_path()), "thumbnails")
+
+
+def thumbnail_path(cache_dir, path, size, mtime_ns):
+    """Путь к миниатюре конкретной версии файла в дисковом кэше."""
+    key = hashlib.sha1(f"{path}|{size}|{mtime_ns}".encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + ".png")
+
+
+def touch_thumbnail(cache_path):
+    """Отмечает использование миниатюры для вытеснения.
+
+    Возвращает False, если миниатюры нет в кэше. Время изменения
+    обновляется не чаще, чем раз в LAST_USED_RESOLUTION секунд.
+    """
+    try:
+        mtime = os.stat(cache_path).st_mtime
+    except OSError:
+        return False
+    if time.time() - mtime >= LAST_USED_RESOLUTION:
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+    return True
+
+
+def _thumbnail_files(cache_dir):
+    """Файлы кэша миниатюр: список (время использования, размер, путь)."""
+    files = []
+    try:
+        subdirs = [entry.path for entry in os.scandir(cache_dir) if entry.is_dir()]
+    except OSError:
+        return files
+    for subdir in subdirs:
+        try:
+            with os.scandir(subdir) as entries:
+                for entry in entries:
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((info.st_mtime, info.st_size, entry.path))
+        except OSError:
+            continue
+    return files
+
+
+def thumbnail_stats(cache_dir):
+    """Число миниатюр и их общий размер в байтах."""
+    files = _thumbnail_files(cache_dir)
+    return {"files": len(files), "bytes": sum(size for _, size, _ in files), "path": cache_dir}
+
+
+def evict_thumbnails(cache_dir, max_bytes=DEFAULT_MAX_THUMBNAIL_BYTES):
+    """Удаляет давно не использованные миниатюры сверх max_bytes.
+
+    Заодно удаляются временные файлы, оставшиеся от прерванной записи.
+    Возвращает число удаленных файлов.
+    """
+    files = _thumbnail_files(cache_dir)
+    total = sum(size for _, size, _ in files)
+    stale = time.time() - LAST_USED_RESOLUTION
+    files.sort()
+    removed = 0
+    for mtime, size, path in files:
+        if total <= max_bytes and not (path.endswith(".tmp") and mtime < stale):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Файл мог удалить параллельный вызов
+            pass
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear_thumbnails(cache_dir):
+    """Удаляет папку кэша миниатюр целиком."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+class MetadataCache:
+    """Кэш метаданных; безопасен для использования из нескольких потоков.
+
+    У каждого потока свое соединение с базой, запись идет в режиме WAL,
+    поэтому читатели не блокируют писателя.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        version, = connection.execute("PRAGMA user_version").fetchone()
+        if version != FORMAT_VERSION:
+            # Старые записи не подходят, а схема таблиц могла измениться
+            connection.execute("DROP TABLE IF EXISTS metadata")
+            connection.execute("DROP TABLE IF EXISTS image_hashes")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                data TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, mode)
+            );
+            CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used);
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                dhash TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS image_hashes_last_used ON image_hashes (last_used);
+        """)
+        if version != FORMAT_VERSION:
+            connection.execute(f"PRAGMA user_version = {FORMAT_VERSION}")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, path, size, mtime_ns, mode):
+        """Возвращает сохраненные данные или None, если файла нет, он изменился
+        или был разобран другим способом (mode)."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT data, last_used FROM metadata "
+            "WHERE path = ? AND size = ? AND mtime_ns = ? AND mode = ?",
+            (path, size, mtime_ns, mode)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        data, last_used = row
+        now = time.time()
+        if now - last_used >= LAST_USED_RESOLUTION:
+            connection.execute("UPDATE metadata SET last_used = ? WHERE path = ? AND mode = ?",
+                               (now, path, mode))
+        return json.loads(data)
+
+    def put(self, path, size, mtime_ns, mode, data):
+        """Сохраняет данные (JSON-совместимый словарь) для версии файла,
+        разобранной способом mode."""
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, mode, data, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, mode, json.dumps(data, ensure_ascii=False, default=str),
+             time.time())
+        )
+
+        with self._lock:
+            self._puts += 1
+            check = self._puts % EVICTION_CHECK_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def get_hashes(self, signatures):
+        """Сохраненные перцептивные хэши файлов.
+
+        signatures — {путь: (размер, mtime_ns)}. Возвращает
+        {путь: {"dhash": int, "phash": int}} только для файлов, которые
+        не менялись с момента расчета.
+        """
+        connection = self._connection()
+        paths = list(signatures)
+        found = {}
+        # Ограничение SQLite на число параметров запроса
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            rows = connection.execute(
+                "SELECT path, size, mtime_ns, dhash, phash FROM image_hashes "
+                f"WHERE path IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            for path, size, mtime_ns, dhash, phash in rows:
+                if signatures[path] == (size, mtime_ns):
+                    found[path] = {"dhash": int(dhash, 16), "phash": int(phash, 16)}
+        if found:
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany("UPDATE image_hashes SET last_used = ? WHERE path = ?",
+                                       ((now, path) for path in found))
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        return found
+
+    def put_hashes(self, rows):
+        """Сохраняет хэши одной транзакцией; rows — (путь, размер, mtime_ns, хэши)."""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO image_hashes (path, size, mtime_ns, dhash, phash, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((path, size, mtime_ns, f"{hashes['dhash']:016x}", f"{hashes['phash']:016x}", now)
+                 for path, size, mtime_ns, hashes in rows)
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def evict(self):
+        """Удаляет давно не использованные записи сверх max_entries."""
+        connection = self._connection()
+        removed = 0
+        for table in ("metadata", "image_hashes"):
+            count, = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                connection.execute(
+                    f"DELETE FROM {table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                removed += excess
+        return removed
+
+    def vacuum(self):
+        """Вытесняет лишние записи и сжимает файл базы."""
+        removed = self.evict()
+        connection = self._connection()
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM metadata")
+        connection.execute("DELETE FROM image_hashes")
+
+    def stats(self):
+        """Число записей и размер файла базы в байтах (вместе с WAL)."""
+        count, = self._connection().execute("SELECT COUNT(*) FROM metadata").fetchone()
+        size = 0
+        for suffix in ("", "-wal"):
+            if os.path.exists(self.path + suffix):
+                size += os.path.getsize(self.path + suffix)
+        return {"entries": count, "bytes": size, "path": self.path}
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def main(argv=None):
+    # Модуль импортируется окном и рабочими процессами; argparse нужен только здесь
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the image metadata cache")
+    parser.add_argument("command", choices=("stats", "vacuum", "clear"))
+    parser.add_argument("--path", help="Cache file (default: next to the application settings)")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Entry limit applied by vacuum")
+    parser.add_argument("--max-thumbnail-mb", type=float,
+                        default=DEFAULT_MAX_THUMBNAIL_BYTES / 1024 / 1024,
+                        help="Thumbnail cache size limit applied by vacuum, in MB")
+    args = parser.parse_args(argv)
+
+    cache = MetadataCache(args.path, args.max_entries)
+    thumbnail_dir = default_thumbnail_dir(cache.path)
+    if args.command == "vacuum":
+        removed = cache.vacuum()
+        removed_thumbnails = evict_thumbnails(thumbnail_dir, int(args.max_thumbnail_mb * 1024 * 1024))
+        print(f"Evicted {removed} entries and {removed_thumbnails} thumbnails")
+    elif args.command == "clear":
+        cache.clear()
+        cache.vacuum()
+        clear_thumbnails(thumbnail_dir)
+        print("Cache cleared")
+
+    stats = cache.stats()
+    print(f"{stats['path']}: {stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.2f} MB")
+    stats = thumbnail_stats(thumbnail_dir)
+    print(f"{stats['path']}: {stats['files']} thumbnails, {stats['bytes'] / 1024 / 1024:.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
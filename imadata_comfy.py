@@ -0,0 +1,240 @@
+"""Чанки ComfyUI "prompt" и "workflow" (JSON в текстовых чанках PNG).
+
+Граф в формате API ("prompt": {id: {"class_type", "inputs"}}) и граф
+редактора ("workflow": {"nodes", "links", ...}) могут занимать мегабайты,
+поэтому в таблицу они не выводятся одной строкой. При извлечении JSON
+разбирается один раз: из графа API выводится сводка (чекпойнт, сид,
+сэмплер, промпты), а для самих графов в категорию "ComfyUI" пишется
+краткое описание с дескриптором "json". Дочерние строки дерева строятся
+по этому дескриптору, только когда пользователь раскрывает узел
+(expand_json_node); путь в дескрипторе — ключи объектов и индексы массивов.
+"""
+
+import json
+from collections import deque
+
+from imadata_headers import HeaderFormatError
+
+# Ключи img.info с JSON ComfyUI и названия строк для них
+COMFY_KEYS = {"prompt": "Prompt graph", "workflow": "Workflow"}
+
+# Узлы-сэмплеры, от которых ищутся параметры генерации
+SAMPLER_TYPES = ("KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced")
+
+# Входы узлов, из которых берутся значения сводки (первый найденный вверх по графу)
+CHECKPOINT_INPUTS = ("ckpt_name", "unet_name", "model_name")
+SEED_INPUTS = ("seed", "noise_seed")
+TEXT_INPUTS = ("text", "text_g", "text_l", "prompt", "string", "value")
+
+# Поля сводки в порядке вывода
+SUMMARY_KEYS = ("Checkpoint", "Seed", "Sampler", "Prompt", "Negative prompt")
+
+# Сколько узлов графа просматривать при поиске одного значения
+MAX_SEARCH_NODES = 256
+
+# Массив простых значений короче этого показывается в ячейке целиком
+MAX_INLINE_JSON = 120
+
+
+def parse_comfy_chunks(info):
+    """Разобранные чанки ComfyUI из img.info: {ключ: объект JSON}.
+
+    Значения, которые не являются объектом JSON, пропускаются и остаются
+    обычными строками в "Other Metadata".
+    """
+    chunks = {}
+    for key in COMFY_KEYS:
+        value = info.get(key)
+        if not isinstance(value, str) or not value.lstrip().startswith("{"):
+            continue
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            chunks[key] = parsed
+    return chunks
+
+
+def add_comfy_category(chunks, categories, expandable):
+    """Пишет в категорию "ComfyUI" сводку и узлы графов для expand_json_node."""
+    category = categories["ComfyUI"]
+    nodes = expandable.setdefault("ComfyUI", {})
+    graph = chunks.get("prompt")
+    if graph is not None:
+        summary = prompt_summary(graph)
+        if summary:
+            category["Summary"] = "\n".join(f"{key}: {value}" for key, value in summary.items())
+    for key, value in chunks.items():
+        name = COMFY_KEYS[key]
+        category[name] = _graph_description(key, value)
+        nodes[name] = {"kind": "json", "key": key, "path": []}
+
+
+def _graph_description(key, value):
+    if key == "workflow" and isinstance(value.get("nodes"), list):
+        links = value.get("links")
+        text = _plural(len(value["nodes"]), "node")
+        if isinstance(links, list):
+            text += f", {_plural(len(links), 'link')}"
+        return text
+    if key == "prompt":
+        return _plural(sum(isinstance(node, dict) for node in value.values()), "node")
+    return describe_json(value)
+
+
+def prompt_summary(graph):
+    """Сводка графа API: {"Checkpoint", "Seed", "Sampler", "Prompt", "Negative prompt"}.
+
+    Параметры ищутся вверх по ссылкам от первого сэмплера (того, выше
+    которого нет других сэмплеров, то есть основного прохода, а не hires fix).
+    """
+    nodes = {node_id: node for node_id, node in graph.items()
+             if isinstance(node, dict) and isinstance(node.get("inputs"), dict)}
+    samplers = [node_id for node_id, node in nodes.items()
+                if node.get("class_type") in SAMPLER_TYPES]
+    if not samplers:
+        return {}
+    sampler = next((node_id for node_id in samplers
+                    if not any(upstream in samplers
+                               for upstream in list(_upstream(nodes, node_id))[1:])), samplers[0])
+
+    summary = {}
+    checkpoint = _find_input(nodes, sampler, CHECKPOINT_INPUTS, str)
+    if checkpoint:
+        summary["Checkpoint"] = checkpoint
+    seed = _find_input(nodes, sampler, SEED_INPUTS, int)
+    if seed is not None:
+        summary["Seed"] = str(seed)
+
+    sampler_name = _find_input(nodes, sampler, ("sampler_name",), str)
+    if sampler_name:
+        details = [sampler_name]
+        scheduler = _find_input(nodes, sampler, ("scheduler",), str)
+        steps = _find_input(nodes, sampler, ("steps",), int)
+        cfg = _find_input(nodes, sampler, ("cfg",), (int, float))
+        if scheduler:
+            details.append(scheduler)
+        if steps is not None:
+            details.append(f"{steps} steps")
+        if cfg is not None:
+            details.append(f"CFG {cfg:g}")
+        summary["Sampler"] = ", ".join(details)
+
+    # Guider без CFG (Flux) принимает один вход "conditioning"
+    for name, keys in (("Prompt", ("positive", "conditioning")), ("Negative prompt", ("negative",))):
+        link = _find_input(nodes, sampler, keys, list)
+        if link and _is_link(link):
+            text = _find_input(nodes, link[0], TEXT_INPUTS, str)
+            if text:
+                summary[name] = text.strip()
+    return summary
+
+
+def parse_summary(text):
+    """Разбирает строку "Summary" обратно в словарь полей сводки.
+
+    Промпт может быть многострочным: строка, которая не начинается
+    с поля сводки, продолжает значение предыдущего поля.
+    """
+    summary = {}
+    key = None
+    for line in text.split("\n"):
+        name, sep, value = line.partition(": ")
+        if sep and name in SUMMARY_KEYS and name not in summary:
+            key = name
+            summary[key] = value
+        elif key is not None:
+            summary[key] += "\n" + line
+    return summary
+
+
+def _is_link(value):
+    # Ссылка в графе API: ["id узла", номер выхода]
+    return (isinstance(value, list) and len(value) == 2
+            and isinstance(value[0], str) and isinstance(value[1], int))
+
+
+def _upstream(nodes, start):
+    """Узлы графа в порядке обхода в ширину вверх по ссылкам, начиная со start."""
+    queue = deque([start])
+    seen = {start}
+    while queue and len(seen) <= MAX_SEARCH_NODES:
+        node_id = queue.popleft()
+        yield node_id
+        for value in nodes[node_id]["inputs"].values():
+            if _is_link(value):
+                source = value[0]
+                if source in nodes and source not in seen:
+                    seen.add(source)
+                    queue.append(source)
+
+
+def _find_input(nodes, start, names, kind):
+    """Первое значение входа с одним из имен names нужного типа вверх по графу."""
+    if start not in nodes:
+        return None
+    for node_id in _upstream(nodes, start):
+        inputs = nodes[node_id]["inputs"]
+        for name in names:
+            value = inputs.get(name)
+            if kind is not list and _is_link(value):
+                continue
+            if isinstance(value, kind) and not (kind is int and isinstance(value, bool)):
+                return value
+    return None
+
+
+def expand_json_node(value, descriptor):
+    """Дочерние строки узла JSON по пути из дескриптора.
+
+    value — весь разобранный чанк. Возвращает список строк
+    (ключ, значение, дескриптор вложенного узла или None).
+    """
+    try:
+        for step in descriptor["path"]:
+            value = value[step]
+    except (LookupError, TypeError):
+        # Файл изменился после извлечения метаданных
+        raise HeaderFormatError("JSON node not found") from None
+    items = value.items() if isinstance(value, dict) else enumerate(value)
+    rows = []
+    for key, child in items:
+        label = str(key) if isinstance(value, dict) else f"[{key}]"
+        nested = isinstance(child, (dict, list)) and bool(child) and not _is_inline(child)
+        child_descriptor = dict(descriptor, path=descriptor["path"] + [key]) if nested else None
+        rows.append((label, describe_json(child), child_descriptor))
+    return rows
+
+
+def describe_json(value):
+    """Текст значения JSON для ячейки: сами простые значения, краткое описание составных."""
+    if isinstance(value, dict):
+        if isinstance(value.get("class_type"), str):
+            title = value.get("_meta", {}).get("title") if isinstance(value.get("_meta"), dict) else None
+            return value["class_type"] + (f" ({title})" if title and title != value["class_type"] else "")
+        if "id" in value and isinstance(value.get("type"), str):
+            # Узел графа редактора
+            title = value.get("title")
+            return f"#{value['id']} {value['type']}" + (f" ({title})" if title else "")
+        return f"Object, {_plural(len(value), 'key')}"
+    if isinstance(value, list):
+        if _is_link(value):
+            return f"Link to node {value[0]}, output {value[1]}"
+        if _is_inline(value):
+            return json.dumps(value, ensure_ascii=False)
+        return f"Array, {_plural(len(value), 'item')}"
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _is_inline(value):
+    """Короткий массив простых значений, который показывается целиком."""
+    return (isinstance(value, list) and len(value) <= 16
+            and not any(isinstance(item, (dict, list)) for item in value)
+            and len(json.dumps(value, ensure_ascii=False)) <= MAX_INLINE_JSON)
+
+
+def _plural(count, noun):
+    return f"{count:,} {noun}" + ("" if count == 1 else "s")
@@ -0,0 +1,283 @@
+"""Сравнение параметров генерации в группе файлов (серии по сиду, CFG и т. п.).
+
+Метаданные файлов извлекаются параллельно тем же кодом и через тот же
+кэш, что и в пакетном режиме (imadata_batch). Из каждого файла берутся
+только плоские поля "имя — строка": промпты, сид, модель и настройки из
+блока parameters, а для ComfyUI — поля сводки графа.
+
+Поля выравниваются по имени через словари: имени поля сопоставляется
+номер столбца, а для каждого столбца значения считаются в словаре
+{значение: число файлов}. Поэтому сравнение линейно по числу полей всех
+файлов и не сравнивает файлы попарно. Поле считается постоянным, если во
+всех файлах у него одно значение, иначе оно попадает в изменяющиеся
+вместе со списком различных значений. Для промптов соседних файлов
+дополнительно строится разница по токенам (difflib).
+
+Из командной строки:
+    python imadata_compare.py /data/outputs/seed_sweep
+    python imadata_compare.py a.png b.png c.png --json > report.json
+"""
+
+import difflib
+import json
+import os
+import re
+import sys
+import time
+
+from imadata_comfy import parse_summary
+from imadata_core import extract_metadata
+from imadata_params import format_parameter_value
+
+# Поля, для которых строится разница по токенам между соседними файлами
+PROMPT_FIELDS = ("Prompt", "Negative prompt")
+
+# Токен промпта: тег LoRA <...>, взвешенная группа (...) или слово;
+# запятые и пробелы служат только разделителями
+TOKEN_PATTERN = re.compile(r"<[^<>]*>|\([^()]*\)|[^\s,()<>]+")
+
+# Меньше стольких файлов разбирается в текущем процессе: запуск пула
+# процессов дольше, чем чтение заголовков (а при попадании в кэш — тем более)
+MIN_PARALLEL_FILES = 64
+
+# Потоков в пуле, когда процессы не используются (processes=False)
+DEFAULT_THREADS = min(8, os.cpu_count() or 1)
+
+# Свойства файла, которые добавляются к полям по запросу (image_fields=True):
+# для копий одного изображения важнее всего размер, формат и разрешение
+IMAGE_FIELDS = (("Image Properties", "Dimensions"), ("Image Properties", "Format"),
+                ("File Info", "File size"))
+
+# Значение поля в файле, где этого поля нет
+MISSING = None
+
+
+def metadata_fields(metadata, image_fields=False):
+    """Плоские поля параметров генерации: {имя: строка}."""
+    fields = {}
+    if image_fields:
+        for category, key in IMAGE_FIELDS:
+            value = metadata["categories"].get(category, {}).get(key)
+            if value is not None:
+                fields[key] = str(value)
+    parameters = metadata["parameters"]
+    for category, items in parameters.items():
+        if isinstance(items, list):
+            if items:
+                fields[category] = "\n".join(format_parameter_value(value) for value in items)
+        else:
+            for key, value in items.items():
+                fields[str(key)] = format_parameter_value(value)
+
+    summary = metadata["categories"].get("ComfyUI", {}).get("Summary")
+    if summary:
+        for key, value in parse_summary(summary).items():
+            fields.setdefault(key, value)
+    return fields
+
+
+def extract_fields(file_path, cache=None, image_fields=False):
+    """Поля одного файла: {"path", "fields", "error"}."""
+    metadata = extract_metadata(file_path, header_only=True, cache=cache)
+    return {"path": file_path, "fields": metadata_fields(metadata, image_fields),
+            "error": metadata["error"]}
+
+
+def _extract_in_worker(file_path, image_fields=False):
+    # Кэш рабочего процесса открывается в imadata_batch.init_worker
+    import imadata_batch
+    return extract_fields(file_path, imadata_batch._worker_cache, image_fields)
+
+
+def extract_records(paths, workers=None, cache_path=None, processes=True, image_fields=False):
+    """Поля файлов в исходном порядке, извлеченные параллельно.
+
+    processes=False — пул потоков с общим кэшем вместо пула процессов
+    (для вызова из процесса, который нельзя разветвлять, например из окна
+    просмотра).
+    """
+    paths = list(paths)
+    if not processes or len(paths) < MIN_PARALLEL_FILES:
+        from concurrent.futures import ThreadPoolExecutor
+
+        from imadata_cache import MetadataCache
+
+        cache = MetadataCache(cache_path) if cache_path else None
+        try:
+            if len(paths) < MIN_PARALLEL_FILES:
+                return [extract_fields(path, cache, image_fields) for path in paths]
+            with ThreadPoolExecutor(max_workers=workers or DEFAULT_THREADS) as executor:
+                return list(executor.map(lambda path: extract_fields(path, cache, image_fields), paths))
+        finally:
+            if cache is not None:
+                cache.close()
+
+    import functools
+    from concurrent.futures import ProcessPoolExecutor
+
+    from imadata_batch import init_worker
+
+    chunk_size = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache_path,)) as executor:
+        worker = functools.partial(_extract_in_worker, image_fields=image_fields)
+        return list(executor.map(worker, paths, chunksize=chunk_size))
+
+
+def compare_records(records):
+    """Сравнивает поля файлов.
+
+    Возвращает словарь:
+        "files" — пути файлов без ошибок в исходном порядке;
+        "errors" — пары (путь, ошибка);
+        "constant" — {поле: значение}, одинаковое во всех файлах;
+        "varying" — {поле: [(значение или None, число файлов), ...]} по убыванию
+                    числа файлов; None — поля в файле нет;
+        "values" — {поле: [значение в каждом файле]} для изменяющихся полей;
+        "prompt_diffs" — список (индекс файла, поле, изменения) для соседних
+                         файлов с разными промптами, см. token_diff.
+    """
+    files = []
+    errors = []
+    columns = {}
+    values = []
+    for record in records:
+        if record["error"]:
+            errors.append((record["path"], record["error"]))
+            continue
+        row = len(files)
+        files.append(record["path"])
+        for key, value in record["fields"].items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = len(values)
+                values.append([MISSING] * row)
+            values[column].append(value)
+        for column in values:
+            if len(column) == row:
+                column.append(MISSING)
+
+    constant = {}
+    varying = {}
+    varying_values = {}
+    for key, column in columns.items():
+        counts = {}
+        for value in values[column]:
+            counts[value] = counts.get(value, 0) + 1
+        if len(counts) == 1:
+            constant[key] = values[column][0]
+        else:
+            varying[key] = sorted(counts.items(), key=lambda item: -item[1])
+            varying_values[key] = values[column]
+
+    prompt_diffs = []
+    for key in PROMPT_FIELDS:
+        column = varying_values.get(key)
+        if column is None:
+            continue
+        for row in range(1, len(column)):
+            if column[row] != column[row - 1]:
+                prompt_diffs.append((row, key, token_diff(column[row - 1] or "", column[row] or "")))
+    prompt_diffs.sort(key=lambda item: item[0])
+
+    return {"files": files, "errors": errors, "constant": constant, "varying": varying,
+            "values": varying_values, "prompt_diffs": prompt_diffs}
+
+
+def tokenize_prompt(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+def token_diff(old, new):
+    """Разница промптов по токенам: список пар ("-" или "+", текст подряд идущих токенов)."""
+    old_tokens = tokenize_prompt(old)
+    new_tokens = tokenize_prompt(new)
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    changes = []
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag in ("delete", "replace"):
+            changes.append(("-", " ".join(old_tokens[old_start:old_end])))
+        if tag in ("insert", "replace"):
+            changes.append(("+", " ".join(new_tokens[new_start:new_end])))
+    return changes
+
+
+def format_diff(changes):
+    """Изменения из token_diff одной строкой: "-old words +new words"."""
+    return "  ".join(f"{sign}{text}" for sign, text in changes) or "(only separators changed)"
+
+
+def format_counts(counts, limit=None):
+    """Различные значения с числом файлов: "7 ×3; 8 ×2; (not set) ×1"."""
+    shown = counts if limit is None else counts[:limit]
+    text = "; ".join(f"{_single_line(value)} ×{count}" for value, count in shown)
+    if len(counts) > len(shown):
+        text += f"; … ({len(counts) - len(shown)} more)"
+    return text
+
+
+def _single_line(value, limit=80):
+    if value is MISSING:
+        return "(not set)"
+    text = " ".join(value.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def print_report(report, elapsed, out=sys.stdout, limit=10):
+    files = report["files"]
+    print(f"Compared {len(files)} files in {elapsed * 1000:.0f} ms", file=out)
+    for path, error in report["errors"]:
+        print(f"Error: {path}: {error}", file=out)
+
+    print(f"\nVarying ({len(report['varying'])}):", file=out)
+    for key, counts in report["varying"].items():
+        unique = " (one per file)" if len(counts) == len(files) else ""
+        print(f"  {key}: {len(counts)} distinct values{unique}", file=out)
+        for value, count in counts[:limit]:
+            print(f"    {count:>5} × {_single_line(value)}", file=out)
+        if len(counts) > limit:
+            print(f"    … {len(counts) - limit} more", file=out)
+
+    print(f"\nConstant ({len(report['constant'])}):", file=out)
+    for key, value in report["constant"].items():
+        print(f"  {key}: {_single_line(value)}", file=out)
+
+    if report["prompt_diffs"]:
+        print("\nPrompt changes:", file=out)
+        for row, key, changes in report["prompt_diffs"]:
+            names = f"{os.path.basename(files[row - 1])} → {os.path.basename(files[row])}"
+            print(f"  {names} ({key}): {format_diff(changes)}", file=out)
+
+
+def main(argv=None):
+    # Модуль импортируется окном при запуске; argparse нужен только здесь
+    import argparse
+
+    from imadata_batch import iter_image_files
+    from imadata_cache import default_cache_path
+
+    parser = argparse.ArgumentParser(description="Compare generation parameters across images")
+    parser.add_argument("paths", nargs="+", help="Folders (scanned recursively) or image files")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or update the metadata cache")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cache_path = None if args.no_cache else default_cache_path()
+    records = extract_records(iter_image_files(args.paths), args.workers, cache_path)
+    report = compare_records(records)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
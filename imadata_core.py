@@ -0,0 +1,350 @@
+"""Извлечение метаданных изображений без графического интерфейса.
+
+Функции модуля возвращают простые словари и списки, не зависят от Qt
+и используются как окном просмотра, так и пакетной обработкой
+(imadata_batch.py).
+
+Pillow импортируется только при первом обращении к нему: разбор по
+заголовкам (header_only=True) и попадания в кэш обходятся без него,
+поэтому импорт модуля и запуск рабочих процессов остаются быстрыми.
+"""
+
+import functools
+import json
+import os
+import struct
+from datetime import datetime
+
+from imadata_binary import BinaryBuffer, describe_binary, map_file_range
+from imadata_comfy import add_comfy_category, expand_json_node, parse_comfy_chunks
+from imadata_exif import (add_exif_categories, expand_exif_node, read_exif, read_exif_block,
+                          read_exif_file, read_exif_tag)
+from imadata_headers import HeaderFormatError, read_header_metadata
+from imadata_params import empty_parameters, parse_parameters
+from imadata_profile import NULL_PROFILE, open_counted
+from imadata_xmp import (XMP_INFO_KEYS, add_xmp_category, expand_xmp_node, needs_extended_xmp,
+                         read_xmp_file, xmp_packets)
+
+# Расширения файлов, которые умеет открывать приложение
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')
+
+def list_image_files(directory):
+    """Возвращает пути изображений в папке (без подпапок), отсортированные по имени."""
+    try:
+        with os.scandir(directory) as entries:
+            names = [entry.name for entry in entries
+                     if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()]
+    except OSError:
+        return []
+    names.sort(key=lambda name: (name.lower(), name))
+    return [os.path.join(directory, name) for name in names]
+
+def collect_image_metadata(size, image_format, mode, info, get_exif, parameters, categories,
+                           profile=NULL_PROFILE, expandable=None, get_xmp=None):
+    """Раскладывает info, EXIF и XMP изображения по категориям.
+    
+    Источником может быть как открытый файл Pillow, так и результат
+    read_header_metadata; EXIF передается функцией, возвращающей дерево
+    read_exif, чтобы его ошибки попадали в "EXIF Error", а не прерывали
+    разбор. Так же передаются пакеты XMP (get_xmp, по умолчанию — из info).
+    Дескрипторы узлов, раскрываемых по запросу, и двоичных значений
+    (для просмотрщика, см. open_binary_value) пишутся в expandable.
+    """
+    if expandable is None:
+        expandable = {}
+
+    # Get image dimensions
+    width, height = size
+    categories["Image Properties"]["Dimensions"] = f"{width} × {height} pixels"
+    categories["Image Properties"]["Format"] = image_format or "Unknown"
+    categories["Image Properties"]["Mode"] = mode
+
+    # JSON ComfyUI показывается деревом, а не одной строкой
+    with profile.span("comfy"):
+        comfy = parse_comfy_chunks(info)
+    if comfy:
+        add_comfy_category(comfy, categories, expandable)
+    
+    # Get metadata and parse parameters
+    for key, value in info.items():
+        if key in XMP_INFO_KEYS or key in comfy:
+            continue
+        if isinstance(value, bytes):
+            categories["Other Metadata"][key] = describe_binary(value)
+            expandable.setdefault("Other Metadata", {})[key] = {
+                "kind": "binary", "source": "info", "key": key, "length": len(value)}
+        else:
+            formatted_value = str(value)
+
+            # Парсим параметры
+            if "parameters" in key.lower():
+                with profile.span("parameters"):
+                    parse_parameters(formatted_value, parameters)
+            else:
+                categories["Other Metadata"][key] = formatted_value
+
+    # Get EXIF data if available
+    with profile.span("exif"):
+        collect_exif(get_exif, categories, expandable)
+
+    with profile.span("xmp"):
+        collect_xmp(get_xmp or (lambda: xmp_packets(info)), categories, expandable)
+
+def collect_exif(get_exif, categories, expandable):
+    """Раскладывает теги всех IFD по категориям камеры, GPS и прочих."""
+    try:
+        tree = get_exif()
+        if tree:
+            add_exif_categories(tree, categories, expandable)
+    except Exception as e:
+        categories["Other Metadata"]["EXIF Error"] = str(e)
+
+def collect_xmp(get_xmp, categories, expandable):
+    """Раскладывает свойства пакетов XMP по категории "XMP"."""
+    try:
+        packets = get_xmp()
+        if packets:
+            add_xmp_category(packets, categories, expandable)
+    except Exception as e:
+        categories["Other Metadata"]["XMP Error"] = str(e)
+
+def exif_reader(file_path, image_format, info):
+    """Функция, читающая дерево EXIF из блока info["exif"] или из самого файла TIFF."""
+    def get_exif():
+        data = info.get("exif")
+        if isinstance(data, bytes):
+            return read_exif(data)
+        if image_format == "TIFF":
+            return read_exif_file(file_path)
+        return None
+    return get_exif
+
+def xmp_reader(file_path, image_format, info):
+    """Функция, возвращающая пакеты XMP из info.
+    
+    Pillow не собирает расширенный XMP JPEG из нескольких сегментов APP1,
+    поэтому, если основной пакет на него ссылается, пакеты читаются
+    из заголовков файла.
+    """
+    def get_xmp():
+        if needs_extended_xmp(image_format, info):
+            return read_xmp_file(file_path)
+        return xmp_packets(info)
+    return get_xmp
+
+def expand_metadata_node(file_path, descriptor):
+    """Разбирает узел, отложенный при извлечении (см. "expandable" в extract_metadata).
+    
+    Возвращает список строк (ключ, значение, дескриптор вложенного узла или None);
+    ошибка чтения возвращается строкой "Error".
+    """
+    kind = descriptor.get("kind", "")
+    try:
+        if kind.startswith("exif_"):
+            return expand_exif_node(file_path, descriptor)
+        if kind == "xmp":
+            return expand_xmp_node(file_path, descriptor)
+        if kind == "json":
+            stat = os.stat(file_path)
+            value = read_info_json(file_path, descriptor["key"], stat.st_size, stat.st_mtime_ns)
+            return expand_json_node(value, descriptor)
+    except (OSError, ValueError, struct.error) as e:
+        return [("Error", str(e), None)]
+    return [("Error", f"Unknown node type: {kind}", None)]
+
+def open_binary_value(file_path, descriptor):
+    """Открывает двоичное значение по дескриптору "binary" как BinaryBuffer.
+    
+    Диапазоны файла отображаются в память, остальные значения читаются
+    заново из заголовков. Буфер нужно закрыть после использования.
+    """
+    source = descriptor["source"]
+    if source == "file":
+        return map_file_range(file_path, descriptor["offset"], descriptor["length"])
+    if source == "exif":
+        block = read_exif_block(file_path)
+        if descriptor["offset"] + descriptor["length"] > len(block):
+            raise HeaderFormatError("Value lies outside the EXIF block")
+        return BinaryBuffer(block, start=descriptor["offset"], length=descriptor["length"])
+    if source == "exif_tag":
+        return BinaryBuffer(read_exif_tag(file_path, descriptor))
+    return BinaryBuffer(read_info_value(file_path, descriptor["key"]))
+
+def read_info_value(file_path, key):
+    """Двоичное значение img.info: из заголовков, а для прочих форматов — через Pillow."""
+    try:
+        header = read_header_metadata(file_path)
+    except HeaderFormatError:
+        header = None
+    value = header["info"].get(key) if header is not None else None
+    if not isinstance(value, (bytes, str)):
+        import PIL.Image
+        with PIL.Image.open(file_path) as img:
+            value = img.info.get(key)
+    if isinstance(value, str):
+        # Текстовые значения (пакет XMP в PNG) открываются в кодировке UTF-8
+        value = value.encode("utf-8")
+    if not isinstance(value, bytes):
+        raise HeaderFormatError(f"Value {key} not found")
+    return value
+
+@functools.lru_cache(maxsize=4)
+def read_info_json(file_path, key, size, mtime_ns):
+    """Разобранное JSON-значение img.info.
+    
+    Размер и mtime файла входят в ключ кэша, поэтому при раскрытии
+    вложенных узлов одного файла JSON разбирается один раз.
+    """
+    return json.loads(read_info_value(file_path, key))
+
+def extract_metadata(file_path, header_only=False, image=None, cache=None, profile=NULL_PROFILE):
+    """Извлекает метаданные изображения, не обращаясь к виджетам.
+
+    Возвращает простой словарь с ключами "parameters", "categories", "summary",
+    "error", "image_size" и "expandable", поэтому функцию можно вызывать
+    из фонового потока. В "expandable" ({категория: {ключ: дескриптор}})
+    описаны узлы, которые разбираются только по запросу (expand_metadata_node).
+    При header_only=True метаданные читаются из заголовков файла без Pillow
+    (для неподдерживаемых форматов все равно используется Pillow).
+    Если передан image — уже открытый файл Pillow, — повторно файл не открывается.
+    Если передан cache (MetadataCache), неизмененные файлы берутся из кэша
+    без разбора; "File Info" всегда строится заново по os.stat.
+    Если передан profile (FileProfile), в него записываются длительности
+    этапов и счетчики кэша и прочитанных байтов.
+    """
+    # Категории параметров
+    parameters = empty_parameters()
+    
+    # Остальные категории метаданных
+    categories = {
+        "File Info": {},
+        "Image Properties": {},
+        "ComfyUI": {},
+        "Camera Info": {},
+        "GPS Data": {},
+        "Other EXIF": {},
+        "XMP": {},
+        "Other Metadata": {}
+    }
+    
+    summary = {}
+    error = None
+    image_size = None
+    expandable = {}
+    
+    try:
+        # Базовая информация о файле
+        with profile.span("stat"):
+            file_info = os.stat(file_path)
+        file_size_b = file_info.st_size
+        file_size_kb = file_size_b / 1024
+        file_size_mb = file_size_kb / 1024
+            
+        if file_size_mb >= 1:
+            file_size_str = f"{file_size_mb:.2f} MB ({file_size_b:,} bytes)"
+        else:
+            file_size_str = f"{file_size_kb:.2f} KB ({file_size_b:,} bytes)"
+            
+        categories["File Info"] = {
+            "Filename": os.path.basename(file_path),
+            "Directory": os.path.dirname(file_path),
+            "File size": file_size_str,
+            "Created": datetime.fromtimestamp(file_info.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
+            "Modified": datetime.fromtimestamp(file_info.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            "Last accessed": datetime.fromtimestamp(file_info.st_atime).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+            
+        # Краткая информация о файле для панели под превью
+        summary = {
+            "Filename": os.path.basename(file_path),
+            "Size": file_size_str,
+            "Modified": datetime.fromtimestamp(file_info.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        }
+            
+        # Неизмененный файл: метаданные уже разобраны тем же способом
+        cached = None
+        cache_mode = "header" if header_only else "pillow"
+        if cache is not None:
+            with profile.span("cache_lookup"):
+                cached = cache.get(file_path, file_info.st_size, file_info.st_mtime_ns, cache_mode)
+            profile.count("cache_hits" if cached is not None else "cache_misses")
+        if cached is not None:
+            parameters = cached["parameters"]
+            categories.update(cached["categories"])
+            return {
+                "parameters": parameters,
+                "categories": categories,
+                "summary": summary,
+                "error": None,
+                "image_size": tuple(cached["image_size"]),
+                "expandable": cached["expandable"],
+            }
+        
+        # Извлекаем метаданные изображения
+        header = None
+        if header_only:
+            try:
+                with profile.span("header_read"):
+                    header = read_header_metadata(file_path)
+            except HeaderFormatError:
+                # Поврежденный заголовок: пусть с ним разбирается Pillow
+                header = None
+        
+        if header is not None:
+            image_size = header["size"]
+            profile.count("bytes_read", header["bytes_read"])
+            collect_image_metadata(header["size"], header["format"], header["mode"], header["info"],
+                                   exif_reader(file_path, header["format"], header["info"]),
+                                   parameters, categories, profile, expandable,
+                                   get_xmp=xmp_reader(file_path, header["format"], header["info"]))
+        elif image is not None:
+            # Файл уже открыт вызывающим кодом (например, для превью)
+            image_size = image.size
+            collect_image_metadata(image.size, image.format, image.mode, image.info,
+                                   exif_reader(file_path, image.format, image.info),
+                                   parameters, categories, profile, expandable,
+                                   get_xmp=xmp_reader(file_path, image.format, image.info))
+        elif profile:
+            import PIL.Image
+            fp, counter = open_counted(file_path)
+            with fp:
+                with profile.span("pillow_open"):
+                    img = PIL.Image.open(fp)
+                with img:
+                    image_size = img.size
+                    collect_image_metadata(img.size, img.format, img.mode, img.info,
+                                           exif_reader(file_path, img.format, img.info),
+                                           parameters, categories, profile, expandable,
+                                           get_xmp=xmp_reader(file_path, img.format, img.info))
+            profile.count("bytes_read", counter.bytes_read)
+        else:
+            import PIL.Image
+            with PIL.Image.open(file_path) as img:
+                image_size = img.size
+                collect_image_metadata(img.size, img.format, img.mode, img.info,
+                                       exif_reader(file_path, img.format, img.info),
+                                       parameters, categories, expandable=expandable,
+                                       get_xmp=xmp_reader(file_path, img.format, img.info))
+        
+        if cache is not None:
+            with profile.span("cache_store"):
+                cache.put(file_path, file_info.st_size, file_info.st_mtime_ns, cache_mode, {
+                    "parameters": parameters,
+                    "categories": {name: values for name, values in categories.items()
+                                   if name != "File Info"},
+                    "image_size": image_size,
+                    "expandable": expandable,
+                })
+    
+    except Exception as e:
+        error = str(e)
+        categories["Other Metadata"]["Error"] = f"Failed to extract metadata: {str(e)}"
+    
+    return {
+        "parameters": parameters,
+        "categories": categories,
+        "summary": summary,
+        "error": error,
+        "image_size": image_size,
+        "expandable": expandable,
+    }
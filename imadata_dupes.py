@@ -0,0 +1,380 @@
+"""Поиск дубликатов и почти дубликатов изображений по перцептивным хэшам.
+
+Для каждого файла считаются два 64-битных хэша по уменьшенной копии в
+оттенках серого: dHash (знаки разностей соседних пикселей 9×8) и pHash
+(знаки низкочастотных коэффициентов DCT 32×32 относительно медианы).
+Изображение декодируется сразу уменьшенным: JPEG — через draft()
+(масштабирование на этапе DCT), остальные форматы — через reduce().
+Хэши считаются в пуле процессов и сохраняются в кэше метаданных
+(imadata_cache), так что повторный поиск по папке не открывает
+неизмененные файлы.
+
+Похожие хэши ищутся в BK-дереве по расстоянию Хэмминга: поиск соседей
+в пределах max_distance отсекает поддеревья по неравенству треугольника
+и не сравнивает каждый хэш с каждым. Файлы, связанные цепочкой таких
+соседей, объединяются в группы.
+
+NumPy указан в requirements.txt: с ним матричные операции pHash и
+сравнения dHash выполняются векторно. Без него хэши считаются на чистом
+Python (для матриц 32×32 это единицы миллисекунд на файл); какой способ
+использовался, сообщает hashing_backend() и вывод командной строки.
+
+Из командной строки:
+    python imadata_dupes.py /data/outputs
+    python imadata_dupes.py /data/outputs --hash phash --distance 4 --json > dupes.json
+"""
+
+import functools
+import json
+import math
+import os
+import sys
+import time
+
+# Хэши, которые считаются для каждого файла
+HASH_KINDS = ("dhash", "phash")
+
+# Сторона уменьшенного изображения, из которого строятся оба хэша
+DECODE_SIZE = 64
+
+# Размеры для dHash (ширина на пиксель больше: сравниваются соседи по строке)
+DHASH_SIZE = 8
+# Сторона изображения для DCT и сторона блока низких частот pHash
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+# Расстояние Хэмминга по умолчанию, при котором изображения считаются похожими
+DEFAULT_DISTANCE = 6
+
+# Знаков после запятой у коэффициентов DCT: ошибки округления однотонного
+# изображения не должны давать случайные биты
+DCT_PRECISION = 6
+
+# Поворот изображения по тегу Orientation из EXIF (как в PIL.ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {2: "FLIP_LEFT_RIGHT", 3: "ROTATE_180", 4: "FLIP_TOP_BOTTOM",
+                         5: "TRANSPOSE", 6: "ROTATE_270", 7: "TRANSVERSE", 8: "ROTATE_90"}
+
+
+@functools.lru_cache(maxsize=1)
+def _numpy():
+    """Модуль numpy или None, если он не установлен; импортируется при первом расчете."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def hashing_backend():
+    """Название способа расчета хэшей: "NumPy" или "pure Python"."""
+    return "NumPy" if _numpy() is not None else "pure Python"
+
+
+@functools.lru_cache(maxsize=1)
+def _dct_matrix():
+    """Строки DCT-II для первых PHASH_LOW частот: PHASH_LOW × PHASH_SIZE."""
+    return [[math.cos((2 * x + 1) * u * math.pi / (2 * PHASH_SIZE)) for x in range(PHASH_SIZE)]
+            for u in range(PHASH_LOW)]
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def reduced_image(img, size=DECODE_SIZE):
+    """Уменьшенная копия изображения в оттенках серого не меньше size по каждой стороне."""
+    import PIL.Image
+
+    orientation = img.getexif().get(0x0112, 1)
+    if img.format == "JPEG":
+        img.draft("L", (size, size))
+    if img.mode != "L":
+        img = img.convert("L")
+    factor = min(img.width // size, img.height // size)
+    if factor > 1:
+        img = img.reduce(factor)
+    if orientation in ORIENTATION_TRANSPOSE:
+        img = img.transpose(getattr(PIL.Image.Transpose, ORIENTATION_TRANSPOSE[orientation]))
+    return img
+
+
+def dhash(img):
+    """dHash: бит равен 1, если пиксель темнее соседа справа."""
+    import PIL.Image
+
+    small = img.resize((DHASH_SIZE + 1, DHASH_SIZE), PIL.Image.Resampling.BOX)
+    pixels = small.tobytes()
+    width = DHASH_SIZE + 1
+    numpy = _numpy()
+    if numpy is not None:
+        grid = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(DHASH_SIZE, width)
+        return _bits_to_int(numpy, grid[:, :-1] < grid[:, 1:])
+
+    value = 0
+    for row in range(0, len(pixels), width):
+        for column in range(row, row + DHASH_SIZE):
+            value = (value << 1) | (pixels[column] < pixels[column + 1])
+    return value
+
+
+def phash(img):
+    """pHash: бит равен 1, если коэффициент DCT 8×8 низких частот больше медианы."""
+    import PIL.Image
+
+    small = img.resize((PHASH_SIZE, PHASH_SIZE), PIL.Image.Resampling.BOX)
+    pixels = small.tobytes()
+    numpy = _numpy()
+    if numpy is not None:
+        grid = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(PHASH_SIZE, PHASH_SIZE)
+        dct = numpy.array(_dct_matrix())
+        coefficients = (dct @ grid @ dct.T).ravel().round(DCT_PRECISION)
+        # Постоянная составляющая (яркость) в медиану не входит
+        median = numpy.median(coefficients[1:])
+        return _bits_to_int(numpy, coefficients > median)
+
+    dct = _dct_matrix()
+    rows = [pixels[start:start + PHASH_SIZE] for start in range(0, len(pixels), PHASH_SIZE)]
+    # Сначала DCT по строкам (только нужные частоты), затем по столбцам
+    row_dct = [[sum(c * p for c, p in zip(basis, row)) for basis in dct] for row in rows]
+    coefficients = [round(sum(basis[y] * row_dct[y][u] for y in range(PHASH_SIZE)), DCT_PRECISION)
+                    for basis in dct for u in range(PHASH_LOW)]
+    ordered = sorted(coefficients[1:])
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def _bits_to_int(numpy, bits):
+    return int.from_bytes(numpy.packbits(bits.ravel()).tobytes(), "big")
+
+
+def compute_hashes(file_path):
+    """Хэши одного файла: {"path", "hashes": {"dhash", "phash"} или None, "error"}."""
+    import PIL.Image
+
+    try:
+        with PIL.Image.open(file_path) as img:
+            small = reduced_image(img)
+            return {"path": file_path, "hashes": {"dhash": dhash(small), "phash": phash(small)},
+                    "error": None}
+    except Exception as e:
+        # Декодеры Pillow на испорченных файлах бросают что угодно (EOFError,
+        # struct.error, SyntaxError...), а один файл не должен прерывать всю папку
+        return {"path": file_path, "hashes": None, "error": str(e) or type(e).__name__}
+
+
+class BKTree:
+    """BK-дерево хэшей по расстоянию Хэмминга.
+
+    Узел — [хэш, элементы с этим хэшем, {расстояние: дочерний узел}].
+    Поиск спускается только в те дочерние узлы, расстояние до которых
+    отличается от расстояния до запроса не больше чем на max_distance.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """Элементы в пределах max_distance: список пар (расстояние, элемент)."""
+        results = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, item) for item in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            nodes.extend(child for child_distance, child in node[2].items()
+                         if low <= child_distance <= high)
+        return results
+
+
+def find_clusters(hashes, max_distance=DEFAULT_DISTANCE):
+    """Группы похожих файлов.
+
+    hashes — {путь: хэш}. Файлы, хэши которых различаются не больше чем
+    на max_distance бит, попадают в одну группу (связность переходит по
+    цепочке соседей). Возвращает список групп по убыванию размера; группа —
+    список пар (путь, расстояние до первого файла группы) по алфавиту путей.
+    """
+    tree = BKTree()
+    by_hash = {}
+    for path, value in hashes.items():
+        if value not in by_hash:
+            by_hash[value] = []
+            tree.add(value, value)
+        by_hash[value].append(path)
+
+    # Объединение хэшей-соседей (система непересекающихся множеств)
+    parent = {value: value for value in by_hash}
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    for value in by_hash:
+        for _, neighbour in tree.search(value, max_distance):
+            root, other = find(value), find(neighbour)
+            if root != other:
+                parent[other] = root
+
+    groups = {}
+    for value, paths in by_hash.items():
+        groups.setdefault(find(value), []).extend(paths)
+
+    clusters = []
+    for paths in groups.values():
+        if len(paths) < 2:
+            continue
+        paths.sort()
+        first = hashes[paths[0]]
+        clusters.append([(path, hamming_distance(first, hashes[path])) for path in paths])
+    clusters.sort(key=lambda cluster: (-len(cluster), cluster[0][0]))
+    return clusters
+
+
+def _hash_chunk(paths):
+    return [compute_hashes(path) for path in paths]
+
+
+def hash_files(paths, workers=None, cache_path=None, processes=True, chunk_size=16,
+               cancelled=None):
+    """Хэши файлов: ({путь: {"dhash", "phash"}}, [(путь, ошибка), ...]).
+
+    Хэши неизмененных файлов берутся из кэша метаданных, остальные
+    считаются в пуле процессов (processes=False — в пуле потоков, для
+    вызова из окна просмотра) пачками по chunk_size и записываются в кэш.
+    cancelled — функция без аргументов, которая проверяется между пачками:
+    если она вернула True, оставшиеся пачки снимаются, уже посчитанные
+    хэши сохраняются в кэш, а результат неполон.
+    """
+    signatures = {}
+    errors = []
+    for path in paths:
+        try:
+            file_info = os.stat(path)
+        except OSError as e:
+            errors.append((path, str(e)))
+            continue
+        signatures[path] = (file_info.st_size, file_info.st_mtime_ns)
+
+    cache = None
+    if cache_path:
+        from imadata_cache import MetadataCache
+        cache = MetadataCache(cache_path)
+    try:
+        found = cache.get_hashes(signatures) if cache is not None else {}
+        missing = [path for path in signatures if path not in found]
+        if missing:
+            if processes:
+                from concurrent.futures import ProcessPoolExecutor as Executor
+            else:
+                from concurrent.futures import ThreadPoolExecutor as Executor
+            computed = []
+            with Executor(max_workers=workers) as executor:
+                futures = [executor.submit(_hash_chunk, missing[start:start + chunk_size])
+                           for start in range(0, len(missing), chunk_size)]
+                try:
+                    for future in futures:
+                        if cancelled is not None and cancelled():
+                            break
+                        for result in future.result():
+                            if result["error"]:
+                                errors.append((result["path"], result["error"]))
+                            else:
+                                found[result["path"]] = result["hashes"]
+                                computed.append((result["path"], *signatures[result["path"]],
+                                                 result["hashes"]))
+                finally:
+                    # Выход из with не должен ждать пачки, которые еще не начаты
+                    for future in futures:
+                        future.cancel()
+            if cache is not None and computed:
+                cache.put_hashes(computed)
+    finally:
+        if cache is not None:
+            cache.close()
+    return found, errors
+
+
+def find_duplicates(paths, kind="dhash", max_distance=DEFAULT_DISTANCE, workers=None,
+                    cache_path=None, processes=True):
+    """Хэширует файлы и группирует похожие.
+
+    Возвращает {"files": число файлов с хэшами, "clusters": см. find_clusters,
+    "errors": [(путь, ошибка), ...]}.
+    """
+    if kind not in HASH_KINDS:
+        raise ValueError(f"Unknown hash kind: {kind}")
+    hashes, errors = hash_files(paths, workers, cache_path, processes)
+    clusters = find_clusters({path: value[kind] for path, value in hashes.items()}, max_distance)
+    return {"files": len(hashes), "clusters": clusters, "errors": errors}
+
+
+def main(argv=None):
+    # Модуль импортируется окном при запуске; argparse нужен только здесь
+    import argparse
+
+    from imadata_batch import iter_image_files
+    from imadata_cache import default_cache_path
+
+    parser = argparse.ArgumentParser(description="Find duplicate and near-duplicate images")
+    parser.add_argument("paths", nargs="+", help="Folders (scanned recursively) or image files")
+    parser.add_argument("--hash", choices=HASH_KINDS, default="dhash",
+                        help="Perceptual hash to compare (default: dhash)")
+    parser.add_argument("-d", "--distance", type=int, default=DEFAULT_DISTANCE,
+                        help=f"Maximum Hamming distance between similar images "
+                             f"(0-64, default: {DEFAULT_DISTANCE})")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or update the hashes stored in the metadata cache")
+    parser.add_argument("--json", action="store_true", help="Print the clusters as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cache_path = None if args.no_cache else default_cache_path()
+    result = find_duplicates(list(iter_image_files(args.paths)), args.hash, args.distance,
+                             args.workers, cache_path)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for number, cluster in enumerate(result["clusters"], 1):
+            print(f"Cluster {number} ({len(cluster)} files):")
+            for path, distance in cluster:
+                print(f"  {distance:>3}  {path}")
+        for path, error in result["errors"]:
+            print(f"Error: {path}: {error}", file=sys.stderr)
+    print(f"{len(result['clusters'])} clusters among {result['files']} files in {elapsed:.2f} s "
+          f"(hashing: {hashing_backend()})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
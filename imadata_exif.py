@@ -0,0 +1,405 @@
+"""Полный разбор EXIF: IFD0, Exif IFD, GPS IFD, Interop IFD и IFD1.
+
+Дерево IFD читается из блока EXIF (APP1 в JPEG, eXIf в PNG, EXIF в WebP)
+или прямо из файла TIFF теми же функциями, что и заголовки
+(imadata_headers). Указатели на вложенные IFD не показываются как числа:
+их теги раскладываются по категориям "Camera Info", "GPS Data" и
+"Other EXIF" под именами из таблиц Pillow (PIL.ExifTags).
+
+MakerNote и встроенная миниатюра при обходе не читаются: вместо них
+в результат попадает JSON-совместимый дескриптор (смещение и длина),
+а разбираются они только когда пользователь раскрывает строку
+(expand_exif_node). Двоичные значения тегов получают дескрипторы "binary"
+и открываются в просмотрщике (read_exif_tag, read_exif_block).
+"""
+
+import io
+import struct
+from contextlib import contextmanager
+
+from imadata_binary import describe_binary
+from imadata_headers import (TIFF_XMP_TAG, BoundedReader, HeaderFormatError, TiffValueRef,
+                             _read_tiff_header, read_header_metadata,
+                             read_header_metadata_from_file, read_ifd)
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+INTEROP_IFD = 0xA005
+MAKER_NOTE = 0x927C
+USER_COMMENT = 0x9286
+EXPOSURE_TIME = 0x829A
+THUMBNAIL_OFFSET = 0x0201
+THUMBNAIL_LENGTH = 0x0202
+
+# Указатели на вложенные IFD: их значения — смещения, а не данные
+POINTER_TAGS = {EXIF_IFD, GPS_IFD, INTEROP_IFD}
+
+# Теги Windows (XPTitle, XPComment, ...) хранят строку UTF-16LE в массиве байтов
+XP_TAGS = {0x9C9B, 0x9C9C, 0x9C9D, 0x9C9E, 0x9C9F}
+
+INTEROP_TAGS = {
+    0x0001: "InteropIndex",
+    0x0002: "InteropVersion",
+    0x1000: "RelatedImageFileFormat",
+    0x1001: "RelatedImageWidth",
+    0x1002: "RelatedImageLength",
+}
+
+# Теги, которые показываются в "Camera Info"
+CAMERA_TAGS = {
+    "Make", "Model", "LensMake", "LensModel", "LensSpecification", "BodySerialNumber",
+    "ExposureTime", "FNumber", "ISOSpeedRatings", "FocalLength", "FocalLengthIn35mmFilm",
+    "Flash", "Software", "ExposureProgram", "ShutterSpeedValue", "ApertureValue",
+    "ExposureMode", "ExposureBiasValue", "WhiteBalance", "MeteringMode",
+}
+
+# Сколько элементов массива показывать в ячейке
+MAX_TUPLE_ITEMS = 16
+
+# Кодировки UserComment по первым восьми байтам
+USER_COMMENT_CHARSETS = {
+    b"ASCII\x00\x00\x00": "ascii",
+    b"JIS\x00\x00\x00\x00\x00": "shift_jis",
+    b"\x00" * 8: "utf-8",
+}
+
+# Заголовки MakerNote: (префикс, смещение IFD от начала MakerNote,
+# смещения внутри отсчитываются от MakerNote (True) или от начала TIFF (False))
+MAKER_NOTE_LAYOUTS = (
+    (b"FUJIFILM", None, True),
+    (b"OLYMPUS\x00", 12, True),
+    (b"OM SYSTEM\x00", 16, True),
+    (b"Apple iOS\x00", 14, True),
+    (b"OLYMP\x00", 8, False),
+    (b"SONY DSC \x00\x00\x00", 12, False),
+    (b"SONY CAM \x00\x00\x00", 12, False),
+    (b"Panasonic\x00\x00\x00", 12, False),
+    (b"AOC\x00", 6, False),
+)
+
+
+def read_exif(data):
+    """Разбирает блок EXIF (с префиксом "Exif\\0\\0" или без) в дерево IFD."""
+    if data.startswith(b"Exif\x00\x00"):
+        data = data[6:]
+    if len(data) < 8:
+        return None
+    return _read_tree(BoundedReader(io.BytesIO(data)), "exif")
+
+
+def read_exif_file(file_path):
+    """Разбирает первую страницу файла TIFF и ее вложенные IFD."""
+    with open(file_path, "rb") as fp:
+        return _read_tree(BoundedReader(fp), "file")
+
+
+def _read_tree(reader, source):
+    """Обходит IFD0, вложенные в него IFD и (для блока EXIF) IFD1.
+
+    Возвращает словарь с ключами "source", "byte_order", "errors" и
+    словарями {tag_id: значение} для каждого прочитанного IFD.
+    Ошибка во вложенном IFD не прерывает разбор остальных.
+    """
+    byte_order, ifd0_offset = _read_tiff_header(reader)
+    tree = {"source": source, "byte_order": byte_order, "errors": []}
+    # Пакет XMP разбирается отдельно (imadata_xmp), здесь его не читаем
+    ifd0 = tree["IFD0"] = read_ifd(reader, ifd0_offset, byte_order, deferred=(TIFF_XMP_TAG,))
+
+    for name, pointer, parent in (("Exif", EXIF_IFD, "IFD0"), ("GPS", GPS_IFD, "IFD0"),
+                                  ("Interop", INTEROP_IFD, "Exif")):
+        offset = tree.get(parent, {}).get(pointer)
+        if not isinstance(offset, int) or offset == ifd0_offset:
+            continue
+        try:
+            tree[name] = read_ifd(reader, offset, byte_order, deferred=(MAKER_NOTE,))
+        except (HeaderFormatError, struct.error) as e:
+            tree["errors"].append(f"{name} IFD: {e}")
+
+    # В TIFF следующий IFD — это следующая страница, а в блоке EXIF — миниатюра
+    if source == "exif":
+        try:
+            offset = _next_ifd_offset(reader, ifd0_offset, byte_order)
+            if offset and offset != ifd0_offset:
+                tree["IFD1"] = read_ifd(reader, offset, byte_order)
+        except (HeaderFormatError, struct.error) as e:
+            tree["errors"].append(f"IFD1: {e}")
+    if not ifd0:
+        tree["errors"].append("IFD0 is empty")
+    return tree
+
+
+def _next_ifd_offset(reader, offset, byte_order):
+    reader.seek(offset)
+    count, = struct.unpack(byte_order + "H", reader.read_exact(2))
+    reader.seek(offset + 2 + count * 12)
+    data = reader.read(4)
+    if len(data) < 4:
+        return 0
+    return struct.unpack(byte_order + "L", data)[0]
+
+
+def add_exif_categories(tree, categories, expandable):
+    """Раскладывает дерево read_exif по категориям.
+
+    Для MakerNote и миниатюры в категорию пишется краткое описание,
+    а в expandable[категория][ключ] — дескриптор для expand_exif_node.
+    """
+    from PIL.ExifTags import GPSTAGS, TAGS
+
+    camera = categories["Camera Info"]
+    other = categories["Other EXIF"]
+    ifd0 = tree.get("IFD0", {})
+    make = ifd0.get(0x010F) if isinstance(ifd0.get(0x010F), str) else ""
+
+    def add(category, key, ifd, tag, value):
+        categories[category][key] = format_exif_value(tag, value)
+        if isinstance(value, bytes) and bytes_text(tag, value) is None:
+            expandable.setdefault(category, {})[key] = {
+                "kind": "binary", "source": "exif_tag", "tiff": tree["source"],
+                "ifd": ifd, "tag": tag, "length": len(value)}
+
+    for name in ("IFD0", "Exif"):
+        for tag, value in tree.get(name, {}).items():
+            if tag in POINTER_TAGS or tag == TIFF_XMP_TAG:
+                continue
+            if isinstance(value, TiffValueRef):
+                camera["MakerNote"] = f"{make or 'Unknown'} format, {value.length:,} bytes"
+                expandable.setdefault("Camera Info", {})["MakerNote"] = _descriptor(
+                    "exif_makernote", tree, value, make=make)
+                continue
+            tag_name = TAGS.get(tag) or f"Tag 0x{tag:04X}"
+            add("Camera Info" if tag_name in CAMERA_TAGS else "Other EXIF", tag_name, name, tag, value)
+
+    gps = tree.get("GPS", {})
+    for tag, value in gps.items():
+        tag_name = GPSTAGS.get(tag) or f"GPS tag 0x{tag:04X}"
+        if tag in (2, 4):
+            value = format_dms(value)
+        elif tag == 6 and isinstance(value, float):
+            value = f"{-value if gps.get(5) == 1 else value:g} m"
+        elif tag == 0 and isinstance(value, tuple):
+            value = ".".join(str(item) for item in value)
+        elif tag == 7 and isinstance(value, tuple) and len(value) == 3:
+            value = "{:02.0f}:{:02.0f}:{:02g}".format(*value)
+        else:
+            add("GPS Data", tag_name, "GPS", tag, value)
+            continue
+        categories["GPS Data"][tag_name] = value
+    coordinates = gps_coordinates(gps)
+    if coordinates:
+        categories["GPS Data"]["Coordinates"] = f"{coordinates[0]:.6f}, {coordinates[1]:.6f}"
+
+    for tag, value in tree.get("Interop", {}).items():
+        add("Other EXIF", INTEROP_TAGS.get(tag) or f"Interop tag 0x{tag:04X}", "Interop", tag, value)
+
+    ifd1 = tree.get("IFD1", {})
+    for tag, value in ifd1.items():
+        if tag not in (THUMBNAIL_OFFSET, THUMBNAIL_LENGTH):
+            add("Other EXIF", f"Thumbnail {TAGS.get(tag) or f'tag 0x{tag:04X}'}", "IFD1", tag, value)
+    offset, length = ifd1.get(THUMBNAIL_OFFSET), ifd1.get(THUMBNAIL_LENGTH)
+    if isinstance(offset, int) and isinstance(length, int) and length > 0:
+        other["Thumbnail"] = f"JPEG, {length:,} bytes"
+        expandable.setdefault("Other EXIF", {})["Thumbnail"] = _descriptor(
+            "exif_thumbnail", tree, TiffValueRef(offset, length))
+
+    if tree.get("errors"):
+        categories["Other Metadata"]["EXIF Error"] = "; ".join(tree["errors"])
+
+
+def _descriptor(kind, tree, ref, **extra):
+    return dict(kind=kind, source=tree["source"], byte_order=tree["byte_order"],
+                offset=ref.offset, length=ref.length, **extra)
+
+
+def format_exif_value(tag, value):
+    """Текст значения тега для таблицы."""
+    if isinstance(value, bytes):
+        text = bytes_text(tag, value)
+        return describe_binary(value) if text is None else text
+    if tag == USER_COMMENT and isinstance(value, tuple):
+        # Некоторые программы записывают UserComment как BYTE, а не UNDEFINED
+        return format_exif_value(tag, bytes(value))
+    if tag in XP_TAGS and isinstance(value, tuple):
+        return bytes(value).decode("utf-16-le", "replace").rstrip("\x00")
+    if isinstance(value, float):
+        if tag == EXPOSURE_TIME and 0 < value < 1 and abs(1 / value - round(1 / value)) < 0.01:
+            return f"1/{round(1 / value)}"
+        return f"{value:g}"
+    if isinstance(value, tuple):
+        text = ", ".join(format_exif_value(None, item) for item in value[:MAX_TUPLE_ITEMS])
+        if len(value) > MAX_TUPLE_ITEMS:
+            text += f", … ({len(value)} values)"
+        return text
+    return str(value)
+
+
+def bytes_text(tag, value):
+    """Текст значения типа UNDEFINED или None, если это двоичные данные."""
+    if tag == USER_COMMENT:
+        return decode_user_comment(value)
+    text = value.rstrip(b"\x00")
+    if text and len(text) <= 64 and all(32 <= byte < 127 for byte in text):
+        # Короткие текстовые значения (ExifVersion и т. п.)
+        return text.decode("ascii")
+    return None
+
+
+def decode_user_comment(data):
+    """Текст UserComment (первые восемь байтов задают кодировку) или None."""
+    prefix, body = data[:8], data[8:]
+    if prefix == b"UNICODE\x00":
+        # Порядок байтов не указывается; ASCII-текст в UTF-16BE начинается с нуля
+        encoding = "utf-16-be" if body[:1] == b"\x00" else "utf-16-le"
+    else:
+        encoding = USER_COMMENT_CHARSETS.get(prefix)
+        if encoding is None:
+            return None
+    return body.decode(encoding, "replace").rstrip("\x00 ")
+
+
+def format_dms(value):
+    """Градусы, минуты и секунды GPS в виде 55° 45' 4.48"."""
+    if not isinstance(value, tuple) or len(value) != 3:
+        return format_exif_value(None, value)
+    degrees, minutes, seconds = value
+    return f"{degrees:g}° {minutes:g}' {seconds:g}\""
+
+
+def gps_coordinates(gps):
+    """Широта и долгота в десятичных градусах или None."""
+    try:
+        latitude = sum(part / 60 ** i for i, part in enumerate(gps[2]))
+        longitude = sum(part / 60 ** i for i, part in enumerate(gps[4]))
+    except (KeyError, TypeError):
+        return None
+    if latitude != latitude or longitude != longitude:
+        return None
+    if gps.get(1) == "S":
+        latitude = -latitude
+    if gps.get(3) == "W":
+        longitude = -longitude
+    return latitude, longitude
+
+
+def read_exif_block(file_path):
+    """Блок EXIF файла (без префикса "Exif\\0\\0"), прочитанный по заголовкам."""
+    header = read_header_metadata(file_path)
+    data = header["info"].get("exif") if header else None
+    if not data:
+        raise HeaderFormatError("EXIF block not found")
+    if data.startswith(b"Exif\x00\x00"):
+        data = data[6:]
+    return data
+
+
+@contextmanager
+def _open_source(file_path, source):
+    """Открывает TIFF-структуру, на которую ссылается дескриптор."""
+    if source == "file":
+        with open(file_path, "rb") as fp:
+            yield BoundedReader(fp)
+        return
+    yield BoundedReader(io.BytesIO(read_exif_block(file_path)))
+
+
+def read_exif_tag(file_path, descriptor):
+    """Байты тега по дескриптору "binary" с источником "exif_tag"."""
+    with _open_source(file_path, descriptor["tiff"]) as reader:
+        if "makernote" in descriptor:
+            tags = _read_maker_note(reader, descriptor["makernote"])
+        else:
+            tree = _read_tree(reader, descriptor["tiff"])
+            tags = tree.get(descriptor["ifd"], {})
+    value = tags.get(descriptor["tag"])
+    if not isinstance(value, bytes):
+        raise HeaderFormatError("Tag value not found")
+    return value
+
+
+def expand_exif_node(file_path, descriptor):
+    """Разбирает MakerNote или миниатюру по дескриптору из add_exif_categories.
+
+    Возвращает список строк (ключ, значение, дескриптор вложенного узла или None).
+    """
+    with _open_source(file_path, descriptor["source"]) as reader:
+        if descriptor["kind"] == "exif_thumbnail":
+            return _thumbnail_rows(reader, descriptor)
+        return _maker_note_rows(reader, descriptor)
+
+
+def _range_descriptor(descriptor):
+    """Дескриптор "binary" для байтов MakerNote или миниатюры."""
+    return {"kind": "binary", "source": descriptor["source"],
+            "offset": descriptor["offset"], "length": descriptor["length"]}
+
+
+def _thumbnail_rows(reader, descriptor):
+    reader.seek(descriptor["offset"])
+    data = reader.read_exact(descriptor["length"])
+    rows = [("Size", f"{len(data):,} bytes", None),
+            ("Data", describe_binary(data), _range_descriptor(descriptor))]
+    try:
+        header = read_header_metadata_from_file(io.BytesIO(data))
+    except HeaderFormatError:
+        header = None
+    if header is None:
+        rows.insert(0, ("Format", "Unknown", None))
+        return rows
+    width, height = header["size"]
+    rows[:0] = [("Format", header["format"], None),
+                ("Dimensions", f"{width} × {height} pixels", None),
+                ("Mode", header["mode"] or "Unknown", None)]
+    return rows
+
+
+def _maker_note_rows(reader, descriptor):
+    """Строки тегов MakerNote. Имена тегов производителей не расшифровываются."""
+    rows = [("Raw data", f"{descriptor['length']:,} bytes", _range_descriptor(descriptor))]
+    try:
+        tags = _read_maker_note(reader, descriptor)
+    except (HeaderFormatError, struct.error):
+        tags = {}
+    if not tags:
+        rows.insert(0, ("Format", "Unrecognized", None))
+        return rows
+    for tag, value in tags.items():
+        binary = None
+        if isinstance(value, bytes) and bytes_text(tag, value) is None:
+            binary = {"kind": "binary", "source": "exif_tag", "tiff": descriptor["source"],
+                      "makernote": descriptor, "tag": tag, "length": len(value)}
+        rows.append((f"Tag 0x{tag:04X}", format_exif_value(None, value), binary))
+    return rows
+
+
+def _read_maker_note(reader, descriptor):
+    """Читает IFD внутри MakerNote по известным заголовкам производителей."""
+    start = descriptor["offset"]
+    reader.seek(start)
+    prefix = reader.read(16)
+    byte_order = descriptor["byte_order"]
+
+    if prefix.startswith(b"Nikon\x00"):
+        # Nikon (тип 3): внутри MakerNote своя TIFF-структура после 10 байтов
+        base = start + 10
+        reader.seek(base)
+        byte_order, ifd_offset = _read_tiff_header(reader)
+    else:
+        # Без известного заголовка (Canon и др.) IFD начинается сразу
+        ifd_offset, base = start, 0
+        for signature, position, relative in MAKER_NOTE_LAYOUTS:
+            if not prefix.startswith(signature):
+                continue
+            if signature == b"FUJIFILM":
+                byte_order = "<"
+                position, = struct.unpack("<L", prefix[8:12])
+            elif signature == b"Apple iOS\x00":
+                byte_order = ">"
+            else:
+                # Olympus и Pentax указывают порядок байтов прямо перед IFD
+                marker = prefix[4:6] if signature == b"AOC\x00" else prefix[position - 4:position - 2]
+                if marker in (b"II", b"MM"):
+                    byte_order = "<" if marker == b"II" else ">"
+            ifd_offset, base = (position, start) if relative else (start + position, 0)
+            break
+
+    return read_ifd(reader, ifd_offset, byte_order, base)
@@ -0,0 +1,519 @@
+"""Чтение метаданных из заголовков изображений без декодирования пикселей.
+
+Модуль разбирает контейнеры напрямую: текстовые чанки PNG (tEXt/zTXt/iTXt),
+сегменты APPn в JPEG, чанки RIFF в WebP и IFD0 в TIFF. Чтение идет
+ограниченными блоками и заканчивается, как только заканчиваются сегменты
+с метаданными, поэтому даже для многомегабайтного файла читается
+несколько килобайт.
+
+Результат повторяет то, что Pillow отдает через ``img.size``, ``img.format``,
+``img.mode``, ``img.info`` и ``img.getexif()``, и может подставляться
+вместо них в ``extract_metadata``. Сверх того для JPEG в ``info["xmp_extended"]``
+собирается расширенный XMP из нескольких сегментов APP1 (Pillow его не читает).
+"""
+
+import io
+import struct
+import zlib
+from collections import namedtuple
+
+# Предел для одного значения (текстового чанка, тега TIFF и т.п.)
+MAX_VALUE_BYTES = 64 * 1024 * 1024
+
+# Количество элементов в одном IFD, больше которого файл считается поврежденным
+MAX_IFD_ENTRIES = 4096
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+PNG_MODES = {
+    (1, 0): "1", (2, 0): "L", (4, 0): "L", (8, 0): "L", (16, 0): "I;16",
+    (8, 2): "RGB", (16, 2): "RGB",
+    (1, 3): "P", (2, 3): "P", (4, 3): "P", (8, 3): "P",
+    (8, 4): "LA", (16, 4): "LA",
+    (8, 6): "RGBA", (16, 6): "RGBA",
+}
+
+JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+# Маркеры SOFn (кроме DHT, JPG и DAC, которые делят с ними диапазон)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Размеры типов значений TIFF в байтах
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2,
+                   9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+# Названия сжатия TIFF в том виде, в каком их отдает Pillow в img.info
+TIFF_COMPRESSION = {1: "raw", 2: "tiff_ccitt", 3: "group3", 4: "group4",
+                    5: "tiff_lzw", 6: "tiff_jpeg", 7: "jpeg", 8: "tiff_adobe_deflate",
+                    32771: "tiff_raw_16", 32773: "packbits", 32809: "tiff_thunderscan",
+                    32946: "tiff_deflate", 34676: "tiff_sgilog", 34677: "tiff_sgilog24",
+                    34925: "lzma", 50000: "zstd", 50001: "webp"}
+
+# Тег TIFF с пакетом XMP (XMLPacket)
+TIFF_XMP_TAG = 700
+
+# Префикс сегмента APP1 с продолжением пакета XMP, не поместившегося в 64 КБ
+JPEG_EXTENDED_XMP = b"http://ns.adobe.com/xmp/extension/\x00"
+
+TIFF_TYPE_FORMATS = {1: "B", 3: "H", 4: "L", 6: "b", 8: "h", 9: "l",
+                     11: "f", 12: "d", 13: "L"}
+
+
+class HeaderFormatError(ValueError):
+    """Файл поврежден или не соответствует ожидаемой структуре контейнера."""
+
+
+# Значение тега, которое read_ifd не стал читать (см. ``deferred``):
+# смещение относительно начала TIFF-структуры и длина в байтах
+TiffValueRef = namedtuple("TiffValueRef", "offset length")
+
+
+class BoundedReader:
+    """Обертка над файлом, которая считает прочитанные байты."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.bytes_read = 0
+
+    def read(self, size):
+        if size < 0 or size > MAX_VALUE_BYTES:
+            raise HeaderFormatError(f"Refusing to read {size} bytes")
+        data = self.fp.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def read_exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise HeaderFormatError("Unexpected end of file")
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.fp.seek(offset, whence)
+
+    def skip(self, size):
+        # Пропускаем данные без чтения, только сдвигаем позицию
+        self.fp.seek(size, io.SEEK_CUR)
+
+    def tell(self):
+        return self.fp.tell()
+
+
+def read_header_metadata(file_path):
+    """Читает метаданные из заголовка файла.
+
+    Возвращает словарь с ключами "format", "size", "mode", "info", "exif"
+    и "bytes_read" или None, если формат не поддерживается и нужно
+    воспользоваться Pillow.
+    """
+    with open(file_path, "rb") as fp:
+        return read_header_metadata_from_file(fp)
+
+
+def read_header_metadata_from_file(fp):
+    """То же, что read_header_metadata, но для уже открытого двоичного файла."""
+    reader = BoundedReader(fp)
+    prefix = reader.read(16)
+    reader.seek(0)
+
+    try:
+        if prefix.startswith(PNG_SIGNATURE):
+            result = _read_png(reader)
+        elif prefix.startswith(b"\xff\xd8"):
+            result = _read_jpeg(reader)
+        elif prefix[:4] == b"RIFF" and prefix[8:12] == b"WEBP":
+            result = _read_webp(reader)
+        elif prefix[:4] in (b"II*\x00", b"MM\x00*"):
+            result = _read_tiff(reader)
+        else:
+            return None
+    except (struct.error, IndexError, zlib.error) as e:
+        raise HeaderFormatError(f"Malformed header: {e}") from e
+
+    result["bytes_read"] = reader.bytes_read
+    return result
+
+
+def parse_exif(data):
+    """Разбирает блок EXIF (с префиксом "Exif\\0\\0" или без) в словарь тегов IFD0."""
+    if data.startswith(b"Exif\x00\x00"):
+        data = data[6:]
+    if len(data) < 8:
+        return {}
+    reader = BoundedReader(io.BytesIO(data))
+    byte_order, ifd_offset = _read_tiff_header(reader)
+    return read_ifd(reader, ifd_offset, byte_order)
+
+
+def read_ifd(reader, offset, byte_order, base=0, deferred=()):
+    """Читает один IFD и возвращает словарь {tag_id: значение}.
+
+    ``base`` — смещение начала TIFF-структуры внутри потока: значения
+    в IFD адресуются относительно него. Значения тегов из ``deferred``
+    не читаются: вместо них возвращается TiffValueRef.
+    """
+    reader.seek(base + offset)
+    count, = struct.unpack(byte_order + "H", reader.read_exact(2))
+    if count > MAX_IFD_ENTRIES:
+        raise HeaderFormatError(f"IFD with {count} entries")
+
+    entries = reader.read_exact(count * 12)
+    tags = {}
+    for i in range(count):
+        tag, value_type, value_count, raw = struct.unpack(
+            byte_order + "HHL4s", entries[i * 12:i * 12 + 12])
+        item_size = TIFF_TYPE_SIZES.get(value_type)
+        if item_size is None:
+            continue
+
+        size = item_size * value_count
+        if tag in deferred:
+            if size <= 4:
+                # Значение лежит прямо в записи IFD, после тега, типа и счетчика
+                tags[tag] = TiffValueRef(offset + 2 + i * 12 + 8, size)
+            else:
+                tags[tag] = TiffValueRef(struct.unpack(byte_order + "L", raw)[0], size)
+            continue
+        if size <= 4:
+            data = raw[:size]
+        else:
+            value_offset, = struct.unpack(byte_order + "L", raw)
+            position = reader.tell()
+            reader.seek(base + value_offset)
+            data = reader.read(size)
+            reader.seek(position)
+            if len(data) != size:
+                continue
+
+        tags[tag] = _decode_tiff_value(value_type, value_count, data, byte_order)
+    return tags
+
+
+def _decode_tiff_value(value_type, value_count, data, byte_order):
+    """Преобразует сырое значение тега TIFF в питоновский объект, как это делает Pillow."""
+    if value_type == 2:
+        return data.split(b"\x00", 1)[0].decode("utf-8", "replace")
+    if value_type == 7:
+        return data
+
+    if value_type in (5, 10):
+        fmt = byte_order + ("L" if value_type == 5 else "l") * (2 * value_count)
+        numbers = struct.unpack(fmt, data)
+        values = tuple(numerator / denominator if denominator else float("nan")
+                       for numerator, denominator in zip(numbers[::2], numbers[1::2]))
+    else:
+        fmt = byte_order + TIFF_TYPE_FORMATS[value_type] * value_count
+        values = struct.unpack(fmt, data)
+
+    if len(values) == 1:
+        return values[0]
+    return values
+
+
+def _read_tiff_header(reader):
+    header = reader.read_exact(8)
+    if header[:2] == b"II":
+        byte_order = "<"
+    elif header[:2] == b"MM":
+        byte_order = ">"
+    else:
+        raise HeaderFormatError("Invalid TIFF byte order")
+    magic, ifd_offset = struct.unpack(byte_order + "HL", header[2:])
+    if magic != 42:
+        raise HeaderFormatError("Invalid TIFF magic number")
+    return byte_order, ifd_offset
+
+
+def _read_png(reader):
+    reader.read_exact(8)
+    result = {"format": "PNG", "size": (0, 0), "mode": None, "info": {}, "exif": {}}
+    info = result["info"]
+
+    while True:
+        header = reader.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">L4s", header)
+
+        # Как и Pillow при открытии, дальше первого IDAT не идем
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+
+        if chunk_type == b"IHDR":
+            data = reader.read_exact(length)
+            width, height, bit_depth, color_type = struct.unpack(">LLBB", data[:10])
+            result["size"] = (width, height)
+            result["mode"] = PNG_MODES.get((bit_depth, color_type))
+        elif chunk_type == b"tEXt":
+            key, _, value = reader.read_exact(length).partition(b"\x00")
+            info[key.decode("latin-1")] = value.decode("latin-1")
+        elif chunk_type == b"zTXt":
+            key, _, value = reader.read_exact(length).partition(b"\x00")
+            info[key.decode("latin-1")] = _decompress(value[1:]).decode("latin-1")
+        elif chunk_type == b"iTXt":
+            parsed = _parse_itxt(reader.read_exact(length))
+            if parsed is not None:
+                key, value = parsed
+                info[key] = value
+                if key == "XML:com.adobe.xmp":
+                    info["xmp"] = value.encode("utf-8")
+        elif chunk_type == b"eXIf":
+            data = reader.read_exact(length)
+            info["exif"] = b"Exif\x00\x00" + data
+            try:
+                result["exif"] = parse_exif(data)
+            except (HeaderFormatError, struct.error):
+                result["exif"] = {}
+        elif chunk_type == b"iCCP":
+            _, _, value = reader.read_exact(length).partition(b"\x00")
+            info["icc_profile"] = _decompress(value[1:])
+        elif chunk_type == b"gAMA":
+            info["gamma"] = struct.unpack(">L", reader.read_exact(4))[0] / 100000.0
+            reader.skip(length - 4)
+        elif chunk_type == b"pHYs":
+            px, py, unit = struct.unpack(">LLB", reader.read_exact(9))
+            if unit == 1:
+                info["dpi"] = (px * 0.0254, py * 0.0254)
+            reader.skip(length - 9)
+        else:
+            reader.skip(length)
+
+        # CRC
+        reader.skip(4)
+
+    return result
+
+
+def _parse_itxt(data):
+    key, _, rest = data.partition(b"\x00")
+    compressed, method = rest[0], rest[1]
+    language, _, rest = rest[2:].partition(b"\x00")
+    translated, _, text = rest.partition(b"\x00")
+    if compressed:
+        if method != 0:
+            # Определен только метод 0 (zlib); Pillow такие чанки пропускает
+            return None
+        text = _decompress(text)
+    return key.decode("latin-1"), text.decode("utf-8", "replace")
+
+
+def _decompress(data):
+    # Ограничиваем размер распакованных данных так же, как чтение с диска
+    decompressor = zlib.decompressobj()
+    value = decompressor.decompress(data, MAX_VALUE_BYTES)
+    if decompressor.unconsumed_tail:
+        raise HeaderFormatError("Decompressed chunk is too large")
+    return value
+
+
+def _read_jpeg(reader):
+    reader.read_exact(2)
+    result = {"format": "JPEG", "size": (0, 0), "mode": None, "info": {}, "exif": {}}
+    info = result["info"]
+    icc_chunks = []
+    xmp_chunks = []
+
+    while True:
+        marker = reader.read(2)
+        if len(marker) < 2:
+            break
+        if marker[0] != 0xFF:
+            raise HeaderFormatError("Invalid JPEG marker")
+
+        code = marker[1]
+        # Заполняющие байты 0xFF между маркерами
+        while code == 0xFF:
+            code = reader.read_exact(1)[0]
+
+        # Маркеры без длины
+        if code in (0x01,) or 0xD0 <= code <= 0xD7:
+            continue
+        # Начало скана или конец файла: метаданные закончились
+        if code in (0xDA, 0xD9):
+            break
+
+        length, = struct.unpack(">H", reader.read_exact(2))
+        length -= 2
+
+        if code in JPEG_SOF_MARKERS:
+            data = reader.read_exact(length)
+            height, width, components = struct.unpack(">HHB", data[1:6])
+            result["size"] = (width, height)
+            result["mode"] = JPEG_MODES.get(components)
+            if code in (0xC2, 0xC6, 0xCA, 0xCE):
+                info["progressive"] = info["progression"] = 1
+        elif 0xE0 <= code <= 0xEF or code == 0xFE:
+            data = reader.read_exact(length)
+            _parse_jpeg_app(code, data, result, icc_chunks, xmp_chunks)
+        else:
+            reader.skip(length)
+
+    if icc_chunks:
+        icc_chunks.sort()
+        info["icc_profile"] = b"".join(chunk for _, chunk in icc_chunks)
+    if xmp_chunks:
+        info["xmp_extended"] = _join_extended_xmp(xmp_chunks, info.get("xmp", b""))
+
+    # Как и Pillow, при отсутствии плотности в JFIF берем ее из EXIF
+    if "dpi" not in info and "exif" in info:
+        exif = result["exif"]
+        dpi = exif.get(0x011A)
+        if isinstance(dpi, (int, float)) and dpi == dpi and 0x0128 in exif:
+            if exif[0x0128] == 3:
+                dpi *= 2.54
+            if float(dpi).is_integer():
+                dpi = int(dpi)
+            info["dpi"] = (dpi, dpi)
+        else:
+            info["dpi"] = (72, 72)
+
+    return result
+
+
+def _parse_jpeg_app(code, data, result, icc_chunks, xmp_chunks):
+    info = result["info"]
+    if code == 0xE0 and data.startswith(b"JFIF\x00") and len(data) >= 12:
+        version, unit, x_density, y_density = struct.unpack(">HBHH", data[5:12])
+        info["jfif"] = version
+        info["jfif_version"] = divmod(version, 256)
+        info["jfif_unit"] = unit
+        info["jfif_density"] = (x_density, y_density)
+        if unit == 1:
+            info["dpi"] = (x_density, y_density)
+        elif unit == 2:
+            info["dpi"] = (x_density * 2.54, y_density * 2.54)
+    elif code == 0xE1 and data.startswith(b"Exif\x00\x00"):
+        if "exif" in info:
+            info["exif"] += data[6:]
+        else:
+            info["exif"] = data
+            try:
+                result["exif"] = parse_exif(data)
+            except (HeaderFormatError, struct.error):
+                result["exif"] = {}
+    elif code == 0xE1 and data.startswith(b"http://ns.adobe.com/xap/1.0/\x00"):
+        info["xmp"] = data.split(b"\x00", 1)[1]
+    elif code == 0xE1 and data.startswith(JPEG_EXTENDED_XMP) and len(data) >= 75:
+        # GUID пакета (32 символа), полная длина и смещение куска в пакете
+        guid = data[35:67]
+        offset, = struct.unpack(">L", data[71:75])
+        xmp_chunks.append((guid, offset, data[75:]))
+    elif code == 0xE2 and data.startswith(b"ICC_PROFILE\x00") and len(data) >= 14:
+        icc_chunks.append((data[12], data[14:]))
+    elif code == 0xEE and data.startswith(b"Adobe") and len(data) >= 12:
+        info["adobe"] = struct.unpack(">H", data[5:7])[0]
+        info["adobe_transform"] = data[11]
+    elif code == 0xFE:
+        info["comment"] = data
+
+
+def _join_extended_xmp(chunks, main_packet):
+    """Собирает расширенный XMP из кусков; GUID берется из основного пакета."""
+    guids = [guid for guid, _, _ in chunks]
+    guid = next((guid for guid in guids if guid in main_packet), guids[0])
+    parts = sorted((offset, data) for chunk_guid, offset, data in chunks if chunk_guid == guid)
+    return b"".join(data for _, data in parts)
+
+
+def _read_webp(reader):
+    header = reader.read_exact(12)
+    riff_size, = struct.unpack("<L", header[4:8])
+    end = riff_size + 8
+    result = {"format": "WEBP", "size": (0, 0), "mode": "RGB", "info": {}, "exif": {}}
+    info = result["info"]
+
+    while reader.tell() + 8 <= end:
+        chunk = reader.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_type, length = struct.unpack("<4sL", chunk)
+        padded = length + (length & 1)
+
+        if chunk_type == b"VP8X":
+            data = reader.read_exact(10)
+            flags = data[0]
+            width = 1 + int.from_bytes(data[4:7], "little")
+            height = 1 + int.from_bytes(data[7:10], "little")
+            result["size"] = (width, height)
+            result["mode"] = "RGBA" if flags & 0x10 else "RGB"
+            reader.skip(padded - 10)
+        elif chunk_type == b"VP8 " and result["size"] == (0, 0):
+            data = reader.read_exact(10)
+            width, height = struct.unpack("<HH", data[6:10])
+            result["size"] = (width & 0x3FFF, height & 0x3FFF)
+            reader.skip(padded - 10)
+        elif chunk_type == b"VP8L" and result["size"] == (0, 0):
+            data = reader.read_exact(5)
+            bits = int.from_bytes(data[1:5], "little")
+            result["size"] = ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+            result["mode"] = "RGBA" if bits & (1 << 28) else "RGB"
+            reader.skip(padded - 5)
+        elif chunk_type == b"ICCP":
+            info["icc_profile"] = reader.read_exact(length)
+            reader.skip(padded - length)
+        elif chunk_type == b"EXIF":
+            data = reader.read_exact(length)
+            info["exif"] = data
+            try:
+                result["exif"] = parse_exif(data)
+            except (HeaderFormatError, struct.error):
+                result["exif"] = {}
+            reader.skip(padded - length)
+        elif chunk_type == b"XMP ":
+            info["xmp"] = reader.read_exact(length)
+            reader.skip(padded - length)
+        else:
+            # Кадры изображения и анимации пропускаем без чтения
+            reader.skip(padded)
+
+    return result
+
+
+def _read_tiff(reader):
+    byte_order, ifd_offset = _read_tiff_header(reader)
+    tags = read_ifd(reader, ifd_offset, byte_order, deferred=(TIFF_XMP_TAG,))
+
+    width = tags.get(256, 0)
+    height = tags.get(257, 0)
+    samples = tags.get(277, 1)
+    photometric = tags.get(262)
+    bits = tags.get(258, 1)
+    if isinstance(bits, tuple):
+        bits = bits[0]
+
+    if photometric in (0, 1):
+        mode = "1" if bits == 1 else ("I;16" if bits == 16 else "L")
+    elif photometric == 3:
+        mode = "P"
+    elif photometric == 5:
+        mode = "CMYK"
+    elif samples >= 4:
+        mode = "RGBA"
+    else:
+        mode = "RGB"
+
+    info = {"compression": TIFF_COMPRESSION.get(tags.get(259, 1), "raw")}
+    # Разрешение по правилам Pillow: без тега ResolutionUnit значения
+    # считаются dpi и дублируются в "resolution", а для единицы 1
+    # (без абсолютной меры) отдается только "resolution"
+    x_resolution = tags.get(282, 1)
+    y_resolution = tags.get(283, 1)
+    if x_resolution and y_resolution:
+        unit = tags.get(296)
+        if unit == 2:
+            info["dpi"] = (x_resolution, y_resolution)
+        elif unit == 3:
+            info["dpi"] = (x_resolution * 2.54, y_resolution * 2.54)
+        elif unit is None:
+            info["dpi"] = (x_resolution, y_resolution)
+            info["resolution"] = (x_resolution, y_resolution)
+        else:
+            info["resolution"] = (x_resolution, y_resolution)
+    if TIFF_XMP_TAG in tags:
+        # Как и Pillow, пакет XMP отдаем байтами, а не кортежем чисел
+        reader.seek(tags[TIFF_XMP_TAG].offset)
+        info["xmp"] = tags[TIFF_XMP_TAG] = reader.read_exact(tags[TIFF_XMP_TAG].length)
+
+    return {"format": "TIFF", "size": (width, height), "mode": mode,
+            "info": info, "exif": tags}
@@ -0,0 +1,205 @@
+"""Разбор блока "parameters" Stable Diffusion (формат AUTOMATIC1111 и совместимых).
+
+Блок состоит из промпта, необязательной строки "Negative prompt:" и
+последней строки настроек вида "Steps: 20, Sampler: Euler a, ...".
+Строка настроек со значениями в кавычках или JSON разбирается одним
+проходом скомпилированного выражения, поэтому значения с запятыми и
+экранированием (Lora hashes: "a: 1, b: 2", ADetailer prompt: "...") не
+разрываются; строка без них просто делится по запятым.
+"""
+
+import functools
+import json
+import re
+
+# Пара "ключ: значение"; значение — строка в кавычках с экранированием,
+# JSON-объект без вложенности (Hashes: {...}) или текст до следующей запятой.
+# Пробелы вокруг ключа в группу не попадают.
+SETTING_PATTERN = re.compile(
+    r'\s*([^,:"{}]*[^,:"{}\s])\s*:\s*("[^"\\]*(?:\\.[^"\\]*)*"|\{[^{}]*\}|[^,]*)'
+)
+
+# Последняя строка считается строкой настроек, если в ней не меньше
+# стольких пар "ключ: значение" (то же правило, что в AUTOMATIC1111)
+MIN_SETTINGS = 3
+
+NEGATIVE_PROMPT_PREFIX = "Negative prompt:"
+
+INT_FIELDS = {"Steps", "Seed", "Subseed", "Clip skip", "Hires steps", "ENSD", "Batch size", "Batch pos",
+              "Mask blur"}
+FLOAT_FIELDS = {"CFG scale", "Denoising strength", "Subseed strength", "Hires upscale",
+                "Image CFG scale", "Distilled CFG Scale", "Eta"}
+
+# Списки "имя: хэш, имя: хэш" в кавычках
+HASH_LIST_FIELDS = {"Lora hashes", "TI hashes", "Hypernet hashes"}
+# Словарь хэшей в JSON
+HASH_JSON_FIELDS = {"Hashes"}
+
+MODEL_FIELDS = {"Model", "Model hash", "VAE", "VAE hash", "Hashes"} | HASH_LIST_FIELDS
+OTHER_PREFIXES = ("adetailer", "tipo")
+
+
+def empty_parameters():
+    """Пустая структура параметров в том виде, в каком ее ждет интерфейс."""
+    return {
+        "Prompt": [],           # Основной промпт и теги
+        "Negative prompt": [],  # Негативный промпт
+        "Seed": [],            # Сид генерации
+        "Model Info": {},      # Информация о модели
+        "Generation Parameters": {},  # Параметры генерации
+        "Other Parameters": {}  # Прочие параметры
+    }
+
+
+def unquote(value):
+    """Снимает кавычки и экранирование со значения, записанного как JSON-строка."""
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        if "\\" not in value:
+            return value[1:-1]
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value[1:-1]
+    return value
+
+
+def parse_hash_list(value):
+    """Разбирает 'имя: хэш, имя: хэш' в словарь."""
+    hashes = {}
+    for item in value.split(","):
+        name, sep, digest = item.partition(":")
+        if sep:
+            hashes[name.strip()] = digest.strip()
+    return hashes
+
+
+def parse_hash_json(value):
+    """Разбирает словарь хэшей, записанный как JSON-объект."""
+    hashes = json.loads(value)
+    if not isinstance(hashes, dict):
+        raise ValueError("Hashes is not a JSON object")
+    return hashes
+
+
+# Преобразователь для каждого типизированного ключа; остальные значения остаются строками
+SETTING_CONVERTERS = {
+    **dict.fromkeys(INT_FIELDS, int),
+    **dict.fromkeys(FLOAT_FIELDS, float),
+    **dict.fromkeys(HASH_JSON_FIELDS, parse_hash_json),
+    **dict.fromkeys(HASH_LIST_FIELDS, parse_hash_list),
+}
+
+
+def parse_settings(line):
+    """Разбирает строку настроек в упорядоченный словарь типизированных значений.
+
+    Значение, которое не удалось привести к типу, остается строкой.
+    """
+    if '"' in line or "{" in line or "}" in line:
+        settings = dict(SETTING_PATTERN.findall(line))
+        for key in [key for key, value in settings.items() if value[:1] == '"']:
+            settings[key] = unquote(settings[key])
+    else:
+        # Без кавычек и скобок JSON запятая всегда разделяет пары: обходимся без
+        # регулярного выражения (результат тот же, что у SETTING_PATTERN)
+        settings = {}
+        for item in line.split(","):
+            key, sep, value = item.partition(":")
+            while sep:
+                key = key.strip()
+                if key:
+                    settings[key] = value.lstrip()
+                    break
+                # Пустой ключ пропускается, как и в SETTING_PATTERN
+                key, sep, value = value.partition(":")
+
+    # Преобразуются только типизированные ключи, остальные значения уже строки
+    for key in SETTING_CONVERTERS.keys() & settings.keys():
+        try:
+            settings[key] = SETTING_CONVERTERS[key](settings[key])
+        except ValueError:
+            pass
+    return settings
+
+
+@functools.lru_cache(maxsize=1024)
+def setting_category(key):
+    """Категория, в которую попадает настройка с данным ключом."""
+    if key == "Seed":
+        return "Seed"
+    if key in MODEL_FIELDS:
+        return "Model Info"
+    if key.lower().startswith(OTHER_PREFIXES):
+        return "Other Parameters"
+    return "Generation Parameters"
+
+
+def strip_leading_colons(text):
+    while text.startswith(":"):
+        text = text[1:].strip()
+    return text
+
+
+def parse_parameters(text, parameters=None):
+    """Разбирает блок parameters и раскладывает значения по категориям.
+
+    Seed попадает в "Seed", модель, VAE и хэши — в "Model Info",
+    настройки ADetailer и TIPO — в "Other Parameters", остальное —
+    в "Generation Parameters".
+    """
+    if parameters is None:
+        parameters = empty_parameters()
+
+    lines = text.strip().split("\n")
+    settings = {}
+    if lines:
+        settings = parse_settings(lines[-1])
+        if len(settings) >= MIN_SETTINGS:
+            lines.pop()
+        else:
+            settings = {}
+
+    prompt_lines = []
+    negative_lines = []
+    tipo_lines = []
+    target = prompt_lines
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(NEGATIVE_PROMPT_PREFIX):
+            target = negative_lines
+            line = line[len(NEGATIVE_PROMPT_PREFIX):].strip()
+        elif line[:4].lower() == "tipo":
+            # Параметры расширения TIPO пишутся отдельными строками
+            tipo_lines.append(line)
+            continue
+        if line:
+            target.append(line)
+
+    prompt = strip_leading_colons("\n".join(prompt_lines))
+    if prompt:
+        parameters["Prompt"] = [prompt]
+    negative_prompt = strip_leading_colons("\n".join(negative_lines))
+    if negative_prompt:
+        parameters["Negative prompt"] = [negative_prompt]
+    if tipo_lines:
+        parameters["Other Parameters"]["TIPO Parameters"] = "\n".join(tipo_lines)
+
+    for key, value in settings.items():
+        category = setting_category(key)
+        if category == "Seed":
+            parameters["Seed"].append(value)
+        else:
+            parameters[category][key] = value
+
+    return parameters
+
+
+def format_parameter_value(value):
+    """Строковое представление типизированного значения для таблицы и экспорта в текст."""
+    if isinstance(value, dict):
+        return "\n".join(f"{key}: {item}" for key, item in value.items())
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,168 @@
+"""Замеры этапов загрузки файла для режима --profile.
+
+Каждая загрузка получает FileProfile: длительности этапов (stat, разбор
+заголовка или открытие Pillow, параметры, EXIF, декодирование превью,
+заполнение таблицы и т. д.) и счетчики (попадания и промахи кэша,
+прочитанные байты). Когда профилирование выключено, вместо него
+передается NULL_PROFILE, замеры которого ничего не делают.
+
+Profiler собирает профили всех файлов, печатает строку на каждый файл
+и в конце — сводку с перцентилями по этапам.
+"""
+
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class FileProfile:
+    """Длительности этапов (в секундах) и счетчики загрузки одного файла."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    def __bool__(self):
+        return True
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        """Время от создания профиля (начала загрузки) до текущего момента."""
+        return time.perf_counter() - self.started
+
+
+class NullProfile:
+    """Профиль-заглушка: ничего не замеряет и ложен в условиях."""
+
+    path = None
+    _span = nullcontext()
+
+    def __bool__(self):
+        return False
+
+    def span(self, name):
+        return self._span
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_PROFILE = NullProfile()
+
+
+class CountingFile(io.FileIO):
+    """Файл, считающий прочитанные с диска байты (bytes_read)."""
+
+    bytes_read = 0
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data or b"")
+        return data
+
+    def readall(self):
+        data = super().readall()
+        self.bytes_read += len(data)
+        return data
+
+
+def open_counted(file_path):
+    """Открывает файл на чтение через CountingFile; возвращает (буферизованный файл, счетчик).
+
+    Pillow, открытый из объекта файла, а не по пути, не использует mmap,
+    поэтому в режиме профилирования чтение может идти немного иначе.
+    """
+    raw = CountingFile(file_path, "rb")
+    return io.BufferedReader(raw), raw
+
+
+def percentile(values, fraction):
+    """Значение перцентиля fraction (0..1) для отсортированного списка."""
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class Profiler:
+    """Собирает профили загрузок и печатает их в stream (по умолчанию stderr)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.started = time.perf_counter()
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def start(self, path):
+        return FileProfile(path)
+
+    def mark(self, event):
+        """Печатает время события от создания профилировщика (например, показа окна)."""
+        elapsed = time.perf_counter() - self.started
+        print(f"{event}: {elapsed * 1000:.1f} ms", file=self.stream, flush=True)
+
+    def finish(self, profile):
+        """Завершает профиль файла и печатает его строку."""
+        profile.add_time("total", profile.elapsed())
+        with self.lock:
+            self.profiles.append(profile)
+        print(self.format_profile(profile), file=self.stream, flush=True)
+
+    @staticmethod
+    def format_profile(profile):
+        stages = ", ".join(f"{name} {seconds * 1000:.1f}"
+                           for name, seconds in profile.stages.items() if name != "total")
+        line = f"{profile.path}: {profile.stages['total'] * 1000:.1f} ms [{stages}]"
+        if profile.counters:
+            line += " " + ", ".join(f"{name}={value}" for name, value in profile.counters.items())
+        return line
+
+    def report(self):
+        """Сводка по всем файлам: перцентили этапов в миллисекундах и суммы счетчиков."""
+        import statistics
+
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return "No files were profiled"
+
+        samples = {}
+        counters = {}
+        for profile in profiles:
+            for name, seconds in profile.stages.items():
+                samples.setdefault(name, []).append(seconds * 1000)
+            for name, value in profile.counters.items():
+                counters[name] = counters.get(name, 0) + value
+
+        lines = [f"Profiled {len(profiles)} files",
+                 f"{'Stage':16} {'Count':>6} {'Median':>9} {'p90':>9} {'p99':>9} {'Max':>9} {'Total':>10}"]
+        for name, values in samples.items():
+            values.sort()
+            lines.append(f"{name:16} {len(values):>6} {statistics.median(values):>9.2f} "
+                         f"{percentile(values, 0.9):>9.2f} {percentile(values, 0.99):>9.2f} "
+                         f"{values[-1]:>9.2f} {sum(values):>10.1f}")
+        for name, value in counters.items():
+            lines.append(f"{name}: {value:,}")
+        return "\n".join(lines)
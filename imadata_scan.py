@@ -0,0 +1,261 @@
+"""Быстрое перечисление папок с изображениями и инкрементальные пересканирования.
+
+Папки читаются через os.scandir: тип записи берется из DirEntry без
+отдельного stat, а размер и mtime — из DirEntry.stat(), который кэшируется
+в самой записи (в Windows он вообще приходит вместе со списком).
+
+Для каждой папки сохраняется снимок: mtime папки, имена подпапок и
+(имя, inode, размер, mtime_ns) каждого изображения. При повторном
+сканировании папка, mtime которой не изменился, не читается вовсе —
+для нее делается один stat, а не по stat на файл. Изменение mtime папки
+означает, что в ней добавляли, удаляли или переименовывали записи;
+файл, перезаписанный на месте без переименования, ее mtime не меняет,
+для таких случаев есть full=True.
+
+Снимку папки, mtime которой отстоит от момента чтения меньше чем на
+MTIME_GRANULARITY_NS, не доверяют: изменение в ту же секунду (или в тот же
+тик файловой системы с грубым mtime) могло не сдвинуть mtime, и такая папка
+читается заново при следующем сканировании.
+
+Из командной строки (снимки хранятся в отдельном файле):
+    python imadata_scan.py /data/outputs
+    python imadata_scan.py /data/outputs --full
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from imadata_cache import default_cache_path
+from imadata_core import IMAGE_EXTENSIONS
+
+# Точность mtime с запасом (FAT — 2 секунды, ext3 и HFS+ — 1 секунда)
+MTIME_GRANULARITY_NS = 2 * 10 ** 9
+
+
+def default_snapshot_path():
+    """Файл снимков для сканирования из командной строки (рядом с кэшем метаданных)."""
+    return os.path.join(os.path.dirname(default_cache_path()), "ImageMetadataViewer.scan.sqlite3")
+
+
+def read_directory(directory, extensions=IMAGE_EXTENSIONS):
+    """Читает папку одним scandir.
+
+    Возвращает (имена подпапок, {имя: (inode, размер, mtime_ns)} для изображений).
+    Символические ссылки на папки не обходятся.
+    """
+    subdirs = []
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    file_info = entry.stat()
+                    files[entry.name] = (entry.inode(), file_info.st_size, file_info.st_mtime_ns)
+            except OSError:
+                # Файл удален между чтением списка и stat
+                continue
+    subdirs.sort()
+    return subdirs, files
+
+
+class DirectorySnapshots:
+    """Снимки папок в SQLite и вычисление изменений между сканированиями.
+
+    rescan() только вычисляет изменения; новые снимки записываются в базу
+    вызовом save(), чтобы прерванная обработка изменений не потерялась.
+    Снимки можно хранить в той же базе, что и данные, которые по ним
+    обновляются (например, поисковый индекс), — тогда они не расходятся.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_snapshot_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS scan_dirs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                scanned_ns INTEGER NOT NULL DEFAULT 0,
+                subdirs TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS scan_files (
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                PRIMARY KEY (dir, name)
+            ) WITHOUT ROWID;
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(scan_dirs)")]
+        if "scanned_ns" not in columns:
+            # Снимки прежней версии без времени чтения: при нуле папки будут перечитаны
+            self.connection.execute(
+                "ALTER TABLE scan_dirs ADD COLUMN scanned_ns INTEGER NOT NULL DEFAULT 0")
+        # Папки, прочитанные последним rescan: путь -> (mtime_ns, время чтения,
+        # подпапки, файлы) или None для исчезнувшей папки
+        self._pending = {}
+
+    def _stored_files(self, directory):
+        rows = self.connection.execute(
+            "SELECT name, inode, size, mtime_ns FROM scan_files WHERE dir = ?", (directory,))
+        return {name: (inode, size, mtime_ns) for name, inode, size, mtime_ns in rows}
+
+    def _stored_dirs_under(self, root):
+        """Сохраненные папки root и все вложенные в нее."""
+        prefix = root.rstrip(os.sep) + os.sep
+        rows = self.connection.execute(
+            "SELECT path FROM scan_dirs WHERE path = ? OR (path >= ? AND path < ?)",
+            (root, prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+        return [path for path, in rows]
+
+    def rescan(self, root, full=False):
+        """Сравнивает дерево папок с сохраненными снимками.
+
+        Возвращает словарь: "added" и "changed" — списки (путь, размер, mtime_ns),
+        "removed" — список путей, "scanned" и "skipped" — сколько папок было
+        прочитано и пропущено без чтения. При full=True читаются все папки.
+        """
+        root = os.path.abspath(root)
+        changes = {"added": [], "changed": [], "removed": [], "scanned": 0, "skipped": 0}
+        visited = set()
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            visited.add(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                visited.discard(directory)
+                continue
+
+            row = self.connection.execute(
+                "SELECT mtime_ns, scanned_ns, subdirs FROM scan_dirs WHERE path = ?",
+                (directory,)).fetchone()
+            if (row is not None and row[0] == mtime_ns and not full
+                    and row[1] - mtime_ns >= MTIME_GRANULARITY_NS):
+                changes["skipped"] += 1
+                stack.extend(os.path.join(directory, name) for name in reversed(json.loads(row[2])))
+                continue
+
+            # Время берется до чтения: изменения во время чтения окажутся
+            # в пределах MTIME_GRANULARITY_NS, и папка будет перечитана
+            scanned_ns = time.time_ns()
+            try:
+                subdirs, files = read_directory(directory)
+            except OSError:
+                visited.discard(directory)
+                continue
+            changes["scanned"] += 1
+            stored = self._stored_files(directory)
+            for name, (inode, size, file_mtime_ns) in files.items():
+                old = stored.get(name)
+                if old is None:
+                    changes["added"].append((os.path.join(directory, name), size, file_mtime_ns))
+                elif old != (inode, size, file_mtime_ns):
+                    changes["changed"].append((os.path.join(directory, name), size, file_mtime_ns))
+            changes["removed"].extend(os.path.join(directory, name)
+                                      for name in stored if name not in files)
+            self._pending[directory] = (mtime_ns, scanned_ns, subdirs, files)
+            stack.extend(os.path.join(directory, name) for name in reversed(subdirs))
+
+        # Папки из снимков, которых больше нет (или которые стали недоступны)
+        for directory in self._stored_dirs_under(root):
+            if directory not in visited:
+                changes["removed"].extend(os.path.join(directory, name)
+                                          for name in self._stored_files(directory))
+                self._pending[directory] = None
+
+        for key in ("added", "changed"):
+            changes[key].sort()
+        changes["removed"].sort()
+        return changes
+
+    def save(self):
+        """Записывает снимки папок, прочитанных rescan, одной транзакцией."""
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for directory, snapshot in self._pending.items():
+                connection.execute("DELETE FROM scan_files WHERE dir = ?", (directory,))
+                if snapshot is None:
+                    connection.execute("DELETE FROM scan_dirs WHERE path = ?", (directory,))
+                    continue
+                mtime_ns, scanned_ns, subdirs, files = snapshot
+                connection.execute(
+                    "INSERT OR REPLACE INTO scan_dirs (path, mtime_ns, scanned_ns, subdirs) "
+                    "VALUES (?, ?, ?, ?)",
+                    (directory, mtime_ns, scanned_ns, json.dumps(subdirs, ensure_ascii=False)))
+                connection.executemany(
+                    "INSERT INTO scan_files (dir, name, inode, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                    ((directory, name, *values) for name, values in files.items()))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._pending.clear()
+
+    def forget(self, paths):
+        """Исключает файлы из снимков, которые запишет save().
+
+        Для файлов, которые не удалось обработать: следующий rescan
+        перечитает их папки и снова вернет эти файлы как добавленные.
+        """
+        for path in paths:
+            directory, name = os.path.split(path)
+            snapshot = self._pending.get(directory)
+            if snapshot is not None and name in snapshot[3]:
+                del snapshot[3][name]
+                # mtime, который не совпадет ни с каким настоящим, — папка будет прочитана снова
+                self._pending[directory] = (-1, *snapshot[1:])
+
+    def discard(self):
+        """Забывает результаты rescan, не записывая их."""
+        self._pending.clear()
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report image files added, removed or changed since the last scan")
+    parser.add_argument("paths", nargs="+", help="Folders to scan recursively")
+    parser.add_argument("--full", action="store_true",
+                        help="Read every folder even if its modification time is unchanged")
+    parser.add_argument("--snapshots", metavar="PATH",
+                        help="Snapshot database (default: next to the metadata cache)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List the changed files")
+    args = parser.parse_args(argv)
+
+    snapshots = DirectorySnapshots(args.snapshots)
+    for root in args.paths:
+        start = time.perf_counter()
+        changes = snapshots.rescan(root, full=args.full)
+        elapsed = time.perf_counter() - start
+        print(f"{root}: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed; {changes['scanned']} folders read, "
+              f"{changes['skipped']} unchanged ({elapsed * 1000:.1f} ms)")
+        if args.verbose:
+            for key, sign in (("added", "+"), ("changed", "~")):
+                for path, _, _ in changes[key]:
+                    print(f"  {sign} {path}")
+            for path in changes["removed"]:
+                print(f"  - {path}")
+    snapshots.save()
+    snapshots.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Полнотекстовый поиск по параметрам генерации всех просканированных файлов.
+
+Индекс хранится в SQLite (таблица FTS5 — инвертированный индекс) рядом с
+кэшем метаданных. Индексируются поля Prompt, Negative prompt, Model Info
+и Generation Parameters. Записи привязаны к (путь, размер, mtime_ns),
+а папки сравниваются со снимками прошлого сканирования (imadata_scan),
+поэтому повторное сканирование переиндексирует только новые и
+измененные файлы.
+
+Запрос — слова через пробел (все должны встретиться), "фраза в кавычках"
+и префикс со звездочкой: detail*.
+
+Из командной строки:
+    python imadata_search.py index /data/outputs --workers 8
+    python imadata_search.py query '"add detail" lora*'
+    python imadata_search.py stats
+    python imadata_search.py prune
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from imadata_cache import default_cache_path
+from imadata_params import format_parameter_value
+
+# Сколько результатов возвращать по умолчанию
+DEFAULT_LIMIT = 200
+
+# Сколько файлов записывать в индекс одной транзакцией
+WRITE_BATCH_SIZE = 256
+
+# Слово или "фраза" запроса; звездочка в конце слова означает префикс
+QUERY_TOKEN_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def default_index_path():
+    """Путь к файлу индекса рядом с кэшем метаданных."""
+    return os.path.join(os.path.dirname(default_cache_path()), "ImageMetadataViewer.index.sqlite3")
+
+
+def quote_term(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def build_match_query(text):
+    """Переводит строку поиска в выражение MATCH для FTS5.
+
+    Каждое слово и фраза берутся в кавычки, поэтому операторы FTS5 и
+    знаки препинания в запросе не ломают его. Возвращает None для пустого запроса.
+    """
+    parts = []
+    for phrase, word in QUERY_TOKEN_PATTERN.findall(text):
+        if phrase.strip():
+            parts.append(quote_term(phrase.strip()))
+        elif word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            # Слово из одних знаков препинания FTS5 разобьет в пустую фразу
+            if not any(char.isalnum() for char in word):
+                continue
+            parts.append(quote_term(word) + ("*" if prefix else ""))
+    return " AND ".join(parts) or None
+
+
+def document_fields(parameters):
+    """Текст индексируемых полей: (промпт, негативный промпт, модель, параметры)."""
+    def join_items(items):
+        return "\n".join(f"{key}: {format_parameter_value(value)}" for key, value in items.items())
+
+    return (
+        "\n".join(map(str, parameters.get("Prompt", []))),
+        "\n".join(map(str, parameters.get("Negative prompt", []))),
+        join_items(parameters.get("Model Info", {})),
+        join_items(parameters.get("Generation Parameters", {})),
+    )
+
+
+class SearchIndex:
+    """Индекс параметров генерации; безопасен для использования из нескольких потоков.
+
+    Как и MetadataCache, держит по соединению на поток и пишет в режиме WAL.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+                prompt, negative_prompt, model, generation,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            );
+        """)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def is_current(self, path, size, mtime_ns):
+        """True, если эта версия файла уже в индексе."""
+        row = self._connection().execute(
+            "SELECT 1 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns)
+        ).fetchone()
+        return row is not None
+
+    def _write(self, connection, path, size, mtime_ns, parameters):
+        row = connection.execute("SELECT id, size, mtime_ns FROM files WHERE path = ?",
+                                 (path,)).fetchone()
+        if row is not None:
+            file_id, old_size, old_mtime_ns = row
+            if (old_size, old_mtime_ns) == (size, mtime_ns):
+                return False
+            connection.execute("DELETE FROM documents WHERE rowid = ?", (file_id,))
+            connection.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                               (size, mtime_ns, file_id))
+        else:
+            file_id = connection.execute(
+                "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                (path, size, mtime_ns)
+            ).lastrowid
+        connection.execute(
+            "INSERT INTO documents (rowid, prompt, negative_prompt, model, generation) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (file_id, *document_fields(parameters))
+        )
+        return True
+
+    def add(self, path, size, mtime_ns, parameters):
+        """Индексирует версию файла; False, если она уже в индексе."""
+        return self.add_many([(path, size, mtime_ns, parameters)])
+
+    def add_many(self, items):
+        """Индексирует файлы (путь, размер, mtime_ns, parameters) одной транзакцией.
+
+        Возвращает число добавленных или обновленных файлов.
+        """
+        connection = self._connection()
+        written = 0
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for path, size, mtime_ns, parameters in items:
+                written += self._write(connection, path, size, mtime_ns, parameters)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return written
+
+    def remove(self, paths):
+        """Удаляет файлы из индекса."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for path in paths:
+                row = connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    connection.execute("DELETE FROM documents WHERE rowid = ?", row)
+                    connection.execute("DELETE FROM files WHERE id = ?", row)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def prune(self):
+        """Удаляет из индекса файлы, которых больше нет на диске."""
+        paths = [path for path, in self._connection().execute("SELECT path FROM files")
+                 if not os.path.exists(path)]
+        self.remove(paths)
+        return len(paths)
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """Ищет файлы по запросу; лучшие совпадения первыми.
+
+        Возвращает список словарей с ключами "path" и "snippet" (фрагмент
+        текста с найденными словами в квадратных скобках).
+        """
+        query = build_match_query(text)
+        if query is None:
+            return []
+        rows = self._connection().execute(
+            "SELECT files.path, snippet(documents, -1, '[', ']', '…', 12) "
+            "FROM documents JOIN files ON files.id = documents.rowid "
+            "WHERE documents MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit)
+        ).fetchall()
+        return [{"path": path, "snippet": snippet} for path, snippet in rows]
+
+    def stats(self):
+        """Число файлов и размер файла индекса в байтах (вместе с WAL)."""
+        count, = self._connection().execute("SELECT COUNT(*) FROM files").fetchone()
+        size = 0
+        for suffix in ("", "-wal"):
+            if os.path.exists(self.path + suffix):
+                size += os.path.getsize(self.path + suffix)
+        return {"files": count, "bytes": size, "path": self.path}
+
+    def optimize(self):
+        """Сливает сегменты FTS5 в один: запросы после массовой записи быстрее."""
+        self._connection().execute("INSERT INTO documents (documents) VALUES ('optimize')")
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def index_paths(index, roots, workers=None, chunk_size=32, cache_path=None, full=False):
+    """Сканирует папки и индексирует новые и измененные файлы в пуле процессов.
+
+    Папки сравниваются со снимками прошлого сканирования (imadata_scan),
+    которые хранятся в той же базе, что и индекс: неизмененные папки не
+    читаются, а удаленные файлы убираются из индекса.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from imadata_batch import extract_record, init_worker
+    from imadata_scan import DirectorySnapshots
+
+    snapshots = DirectorySnapshots(index.path)
+    signatures = {}
+    removed = []
+    for root in roots:
+        if os.path.isfile(root):
+            path = os.path.abspath(root)
+            file_info = os.stat(path)
+            if not index.is_current(path, file_info.st_size, file_info.st_mtime_ns):
+                signatures[path] = (file_info.st_size, file_info.st_mtime_ns)
+            continue
+        changes = snapshots.rescan(root, full=full)
+        for path, size, mtime_ns in changes["added"] + changes["changed"]:
+            signatures[path] = (size, mtime_ns)
+        removed.extend(changes["removed"])
+    print(f"Files to index: {len(signatures)}, removed: {len(removed)}", file=sys.stderr)
+
+    start = time.perf_counter()
+    batch = []
+    written = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache_path,)) as executor:
+        for record in executor.map(extract_record, list(signatures), chunksize=chunk_size):
+            if record["error"]:
+                failed.append(record["path"])
+                continue
+            batch.append((record["path"], *signatures[record["path"]], record["parameters"]))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                written += index.add_many(batch)
+                batch = []
+    written += index.add_many(batch)
+    index.remove(removed)
+    # Снимки записываются только после того, как изменения попали в индекс;
+    # файлы с ошибками в них не попадают и будут повторены при следующем запуске
+    snapshots.forget(failed)
+    snapshots.save()
+    snapshots.close()
+    if written or removed:
+        index.optimize()
+    print(f"Indexed {written} files in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    if failed:
+        print(f"Not indexed (errors, retried on the next run): {len(failed)}", file=sys.stderr)
+    return written
+
+
+def main(argv=None):
+    # Модуль импортируется окном при запуске; argparse нужен только здесь
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Full-text search over generation parameters")
+    parser.add_argument("--path", help="Index file (default: next to the metadata cache)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="Scan folders and index new or changed files")
+    index_parser.add_argument("paths", nargs="+", help="Folders (scanned recursively) or image files")
+    index_parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                              help="Number of worker processes (default: CPU count)")
+    index_parser.add_argument("--no-cache", action="store_true",
+                              help="Do not read or update the metadata cache")
+    index_parser.add_argument("--full", action="store_true",
+                              help="Reread folders whose modification time is unchanged")
+
+    query_parser = commands.add_parser("query", help="Search the index")
+    query_parser.add_argument("text", help='Words, "phrases" and prefixes ending with *')
+    query_parser.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT,
+                              help=f"Maximum number of results (default: {DEFAULT_LIMIT})")
+
+    commands.add_parser("stats", help="Show index size")
+    commands.add_parser("prune", help="Remove files that no longer exist")
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(args.path)
+    if args.command == "index":
+        cache_path = None if args.no_cache else default_cache_path()
+        index_paths(index, args.paths, args.workers, cache_path=cache_path, full=args.full)
+    elif args.command == "query":
+        start = time.perf_counter()
+        results = index.search(args.text, args.limit)
+        elapsed = time.perf_counter() - start
+        for result in results:
+            print(f"{result['path']}\n    {result['snippet']}")
+        print(f"{len(results)} results in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        return 0
+    elif args.command == "prune":
+        print(f"Removed {index.prune()} missing files")
+
+    stats = index.stats()
+    print(f"{stats['path']}: {stats['files']} files, {stats['bytes'] / 1024 / 1024:.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
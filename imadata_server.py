@@ -0,0 +1,321 @@
+"""HTTP-сервис извлечения метаданных для машин без графического интерфейса.
+
+Разбор идет тем же кодом, что и в окне просмотра (extract_metadata),
+ответ — JSON с ключами "parameters", "categories" и "error", как в
+записях imadata_batch.py.
+
+Запуск:
+    gunicorn -w 4 -b 0.0.0.0:8000 imadata_server:app
+    python imadata_server.py --port 8000    # отладочный сервер Flask
+
+Запросы:
+    curl --data-binary @image.png http://host:8000/metadata
+    curl -F file=@image.png http://host:8000/metadata
+    curl 'http://host:8000/metadata?path=/mnt/outputs/image.png'
+
+Загрузки пишутся во временный файл по мере приема, а не собираются в
+памяти. Ответы кэшируются в каждом процессе по SHA-256 содержимого
+(для файлов общего тома — по пути, размеру и mtime) и отдаются с ETag,
+поэтому повторный запрос с If-None-Match получает 304. Имя загруженного
+файла в кэшированный ответ не входит: оно добавляется к каждому ответу
+и учитывается в ETag.
+
+Переменные окружения:
+    IMADATA_SPOOL_DIR      папка для временных файлов загрузок (по умолчанию системная)
+    IMADATA_ALLOWED_ROOTS  папки общего тома через os.pathsep, из которых можно
+                           читать по path; если не заданы, такие запросы отклоняются
+    IMADATA_MAX_UPLOAD_MB  наибольший размер загрузки, МБ (по умолчанию 512)
+    IMADATA_CACHE          файл кэша метаданных; "off" отключает кэш
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import PIL.Image
+from flask import Flask, Request, Response, current_app, request
+
+from imadata_cache import MetadataCache, default_cache_path
+from imadata_core import extract_metadata
+
+# Размер блока при приеме загрузки и подсчете хэша
+CHUNK_SIZE = 1024 * 1024
+
+# Сколько готовых ответов держать в памяти процесса
+RESPONSE_CACHE_SIZE = 1024
+
+# Состояние текущего процесса-обработчика (см. worker_state)
+_worker_state = None
+_worker_state_lock = threading.Lock()
+
+
+class WorkerState:
+    """Прогретый разборщик процесса: плагины Pillow, кэш метаданных и кэш ответов.
+
+    Создается отдельно в каждом процессе gunicorn, поэтому соединение с
+    SQLite не переходит через fork (например, при --preload).
+    """
+
+    def __init__(self, cache_path):
+        self.pid = os.getpid()
+        # Загружаем все плагины форматов сразу, а не на первом запросе
+        PIL.Image.init()
+        self.metadata_cache = None
+        if cache_path:
+            try:
+                self.metadata_cache = MetadataCache(cache_path)
+            except (sqlite3.Error, OSError):
+                self.metadata_cache = None
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_response(self, key):
+        with self.lock:
+            body = self.responses.get(key)
+            if body is not None:
+                self.responses.move_to_end(key)
+            return body
+
+    def put_response(self, key, body):
+        with self.lock:
+            self.responses[key] = body
+            while len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+
+
+def worker_state():
+    global _worker_state
+    with _worker_state_lock:
+        if _worker_state is None or _worker_state.pid != os.getpid():
+            _worker_state = WorkerState(current_app.config["METADATA_CACHE"])
+        return _worker_state
+
+
+class SpoolRequest(Request):
+    """Запрос, у которого файлы из multipart сразу пишутся в папку спула на диске."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        stream = tempfile.NamedTemporaryFile("wb+", dir=current_app.config["SPOOL_DIR"],
+                                             prefix="imadata-", delete=False)
+        # Файлы удаляются в конце запроса (remove_spooled_files)
+        self.spooled_paths = getattr(self, "spooled_paths", []) + [stream.name]
+        return stream
+
+
+def remove_spooled_files(exception=None):
+    for path in getattr(request, "spooled_paths", ()):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def spool_stream(stream, spool_dir):
+    """Копирует поток во временный файл, считая SHA-256; возвращает (путь, хэш)."""
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile("wb", dir=spool_dir, prefix="imadata-", delete=False) as f:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    return f.name, digest.hexdigest()
+
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def metadata_record(file_path, cache=None):
+    """Извлекает метаданные; возвращает (JSON-совместимую запись, признак ошибки)."""
+    metadata = extract_metadata(file_path, header_only=True, cache=cache)
+    record = {
+        "parameters": metadata["parameters"],
+        "categories": metadata["categories"],
+        "error": metadata["error"],
+    }
+    return record, metadata["error"] is not None
+
+
+def with_filename(body, filename):
+    """Добавляет имя загруженного файла в начало готового JSON-объекта."""
+    return '{"filename": ' + json.dumps(filename, ensure_ascii=False) + ", " + body[1:]
+
+
+def upload_etag(digest, filename):
+    """ETag ответа на загрузку: одно содержимое под разными именами — разные ответы."""
+    if filename is None:
+        return digest
+    return hashlib.sha256(f"{digest}|{filename}".encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def json_response(body, etag=None, status=200):
+    response = Response(body, status=status, mimetype="application/json")
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def error_response(status, message):
+    return json_response(json.dumps({"error": message}), status=status)
+
+
+def not_modified(etag):
+    """Ответ 304, если клиенту уже известна эта версия."""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def is_allowed_path(file_path, roots):
+    for root in roots:
+        try:
+            if os.path.commonpath([file_path, root]) == root:
+                return True
+        except ValueError:
+            # Разные диски в Windows
+            continue
+    return False
+
+
+def metadata_from_upload():
+    """Разбирает загруженный файл: тело запроса целиком или поле "file" в multipart."""
+    state = worker_state()
+    spool_dir = current_app.config["SPOOL_DIR"]
+
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None:
+            return error_response(400, 'Expected a "file" field')
+        filename = upload.filename
+        temp_path = upload.stream.name
+        upload.stream.close()
+        digest = hash_file(temp_path)
+    else:
+        filename = request.args.get("filename")
+        temp_path, digest = spool_stream(request.stream, spool_dir)
+        request.spooled_paths = [temp_path]
+
+    etag = upload_etag(digest, filename)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    # В кэше — ответ без имени файла: то же содержимое могут загрузить под другим именем
+    body = state.get_response(digest)
+    if body is None:
+        record, failed = metadata_record(temp_path)
+        # "File Info" описывал бы временный файл, а не загруженный
+        record["categories"].pop("File Info", None)
+        record["size"] = os.path.getsize(temp_path)
+        record["sha256"] = digest
+        body = json.dumps(record, ensure_ascii=False, default=str)
+        if failed:
+            return json_response(with_filename(body, filename), status=422)
+        state.put_response(digest, body)
+    return json_response(with_filename(body, filename), etag=etag)
+
+
+def metadata_from_path():
+    """Разбирает файл на общем томе по параметру path."""
+    roots = current_app.config["ALLOWED_ROOTS"]
+    if not roots:
+        return error_response(403, "Path lookups are disabled (set IMADATA_ALLOWED_ROOTS)")
+
+    file_path = os.path.realpath(request.args["path"])
+    if not is_allowed_path(file_path, roots):
+        return error_response(403, "Path is outside the allowed roots")
+    try:
+        file_info = os.stat(file_path)
+    except OSError:
+        return error_response(404, "File not found")
+
+    # Версия файла определяется так же, как в кэше метаданных
+    etag = hashlib.sha1(
+        f"{file_path}|{file_info.st_size}|{file_info.st_mtime_ns}".encode("utf-8", "surrogateescape")
+    ).hexdigest()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    state = worker_state()
+    body = state.get_response(etag)
+    if body is None:
+        record, failed = metadata_record(file_path, state.metadata_cache)
+        record["path"] = file_path
+        body = json.dumps(record, ensure_ascii=False, default=str)
+        if failed:
+            return json_response(body, status=422)
+        state.put_response(etag, body)
+    return json_response(body, etag=etag)
+
+
+def create_app(config=None):
+    """Создает приложение; настройки по умолчанию берутся из переменных окружения."""
+    app = Flask(__name__)
+    app.request_class = SpoolRequest
+
+    cache = os.environ.get("IMADATA_CACHE", default_cache_path())
+    roots = os.environ.get("IMADATA_ALLOWED_ROOTS", "")
+    app.config.update(
+        SPOOL_DIR=os.environ.get("IMADATA_SPOOL_DIR") or None,
+        ALLOWED_ROOTS=[os.path.realpath(root) for root in roots.split(os.pathsep) if root],
+        MAX_CONTENT_LENGTH=int(os.environ.get("IMADATA_MAX_UPLOAD_MB", "512")) * 1024 * 1024,
+        METADATA_CACHE=None if cache == "off" else cache,
+    )
+    if config:
+        app.config.update(config)
+    app.teardown_request(remove_spooled_files)
+
+    @app.route("/metadata", methods=["GET", "POST"])
+    def metadata():
+        if request.method == "POST":
+            return metadata_from_upload()
+        if "path" in request.args:
+            return metadata_from_path()
+        return error_response(400, "Upload an image with POST or pass ?path=")
+
+    @app.route("/health")
+    def health():
+        return json_response(json.dumps({"status": "ok"}))
+
+    # Прогреваем разборщик при старте процесса, а не на первом запросе
+    with app.app_context():
+        worker_state()
+
+    return app
+
+
+app = create_app()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the metadata service with the Flask development server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Потоковый разбор пакетов XMP (JPEG APP1, iTXt в PNG, чанк "XMP " в WebP, тег 700 в TIFF).
+
+Пакет читается инкрементальным парсером (ElementTree.iterparse), а не
+собирается в дерево целиком: свойство верхнего уровня (дочерний элемент
+или атрибут rdf:Description) разбирается, как только закрывается его
+элемент, после чего поддерево удаляется. Поэтому даже большие пакеты
+(история правок Lightroom, расширенный XMP из нескольких сегментов
+APP1) не держатся в памяти целиком.
+
+В категорию "XMP" попадают только свойства верхнего уровня под своими
+префиксами пространств имен (dc:title, xmp:CreatorTool, crs:Exposure2012).
+Массивы простых значений показываются одной строкой, а структуры и
+длинные массивы — кратким описанием с дескриптором "xmp": их элементы
+разбираются заново из файла, только когда пользователь раскрывает строку
+(expand_xmp_node).
+
+ElementTree импортируется только при разборе: файлы без XMP и импорт
+модуля обходятся без него.
+"""
+
+import io
+
+from imadata_binary import describe_binary
+from imadata_headers import HeaderFormatError, read_header_metadata
+
+RDF_NS = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+RDF_RDF = RDF_NS + "RDF"
+RDF_DESCRIPTION = RDF_NS + "Description"
+RDF_LI = RDF_NS + "li"
+RDF_RESOURCE = RDF_NS + "resource"
+RDF_PARSE_TYPE = RDF_NS + "parseType"
+RDF_ARRAYS = {RDF_NS + "Seq": "Seq", RDF_NS + "Bag": "Bag", RDF_NS + "Alt": "Alt"}
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# Ключи img.info с пакетами XMP; в "Other Metadata" они не показываются
+XMP_INFO_KEYS = ("xmp", "XML:com.adobe.xmp", "xmp_extended")
+
+# Признак того, что часть пакета JPEG вынесена в расширенный XMP
+EXTENDED_XMP_MARKER = b"HasExtendedXMP"
+
+# Сколько простых элементов массива показывать в ячейке
+MAX_ARRAY_ITEMS = 16
+
+
+def xmp_packets(info):
+    """Пакеты XMP из img.info: основной и, если есть, расширенный (JPEG)."""
+    packets = []
+    for key in ("xmp", "xmp_extended"):
+        value = info.get(key)
+        if key == "xmp" and not value:
+            # Старые версии Pillow и заголовки PNG отдают пакет только текстом
+            value = info.get("XML:com.adobe.xmp")
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        if isinstance(value, bytes) and value.strip(b"\x00 \t\r\n"):
+            packets.append((key, value))
+    return packets
+
+
+def needs_extended_xmp(image_format, info):
+    """True, если основной пакет JPEG ссылается на расширенный XMP, которого нет в info."""
+    return (image_format == "JPEG" and "xmp_extended" not in info
+            and isinstance(info.get("xmp"), bytes) and EXTENDED_XMP_MARKER in info["xmp"])
+
+
+def read_xmp_file(file_path):
+    """Пакеты XMP файла: из заголовков, а для прочих форматов — через Pillow."""
+    try:
+        header = read_header_metadata(file_path)
+    except HeaderFormatError:
+        header = None
+    if header is not None:
+        return xmp_packets(header["info"])
+    import PIL.Image
+    with PIL.Image.open(file_path) as img:
+        return xmp_packets(img.info)
+
+
+def add_xmp_category(packets, categories, expandable):
+    """Раскладывает свойства верхнего уровня пакетов по категории "XMP".
+
+    Для составных значений в expandable["XMP"][ключ] пишется дескриптор
+    для expand_xmp_node, для самих пакетов — дескриптор "binary".
+    """
+    from xml.etree.ElementTree import ParseError
+
+    category = categories["XMP"]
+    nodes = expandable.setdefault("XMP", {})
+    for index, (key, data) in enumerate(packets):
+        name = "Extended packet" if key == "xmp_extended" else "Packet"
+        category[name] = describe_binary(data)
+        nodes[name] = {"kind": "binary", "source": "info", "key": key, "length": len(data)}
+
+        prefixes = {}
+        try:
+            for position, (tag, value) in enumerate(_iter_properties(data, prefixes)):
+                property_name = _display_name(tag, prefixes)
+                if property_name in category:
+                    continue
+                text, nested = _summary(_resolve(value))
+                category[property_name] = text
+                if nested:
+                    nodes[property_name] = {"kind": "xmp", "packet": index, "path": [position]}
+        except ParseError as e:
+            categories["Other Metadata"]["XMP Error"] = f"{name}: {e}"
+
+
+def expand_xmp_node(file_path, descriptor):
+    """Элементы составного свойства по дескриптору из add_xmp_category.
+
+    Пакет заново читается потоком до нужного свойства верхнего уровня;
+    возвращает список строк (ключ, значение, дескриптор вложенного узла или None).
+    """
+    from xml.etree.ElementTree import ParseError
+
+    packets = read_xmp_file(file_path)
+    packet, path = descriptor["packet"], descriptor["path"]
+    if packet >= len(packets):
+        raise HeaderFormatError("XMP packet not found")
+
+    prefixes = {}
+    properties = _iter_properties(packets[packet][1], prefixes)
+    try:
+        for position, (_, value) in enumerate(properties):
+            if position == path[0]:
+                break
+        else:
+            raise HeaderFormatError("XMP property not found")
+
+        resolved = _resolve(value)
+        for index in path[1:]:
+            entries = _entries(resolved)
+            if index >= len(entries):
+                raise HeaderFormatError("XMP property not found")
+            resolved = _resolve(entries[index][1])
+
+        rows = []
+        for index, (key, child) in enumerate(_entries(resolved)):
+            text, nested = _summary(_resolve(child))
+            child_descriptor = dict(descriptor, path=path + [index]) if nested else None
+            rows.append((_display_name(key, prefixes), text, child_descriptor))
+        return rows
+    except ParseError as e:
+        raise HeaderFormatError(f"Malformed XMP: {e}") from e
+    finally:
+        properties.close()
+
+
+def _iter_properties(data, prefixes):
+    """Свойства верхнего уровня пакета: пары (имя в нотации {uri}local, значение).
+
+    Значение — строка (атрибут rdf:Description) или элемент свойства,
+    который действителен только до следующего шага итерации: после него
+    поддерево удаляется. Префиксы пространств имен пишутся в prefixes.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    stack = []
+    events = iterparse(io.BytesIO(data.rstrip(b"\x00")), events=("start", "end", "start-ns"))
+    for event, item in events:
+        if event == "start-ns":
+            prefix, uri = item
+            prefixes.setdefault(uri, prefix or uri)
+        elif event == "start":
+            stack.append(item)
+            if item.tag == RDF_DESCRIPTION and _is_top_level(stack[:-1]):
+                yield from ((name, value) for name, value in item.attrib.items()
+                            if not _is_syntax(name))
+        else:
+            stack.pop()
+            if stack and stack[-1].tag == RDF_DESCRIPTION and _is_top_level(stack[:-1]):
+                yield item.tag, item
+                # Свойство разобрано: освобождаем его поддерево
+                del stack[-1][-1]
+
+
+def _is_top_level(ancestors):
+    return bool(ancestors) and ancestors[-1].tag == RDF_RDF
+
+
+def _is_syntax(name):
+    return name.startswith(RDF_NS) or name == XML_LANG
+
+
+def _resolve(value):
+    """Значение свойства XMP: строка, ("array", тип, элементы) или ("struct", поля).
+
+    Поля структуры — пары (имя, строка или элемент свойства).
+    """
+    if isinstance(value, str):
+        return value
+    if RDF_RESOURCE in value.attrib:
+        return value.attrib[RDF_RESOURCE]
+
+    fields = [(name, text) for name, text in value.attrib.items() if not _is_syntax(name)]
+    if value.get(RDF_PARSE_TYPE) == "Resource":
+        return ("struct", fields + [(child.tag, child) for child in value])
+    if len(value):
+        node = value[0]
+        if node.tag in RDF_ARRAYS:
+            return ("array", RDF_ARRAYS[node.tag], [item for item in node if item.tag == RDF_LI])
+        # Вложенный rdf:Description (или типизированный узел): поля в атрибутах и элементах
+        fields.extend((name, text) for name, text in node.attrib.items() if not _is_syntax(name))
+        fields.extend((child.tag, child) for child in node)
+        return ("struct", fields)
+    if fields:
+        return ("struct", fields)
+    return (value.text or "").strip()
+
+
+def _entries(resolved):
+    """Дочерние узлы составного значения: список пар (ключ, значение)."""
+    if isinstance(resolved, str):
+        raise HeaderFormatError("XMP property is not a structure or an array")
+    if resolved[0] == "struct":
+        return resolved[1]
+    return [(item.get(XML_LANG) or f"[{i}]", item) for i, item in enumerate(resolved[2], 1)]
+
+
+def _summary(resolved):
+    """Текст значения для ячейки и признак того, что у значения есть дочерние строки."""
+    if isinstance(resolved, str):
+        return resolved, False
+    if resolved[0] == "struct":
+        return f"Structure, {_plural(len(resolved[1]), 'field')}", True
+
+    _, array_type, items = resolved
+    values = [_resolve(item) for item in items]
+    if not all(isinstance(value, str) for value in values):
+        return f"{array_type}, {_plural(len(items), 'item')}", True
+    if array_type == "Alt" and values:
+        # Языковые варианты: в ячейке значение по умолчанию
+        default = next((value for item, value in zip(items, values)
+                        if item.get(XML_LANG) == "x-default"), values[0])
+        return default, len(values) > 1
+    text = "; ".join(values[:MAX_ARRAY_ITEMS])
+    if len(values) > MAX_ARRAY_ITEMS:
+        text += f"; … ({len(values)} items)"
+    return text, len(values) > MAX_ARRAY_ITEMS
+
+
+def _plural(count, noun):
+    return f"{count:,} {noun}" + ("" if count == 1 else "s")
+
+
+def _display_name(tag, prefixes):
+    """Имя свойства с префиксом пространства имен: {uri}local -> prefix:local."""
+    if not tag.startswith("{"):
+        return tag
+    uri, _, local = tag[1:].partition("}")
+    return f"{prefixes.get(uri, uri)}:{local}"